@@ -0,0 +1,112 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import numpy as np
+from pyIMD.analysis.curve_fit import fit_function, fit_function_jacobian
+
+__author__ = 'Andreas P. Cuny'
+
+
+def fit_resonance_batch(frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds, upper_param_bounds,
+                        max_iterations=200, tolerance=1e-10):
+    """Fits the phase response of a harmonic oscillator (defined in pyIMD.analysis.curve_fit) to all sweeps at once. \
+    It runs a vectorized Levenberg-Marquardt least squares fit where every sweep has its own damping factor and is \
+    removed from the active set as soon as it has converged. Parameters are kept within the bounds by projecting \
+    each step onto the bounds.
+
+    Args:
+        frequency_matrix (`float array`):       Frequencies of all sweeps [in kHz] (n_sweeps x n_points array)
+        phase_matrix (`float array`):           Phases of all sweeps [in Rad] (n_sweeps x n_points array)
+        initial_param_guess (`float array`):    Initial parameter guess. Either one guess for all sweeps (1x4 array) \
+                                                or one guess per sweep (n_sweeps x 4 array)
+        lower_param_bounds (`float`):           Lower bounds (1x4 array)
+        upper_param_bounds (`float`):           Upper bounds (1x4 array)
+        max_iterations (`int`):                 Maximal number of iterations (optional)
+        tolerance (`float`):                    Relative tolerance on the change of the residual sum of squares and \
+                                                of the parameters used to stop the iteration of a sweep (optional)
+
+    Returns:
+        resonance_frequency (`float array`):    Resonance frequency of each sweep [in kHz] (n_sweeps array)
+    Returns:
+        curve_fit_parameter (`float array`):    Curve fit parameters of each sweep (n_sweeps x 3 array)
+                                                curve_fit_parameter[:, 0] := Q factor (losses)
+
+                                                curve_fit_parameter[:, 1] := Linear factor accounting for a linear \
+                                                background
+
+                                                curve_fit_parameter[:, 2] := Offset of the background
+    """
+    x = np.atleast_2d(np.asarray(frequency_matrix, dtype=float))
+    y = np.atleast_2d(np.asarray(phase_matrix, dtype=float))
+    n_sweeps = x.shape[0]
+    lower = np.asarray(lower_param_bounds, dtype=float)
+    upper = np.asarray(upper_param_bounds, dtype=float)
+    params = np.clip(np.broadcast_to(np.asarray(initial_param_guess, dtype=float), (n_sweeps, 4)), lower, upper)
+
+    residual = y - _evaluate(x, params)
+    cost = np.sum(residual * residual, axis=1)
+    damping = np.full(n_sweeps, 1e-3)
+    active = np.isfinite(cost)
+
+    for _ in range(max_iterations):
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        x_active = x[idx]
+        p_active = params[idx]
+        jac = _jacobian(x_active, p_active)
+        jtj = np.einsum('mpi,mpj->mij', jac, jac)
+        jtr = np.einsum('mpi,mp->mi', jac, residual[idx])
+
+        # Marquardt scaling of the damping term with the diagonal of J^T J
+        diagonal = np.maximum(np.diagonal(jtj, axis1=1, axis2=2), 1e-12)
+        system = jtj + damping[idx, None, None] * diagonal[:, :, None] * np.eye(4)
+        try:
+            step = np.linalg.solve(system, jtr[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            step = np.einsum('mij,mj->mi', np.linalg.pinv(system), jtr)
+
+        p_new = np.clip(p_active + step, lower, upper)
+        residual_new = y[idx] - _evaluate(x_active, p_new)
+        cost_new = np.sum(residual_new * residual_new, axis=1)
+
+        improved = cost_new < cost[idx]
+        improved_idx = idx[improved]
+        cost_change = cost[improved_idx] - cost_new[improved]
+        param_change = np.abs(p_new[improved] - p_active[improved])
+
+        params[improved_idx] = p_new[improved]
+        residual[improved_idx] = residual_new[improved]
+        cost[improved_idx] = cost_new[improved]
+        damping[improved_idx] = np.maximum(damping[improved_idx] / 10, 1e-12)
+        damping[idx[~improved]] = damping[idx[~improved]] * 10
+
+        converged = np.zeros(len(idx), dtype=bool)
+        converged[improved] = (cost_change <= tolerance * np.maximum(cost[improved_idx], 1e-30)) | \
+            np.all(param_change <= tolerance * (np.abs(params[improved_idx]) + tolerance), axis=1)
+        # Sweeps that do not improve even with a very large damping are stuck at their minimum
+        converged[~improved] = damping[idx[~improved]] > 1e10
+        active[idx[converged]] = False
+
+    return params[:, 0], params[:, 1:]
+
+
+def _evaluate(x, params):
+    """Evaluates fit_function row wise for a matrix of frequencies and a matrix of parameters (one row per sweep).
+    """
+    return fit_function(x, params[:, 0, None], params[:, 1, None], params[:, 2, None], params[:, 3, None])
+
+
+def _jacobian(x, params):
+    """Analytic Jacobian of fit_function with respect to its four parameters for all sweeps at once.
+    Returns an array of the shape (n_sweeps, n_points, 4).
+    """
+    return fit_function_jacobian(x, params[:, 0, None], params[:, 1, None], params[:, 2, None], params[:, 3, None])
@@ -12,8 +12,11 @@
 
 import numpy as np
 from math import pi
+from tqdm import tqdm, trange
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from scipy import optimize
-from pyIMD.analysis.curve_fit import fit_function
+from pyIMD.analysis.curve_fit import fit_function, fit_function_jacobian
+from pyIMD.analysis.batch_fit import fit_resonance_batch
 
 __author__ = 'Andreas P. Cuny'
 
@@ -41,12 +44,42 @@ def calculate_mass(spring_constant, res_freq_after_cell_load, res_freq_before_ce
     return mass
 
 
+def calculate_pll_mass(spring_constant, frequency_shift, res_freq_pre_start_with_cell, res_freq_pre_start_no_cell,
+                       position_correction_factor, frequency_offset=None):
+    """Calculates the mass for all data points of a PLL measurement at once. The frequency shift column is corrected \
+    for the frequency offset (optional), shifted by the resonance frequency measured after the cell is picked up and \
+    converted to mass with calculate_mass. The result is multiplied with the position correction factor.
+
+    Args:
+        spring_constant (`float`):                 Stiffness of the cantilever [in N/m]
+        frequency_shift (`float array`):           Measured frequency shift for each data point [in kHz]
+        res_freq_pre_start_with_cell (`float`):    Resonance frequency of the cantilever AFTER the cell is picked up \
+                                                   [in kHz]
+        res_freq_pre_start_no_cell (`float`):      Resonance frequency of the cantilever BEFORE the cell is picked up \
+                                                   [in kHz]
+        position_correction_factor (`float`):      Position correction factor. Either a single float or an array with \
+                                                   one factor per data point.
+        frequency_offset (`float`):                Frequency offset subtracted from the frequency shift [in kHz]. \
+                                                   None if no offset correction should be applied (optional).
+
+    Returns:
+        mass (`float array`):                      Returns the position corrected mass for each data point.
+    """
+    frequency_shift = np.asarray(frequency_shift, dtype=float)
+    if frequency_offset is not None:
+        frequency_shift = frequency_shift - frequency_offset
+    mass = calculate_mass(spring_constant, frequency_shift + res_freq_pre_start_with_cell, res_freq_pre_start_no_cell)
+
+    return mass * np.asarray(position_correction_factor, dtype=float)
+
+
 def calculate_resonance_frequencies(frequency_array, phase_array, initial_param_guess, lower_param_bounds,
                                     upper_param_bounds):
 
     """Calculate_resonance_frequencies calculates the resonance frequency from input frequency and phase array. It does \
     so via fitting the phase response of a harmonic oscillator (defined in pyIMD.analysis.curve_fit). The first fit \
-    parameter of the fit parameter array is the resonance frequency.
+    parameter of the fit parameter array is the resonance frequency. The analytic Jacobian of the phase response is \
+    used for the fit.
 
     Args:
         frequency_array (`float array`):        Array of frequencies [in kHz]
@@ -68,12 +101,355 @@ def calculate_resonance_frequencies(frequency_array, phase_array, initial_param_
     """
 
     params, _ = optimize.curve_fit(fit_function, frequency_array.astype(float), phase_array.astype(float),
-                                   p0=initial_param_guess, bounds=(lower_param_bounds, upper_param_bounds))
+                                   p0=initial_param_guess, bounds=(lower_param_bounds, upper_param_bounds),
+                                   jac=fit_function_jacobian)
 
     resonance_frequency = params[0]
     return resonance_frequency, params[1:]
 
 
+def estimate_initial_parameter_guess(frequency_array, phase_array, lower_param_bounds, upper_param_bounds,
+                                     fallback_param_guess, n_q_candidates=25, block_size=1000):
+    """Estimates an initial parameter guess for the phase response fit (defined in pyIMD.analysis.curve_fit) without \
+    iterative fitting. The resonance frequency is found by linear interpolation at the rising zero crossing of the \
+    detrended phase. For a set of Q factor candidates within the bounds the linear background is solved in closed \
+    form by linear least squares and the candidate with the smallest residual is kept. Background and resonance \
+    frequency are refined once. The sweeps are estimated in blocks of block_size sweeps at once, which bounds the \
+    temporary memory to block_size x n_q_candidates x n_points values.
+
+    Args:
+        frequency_array (`float array`):        Frequencies [in kHz]. Either one sweep (n_points array) or several \
+                                                sweeps (n_sweeps x n_points array)
+        phase_array (`float array`):            Phases [in Rad]. Same shape as frequency_array
+        lower_param_bounds (`float`):           Lower bounds (1x4 array)
+        upper_param_bounds (`float`):           Upper bounds (1x4 array)
+        fallback_param_guess (`float`):         Parameter guess used for sweeps without zero crossing (1x4 array)
+        n_q_candidates (`int`):                 Number of Q factor candidates (optional)
+        block_size (`int`):                     Number of sweeps estimated at once (optional)
+
+    Returns:
+        initial_param_guess (`float array`):    Initial parameter guess clipped to the bounds. 1x4 array for one \
+                                                sweep or n_sweeps x 4 array for several sweeps
+    """
+    x = np.asarray(frequency_array, dtype=float)
+    y = np.asarray(phase_array, dtype=float)
+    is_single_sweep = x.ndim == 1
+    x = np.atleast_2d(x)
+    y = np.atleast_2d(y)
+    lower = np.asarray(lower_param_bounds, dtype=float)
+    upper = np.asarray(upper_param_bounds, dtype=float)
+
+    q_candidates = np.geomspace(max(lower[1], 1e-3), upper[1], n_q_candidates)
+    initial_param_guess = np.empty((x.shape[0], 4))
+    for start in range(0, x.shape[0], block_size):
+        end = start + block_size
+        initial_param_guess[start:end] = _estimate_parameter_block(x[start:end], y[start:end], q_candidates)
+    has_failed = ~np.all(np.isfinite(initial_param_guess), axis=1)
+    initial_param_guess[has_failed] = np.asarray(fallback_param_guess, dtype=float)
+    initial_param_guess = np.clip(initial_param_guess, lower, upper)
+
+    return initial_param_guess[0] if is_single_sweep else initial_param_guess
+
+
+def _estimate_parameter_block(x, y, q_candidates):
+    """Estimates the parameters of a block of sweeps (see estimate_initial_parameter_guess). Sweeps without zero \
+    crossing are NaN.
+    """
+    # Remove the chord through the end points to get a first estimate of the resonance frequency
+    chord = y[:, :1] + (y[:, -1:] - y[:, :1]) * (x - x[:, :1]) / (x[:, -1:] - x[:, :1])
+    resonance_frequency = _find_zero_crossing(x, y - chord, np.mean(x, axis=1))
+
+    rows = np.arange(x.shape[0])
+    for _ in range(2):
+        # Phase of the background for every Q candidate: y + arctan(q (fn/x - x/fn)) = a x + b
+        ratio = resonance_frequency[:, None] / x - x / resonance_frequency[:, None]
+        background = y[:, None, :] + np.arctan(q_candidates[None, :, None] * ratio[:, None, :])
+        slope, offset = _fit_linear_background(x[:, None, :], background)
+        residual = background - slope[:, :, None] * x[:, None, :] - offset[:, :, None]
+        best = np.argmin(np.sum(residual * residual, axis=2), axis=1)
+        q_factor, slope, offset = q_candidates[best], slope[rows, best], offset[rows, best]
+        refined_frequency = _find_zero_crossing(x, y - slope[:, None] * x - offset[:, None], resonance_frequency)
+        resonance_frequency = np.where(np.isfinite(refined_frequency), refined_frequency, resonance_frequency)
+
+    return np.stack([resonance_frequency, q_factor, slope, offset], axis=1)
+
+
+def _find_zero_crossing(frequency_matrix, detrended_phase_matrix, frequency_hint):
+    """Linearly interpolates the rising zero crossing of each row closest to the frequency hint. Rows without a \
+    rising zero crossing are NaN.
+    """
+    x0, x1 = frequency_matrix[:, :-1], frequency_matrix[:, 1:]
+    d0, d1 = detrended_phase_matrix[:, :-1], detrended_phase_matrix[:, 1:]
+    is_crossing = (d0 < 0) & (d1 >= 0)
+    crossing = x0 - d0 * (x1 - x0) / np.where(is_crossing, d1 - d0, 1)
+    distance = np.where(is_crossing, np.abs(crossing - frequency_hint[:, None]), np.inf)
+    closest = np.argmin(distance, axis=1)
+    rows = np.arange(frequency_matrix.shape[0])
+    return np.where(np.isfinite(distance[rows, closest]), crossing[rows, closest], np.nan)
+
+
+def _fit_linear_background(x, y):
+    """Closed form linear least squares fit y = slope * x + offset along the last axis.
+    """
+    x_mean = np.mean(x, axis=-1, keepdims=True)
+    y_mean = np.mean(y, axis=-1, keepdims=True)
+    slope = np.sum((x - x_mean) * (y - y_mean), axis=-1) / np.sum((x - x_mean) ** 2, axis=-1)
+    return slope, y_mean[..., 0] - slope * x_mean[..., 0]
+
+
+def calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds,
+                                          upper_param_bounds, fit_mode='Sequential', warm_start=False,
+                                          residual_jump_factor=2.0, n_workers=1, logger=None):
+    """Calculates the resonance frequency of every sweep of a Cont.Sweep measurement.
+
+    Args:
+        frequency_matrix (`float array`):       Frequencies of all sweeps [in kHz] (n_sweeps x n_points array)
+        phase_matrix (`float array`):           Phases of all sweeps [in Rad] (n_sweeps x n_points array)
+        initial_param_guess (`float`):          Initial parameter guess. Either one guess for all sweeps (1x4 array) \
+                                                or one guess per sweep (n_sweeps x 4 array)
+        lower_param_bounds (`float`):           Lower bounds (1x4 array)
+        upper_param_bounds (`float`):           Upper bounds (1x4 array)
+        fit_mode (`str`):                       Sequential := one calculate_resonance_frequencies fit per sweep
+                                                Batch      := all sweeps fitted at once with fit_resonance_batch
+        warm_start (`bool`):                    If True the fit of a sweep is seeded with the fitted parameters of \
+                                                the previous sweep (Sequential mode only). If that fit fails, hits a \
+                                                bound or its residuals jump, the sweep is refitted from \
+                                                initial_param_guess and the better of both fits is kept. (optional)
+        residual_jump_factor (`float`):         Factor by which the root mean square residual of a warm started fit \
+                                                may exceed the one of the previous sweep before falling back to \
+                                                initial_param_guess (optional)
+        n_workers (`int`):                      Number of worker processes. If > 1 contiguous chunks of sweeps are \
+                                                fitted in parallel in a process pool. (optional)
+        logger (`object`):                      Logger reporting each completed chunk of the process pool. (optional)
+
+    Returns:
+        resonance_frequency (`float array`):    Resonance frequency of each sweep [in kHz] (n_sweeps array)
+    Returns:
+        curve_fit_parameter (`float array`):    Curve fit parameters of each sweep (n_sweeps x 3 array)
+    """
+    frequency_matrix = np.asarray(frequency_matrix, dtype=float)
+    phase_matrix = np.asarray(phase_matrix, dtype=float)
+
+    if fit_mode not in ['Sequential', 'Batch']:
+        raise Exception("Sweep fit mode {} is not supported. Use 'Sequential' or 'Batch'.".format(fit_mode))
+
+    n_sweeps = frequency_matrix.shape[0]
+    initial_param_guess = np.broadcast_to(np.asarray(initial_param_guess, dtype=float), (n_sweeps, 4))
+    if n_workers > 1 and n_sweeps > 1:
+        resonance_frequency = np.empty(n_sweeps)
+        curve_fit_parameter = np.empty((n_sweeps, 3))
+        # Several chunks per worker to balance the load. Chunks are contiguous so that warm start still applies.
+        chunk_edges = np.linspace(0, n_sweeps, min(n_sweeps, n_workers * 4) + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor, tqdm(total=n_sweeps) as progress:
+            futures = {}
+            for start, end in zip(chunk_edges[:-1], chunk_edges[1:]):
+                future = executor.submit(_fit_sweep_chunk, frequency_matrix[start:end], phase_matrix[start:end],
+                                         initial_param_guess[start:end], lower_param_bounds, upper_param_bounds,
+                                         fit_mode, warm_start, residual_jump_factor)
+                futures[future] = (start, end)
+            for n_completed, future in enumerate(as_completed(futures), 1):
+                start, end = futures[future]
+                resonance_frequency[start:end], curve_fit_parameter[start:end] = future.result()
+                progress.update(end - start)
+                if logger is not None:
+                    logger.info('Fitted sweeps {} to {} ({} of {} chunks done)'.format(start, end - 1, n_completed,
+                                                                                     len(futures)))
+        return resonance_frequency, curve_fit_parameter
+
+    return _fit_sweep_chunk(frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds,
+                            upper_param_bounds, fit_mode, warm_start, residual_jump_factor, show_progress=True)
+
+
+def calculate_tracked_resonance_frequencies(frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds,
+                                            upper_param_bounds, calibration_interval=50, window_half_width=25,
+                                            **kwargs):
+    """Calculates the resonance frequency of every sweep of a Cont.Sweep measurement by tracking the zero crossing \
+    of the detrended phase instead of fitting every sweep. Only every nth sweep (calibration sweep) is fitted with \
+    calculate_sweep_resonance_frequencies. The fitted background (linear factor and offset) is linearly interpolated \
+    between the calibration sweeps and subtracted from the phase of every sweep. The resonance frequency is the zero \
+    crossing of a cubic polynomial fitted locally to the detrended phase (see track_resonance_frequencies). Sweeps \
+    without valid crossing are fitted like the calibration sweeps.
+
+    Args:
+        frequency_matrix (`float array`):       Frequencies of all sweeps [in kHz] (n_sweeps x n_points array)
+        phase_matrix (`float array`):           Phases of all sweeps [in Rad] (n_sweeps x n_points array)
+        initial_param_guess (`float`):          Initial parameter guess. Either one guess for all sweeps (1x4 array) \
+                                                or one guess per sweep (n_sweeps x 4 array)
+        lower_param_bounds (`float`):           Lower bounds (1x4 array)
+        upper_param_bounds (`float`):           Upper bounds (1x4 array)
+        calibration_interval (`int`):           Fit every nth sweep. The first sweep is always fitted. (optional)
+        window_half_width (`int`):              Number of points on each side of the zero crossing used for the \
+                                                local polynomial (optional)
+
+    Keyword Args:
+        fit_mode, warm_start, n_workers:        Passed to calculate_sweep_resonance_frequencies for the calibration \
+                                                sweeps.
+
+    Returns:
+        resonance_frequency (`float array`):    Resonance frequency of each sweep [in kHz] (n_sweeps array). \
+                                                Calibration and fallback sweeps hold the fitted resonance frequency, \
+                                                sweeps with NaN's NaN.
+    Returns:
+        curve_fit_parameter (`float array`):    Curve fit parameters of each sweep (n_sweeps x 3 array) linearly \
+                                                interpolated between the calibration sweeps or fitted for the \
+                                                calibration and fallback sweeps
+    """
+    frequency_matrix = np.asarray(frequency_matrix, dtype=float)
+    phase_matrix = np.asarray(phase_matrix, dtype=float)
+    n_sweeps = frequency_matrix.shape[0]
+    initial_param_guess = np.broadcast_to(np.asarray(initial_param_guess, dtype=float), (n_sweeps, 4))
+
+    calibration_idx = np.arange(0, n_sweeps, max(int(calibration_interval), 1))
+    calibration_freq, calibration_param = calculate_sweep_resonance_frequencies(
+        frequency_matrix[calibration_idx], phase_matrix[calibration_idx], initial_param_guess[calibration_idx],
+        lower_param_bounds, upper_param_bounds, **kwargs)
+
+    sweep_idx = np.arange(n_sweeps)
+    curve_fit_parameter = np.stack([np.interp(sweep_idx, calibration_idx, calibration_param[:, i]) for i in range(3)],
+                                   axis=1)
+    resonance_frequency = track_resonance_frequencies(frequency_matrix, phase_matrix, curve_fit_parameter[:, 1],
+                                                      curve_fit_parameter[:, 2], window_half_width)
+    resonance_frequency[calibration_idx] = calibration_freq
+    curve_fit_parameter[calibration_idx] = calibration_param
+
+    # Sweeps without valid tracked crossing are fitted like the calibration sweeps. Sweeps with NaN's stay NaN.
+    is_finite = np.all(np.isfinite(frequency_matrix) & np.isfinite(phase_matrix), axis=1)
+    fallback_idx = np.flatnonzero(~np.isfinite(resonance_frequency) & is_finite)
+    if len(fallback_idx) > 0:
+        resonance_frequency[fallback_idx], curve_fit_parameter[fallback_idx] = calculate_sweep_resonance_frequencies(
+            frequency_matrix[fallback_idx], phase_matrix[fallback_idx], initial_param_guess[fallback_idx],
+            lower_param_bounds, upper_param_bounds, **kwargs)
+
+    return resonance_frequency, curve_fit_parameter
+
+
+def track_resonance_frequencies(frequency_matrix, phase_matrix, background_slope, background_offset,
+                                window_half_width=25):
+    """Estimates the resonance frequency of all sweeps at once as the zero crossing of the detrended phase. The phase \
+    response (defined in pyIMD.analysis.curve_fit) minus its linear background is zero at the resonance frequency \
+    and increases monotonically, hence the crossing lies after the number of negative points. A cubic polynomial is \
+    fitted by linear least squares to the window around it and its root is found with a few Newton steps. Sweeps \
+    without valid crossing (NaN's, no crossing within the sweep, a flat or falling polynomial at the root or a root \
+    outside the frequency range of the sweep) are NaN.
+
+    Args:
+        frequency_matrix (`float array`):       Frequencies of all sweeps [in kHz] (n_sweeps x n_points array)
+        phase_matrix (`float array`):           Phases of all sweeps [in Rad] (n_sweeps x n_points array)
+        background_slope (`float array`):       Linear factor of the background of each sweep (n_sweeps array)
+        background_offset (`float array`):      Offset of the background of each sweep (n_sweeps array)
+        window_half_width (`int`):              Number of points on each side of the zero crossing used for the \
+                                                local polynomial (optional)
+
+    Returns:
+        resonance_frequency (`float array`):    Resonance frequency of each sweep [in kHz] (n_sweeps array). NaN for \
+                                                sweeps without valid crossing.
+    """
+    frequency_matrix = np.asarray(frequency_matrix, dtype=float)
+    n_sweeps, n_points = frequency_matrix.shape
+    window_half_width = min(int(window_half_width), (n_points - 1) // 2)
+    detrended_phase = np.asarray(phase_matrix, dtype=float) - \
+        np.asarray(background_slope, dtype=float)[:, None] * frequency_matrix - \
+        np.asarray(background_offset, dtype=float)[:, None]
+
+    n_negative = np.sum(detrended_phase < 0, axis=1)
+    center = np.clip(n_negative, window_half_width, n_points - window_half_width - 1)
+    window = center[:, None] + np.arange(-window_half_width, window_half_width + 1)
+    rows = np.arange(n_sweeps)[:, None]
+    center_frequency = frequency_matrix[rows[:, 0], center]
+    t = frequency_matrix[rows, window] - center_frequency[:, None]
+
+    powers = np.arange(4)
+    vandermonde = t[:, :, None] ** powers
+    normal_matrix = np.einsum('nki,nkj->nij', vandermonde, vandermonde)
+    normal_vector = np.einsum('nki,nk->ni', vandermonde, detrended_phase[rows, window])
+    # Windows with NaN's are solved with the identity matrix to keep the others, their root is invalid anyway
+    is_valid = np.all(np.isfinite(normal_matrix), axis=(1, 2)) & np.all(np.isfinite(normal_vector), axis=1)
+    normal_matrix[~is_valid] = np.eye(4)
+    try:
+        coefficients = np.linalg.solve(normal_matrix, normal_vector[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # Singular window (i.e. constant frequency)
+        coefficients = np.einsum('nij,nj->ni', np.linalg.pinv(normal_matrix), normal_vector)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        root = -coefficients[:, 0] / coefficients[:, 1]
+        for _ in range(3):
+            value = np.sum(coefficients * root[:, None] ** powers, axis=1)
+            derivative = np.sum(coefficients[:, 1:] * powers[1:] * root[:, None] ** powers[:-1], axis=1)
+            root = root - value / derivative
+        resonance_frequency = center_frequency + root
+
+    # The phase rises through the crossing, which lies within the sweep (not before its first or after its last point)
+    is_valid &= (n_negative > 0) & (n_negative < n_points) & np.isfinite(derivative) & (derivative > 0) & \
+        (resonance_frequency >= np.min(frequency_matrix, axis=1)) & \
+        (resonance_frequency <= np.max(frequency_matrix, axis=1))
+    resonance_frequency[~is_valid] = np.nan
+    return resonance_frequency
+
+
+def _fit_sweep_chunk(frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds, upper_param_bounds,
+                     fit_mode, warm_start, residual_jump_factor, show_progress=False):
+    """Fits a contiguous chunk of sweeps in the current process. See calculate_sweep_resonance_frequencies.
+    """
+    if fit_mode == 'Batch':
+        return fit_resonance_batch(frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds,
+                                   upper_param_bounds)
+
+    n_sweeps = frequency_matrix.shape[0]
+    resonance_frequency = np.empty(n_sweeps)
+    curve_fit_parameter = np.empty((n_sweeps, 3))
+    param_guess = initial_param_guess[0]
+    previous_rms = None
+    for iSweep in trange(0, n_sweeps, disable=not show_progress):
+        x = frequency_matrix[iSweep]
+        y = phase_matrix[iSweep]
+        if warm_start and previous_rms is not None:
+            try:
+                res_freq, param = calculate_resonance_frequencies(x, y, param_guess, lower_param_bounds,
+                                                                  upper_param_bounds)
+                rms = _calculate_fit_rms(x, y, res_freq, param)
+                has_failed = rms > residual_jump_factor * previous_rms or \
+                    _is_at_bounds(np.append(res_freq, param), lower_param_bounds, upper_param_bounds)
+            except (RuntimeError, ValueError):
+                has_failed = True
+                rms = np.inf
+            if has_failed:
+                # Fall back to the configured initial parameter guess and keep the better fit
+                fallback_res_freq, fallback_param = calculate_resonance_frequencies(x, y, initial_param_guess[iSweep],
+                                                                                    lower_param_bounds,
+                                                                                    upper_param_bounds)
+                fallback_rms = _calculate_fit_rms(x, y, fallback_res_freq, fallback_param)
+                if fallback_rms <= rms:
+                    res_freq, param, rms = fallback_res_freq, fallback_param, fallback_rms
+        else:
+            res_freq, param = calculate_resonance_frequencies(x, y, initial_param_guess[iSweep], lower_param_bounds,
+                                                              upper_param_bounds)
+            rms = _calculate_fit_rms(x, y, res_freq, param) if warm_start else None
+
+        resonance_frequency[iSweep] = res_freq
+        curve_fit_parameter[iSweep] = param
+        if warm_start:
+            previous_rms = max(rms, np.finfo(float).tiny)
+            param_guess = np.append(res_freq, param)
+
+    return resonance_frequency, curve_fit_parameter
+
+
+def _calculate_fit_rms(frequency_array, phase_array, resonance_frequency, curve_fit_parameter):
+    """Calculates the root mean square residual of a fit of the phase response.
+    """
+    residual = phase_array - fit_function(frequency_array, resonance_frequency, *curve_fit_parameter)
+    return np.sqrt(np.mean(residual * residual))
+
+
+def _is_at_bounds(params, lower_param_bounds, upper_param_bounds):
+    """Returns True if any fit parameter is (numerically) at its lower or upper bound.
+    """
+    lower = np.asarray(lower_param_bounds, dtype=float)
+    upper = np.asarray(upper_param_bounds, dtype=float)
+    tolerance = 1e-6 * (upper - lower)
+    return bool(np.any(params <= lower + tolerance) or np.any(params >= upper - tolerance))
+
+
 def calculate_position_correction(cell_position, cantilever_length):
 
     """Calculates the correction factor with which the measured mass needs to be
@@ -35,3 +35,27 @@ def fit_function(x, fn, q, a, b):
     return phase
 
 
+def fit_function_jacobian(x, fn, q, a, b):
+    """Defines the analytic Jacobian of fit_function with respect to its parameters fn, q, a and b. It is passed to \
+    the curve fitting (jac argument) to avoid the finite difference approximation of the derivatives.
+
+    Args:
+         x (`float`):              Frequency (the independent variable of that function)
+         fn (`float`):             Natural resonance frequency
+         q (`float`):              Q factor (losses)
+         a (`float`):              Linear factor accounting for a linear background
+         b (`float`):              Constant Phase-Offset
+
+    Returns:
+        jacobian (`float array`):  Returns the partial derivatives of the phase with respect to fn, q, a and b stacked \
+                                   along the last axis (i.e. len(x) x 4 array).
+    """
+
+    x = np.asarray(x, dtype=float)
+    ratio = fn / x - x / fn
+    d_arctan = -1 / (1 + (q * ratio) ** 2)
+    d_fn = d_arctan * q * (1 / x + x / (fn * fn))
+    d_q = d_arctan * ratio
+    d_fn, d_q, d_a = np.broadcast_arrays(d_fn, d_q, x)
+    jacobian = np.stack([d_fn, d_q, d_a, np.ones_like(d_a)], axis=-1)
+    return jacobian
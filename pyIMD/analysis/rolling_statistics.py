@@ -0,0 +1,187 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import math
+import numpy as np
+from bisect import bisect_left, insort
+from collections import deque
+from pandas import DataFrame, RangeIndex
+
+__author__ = 'Andreas P. Cuny'
+
+STATISTICS = ['mean', 'median', 'std', 'min', 'max']
+# Maximal number of samples of which the mean and the standard deviation are calculated from the same cumulative sums
+BLOCK_SIZE = 10000
+
+
+class RollingStatistics(object):
+    """
+    Rolling window statistics of a series fed chunk by chunk (i.e. the mass of a running measurement). The results \
+    of all chunks are the pandas rolling statistics of the full series \
+    (series.rolling(window=window_size, min_periods=min_periods).mean() etc.): NaN values (i.e. masked regions) are \
+    skipped but take up their place in the window and a window with less than min_periods values gives NaN. The \
+    median, minimum and maximum are identical, the mean and the standard deviation are equal up to rounding errors.
+
+    The mean and the standard deviation are calculated vectorized from cumulative sums over the last window_size \
+    samples of the previous chunks and the new chunk (in blocks of at most BLOCK_SIZE samples to bound rounding \
+    errors). The minimum and the maximum are updated with monotonic queues (O(1) amortized per sample), the median \
+    is taken from the sorted values of the window (O(log(window_size)) search per sample).
+    """
+
+    def __init__(self, window_size, min_periods=None, statistics=('mean',)):
+        """
+        Constructs a RollingStatistics object.
+
+        Args:
+            window_size (`int`):       Number of samples of the rolling window.
+            min_periods (`int`):       Minimal number of values (not NaN) in the window needed for a result. \
+                                       Defaults to window_size like pandas. (optional)
+            statistics (`list`):       Statistics calculated: mean, median, std, min and/or max. (optional)
+        """
+        if not (type(window_size) == int and window_size >= 1):
+            raise Exception("Window size should be of type int and >= 1.")
+        if min_periods is None:
+            min_periods = window_size
+        if not (type(min_periods) == int and 0 <= min_periods <= window_size):
+            raise Exception("Minimal number of periods should be of type int between 0 and the window size.")
+        for name in statistics:
+            if name not in STATISTICS:
+                raise Exception("Statistic {} is not supported. Use {}.".format(name, ', '.join(STATISTICS)))
+        self.window_size = window_size
+        self.min_periods = min_periods
+        self.statistics = list(statistics)
+        self.n_samples = 0
+        # Last window_size samples, padded with NaN (which is never added or removed) before the first samples
+        self._history = np.full(window_size, np.nan)
+        self._sorted_values = []
+        self._min_queue = deque()
+        self._max_queue = deque()
+
+    def update(self, values):
+        """
+        Adds the next chunk of samples and calculates the statistics of the windows ending at these samples.
+
+        Args:
+            values (`float array`):    Next samples of the series. Pandas series, numpy array or list.
+
+        Returns:
+            statistics (`pandas data frame`): Returns a data frame with one column per statistic and one row per \
+                                              sample. The index continues the sample count of previous chunks.
+        """
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        # The window ending at values[i] is history_values[i + 1:i + window_size + 1]
+        history_values = np.concatenate([self._history, values])
+        valid_count = np.cumsum(~np.isnan(history_values))
+        nobs = valid_count[self.window_size:] - valid_count[0:n]
+
+        result = {}
+        if 'mean' in self.statistics or 'std' in self.statistics:
+            result['mean'], result['std'] = self._update_moments(history_values, nobs)
+        if 'median' in self.statistics or 'min' in self.statistics or 'max' in self.statistics:
+            # The sample leaving the window when values[i] enters it is history_values[i]
+            leaving = history_values[0:n].tolist()
+            entering = values.tolist()
+            for name in self.statistics:
+                if name == 'median':
+                    result[name] = self._update_median(leaving, entering)
+                elif name in ['min', 'max']:
+                    result[name] = self._update_extreme(entering, self._min_queue if name == 'min' else
+                                                        self._max_queue, name == 'min')
+        for name in self.statistics:
+            result[name][nobs < max(self.min_periods, 1)] = np.nan
+
+        self._history = history_values[n:]
+        self.n_samples += n
+        return DataFrame({name: result[name] for name in self.statistics},
+                         index=RangeIndex(self.n_samples - n, self.n_samples), columns=self.statistics)
+
+    def _update_moments(self, history_values, nobs):
+        n = len(nobs)
+        mean = np.empty(n)
+        std = np.empty(n)
+        for start in range(0, n, BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, n)
+            mean[start:stop], std[start:stop] = self._calculate_moments(
+                history_values[start:stop + self.window_size], nobs[start:stop])
+        return mean, std
+
+    def _calculate_moments(self, samples, nobs):
+        # Mean and standard deviation of the windows ending at samples[window_size:] from the cumulative sums of the
+        # samples shifted by their mean (which keeps the sums small compared to the values)
+        n = len(nobs)
+        is_valid = ~np.isnan(samples)
+        shift = samples[is_valid].mean() if is_valid.any() else 0.0
+        deviation = np.where(is_valid, samples - shift, 0.0)
+        window_sum = self._window_sums(deviation, n)
+        window_square_sum = self._window_sums(deviation * deviation, n)
+        window_neg_ct = self._window_sums(is_valid & np.signbit(samples), n)
+
+        # A window holding repeatedly the same value gives this value and no deviation (see pandas roll_mean and
+        # roll_var). n_same is the number of valid samples equal to the last one without another value in between.
+        valid_index = np.flatnonzero(is_valid)
+        valid_values = samples[valid_index]
+        is_changed = np.ones(len(valid_values), dtype=bool)
+        is_changed[1:] = valid_values[1:] != valid_values[:-1]
+        valid_order = np.arange(len(valid_values))
+        n_same_valid = valid_order - np.maximum.accumulate(np.where(is_changed, valid_order, 0)) + 1
+        last_valid = np.cumsum(is_valid)[self.window_size:] - 1
+        has_valid = last_valid >= 0
+        last_valid = np.maximum(last_valid, 0)
+        n_same = np.where(has_valid, n_same_valid[last_valid] if len(valid_values) else 0, 0)
+        is_constant = (nobs > 0) & (n_same >= nobs)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = shift + window_sum / nobs
+            variance = (window_square_sum - window_sum * window_sum / nobs) / (nobs - 1)
+        mean[((window_neg_ct == 0) & (mean < 0)) | ((window_neg_ct == nobs) & (mean > 0))] = 0.0
+        std = np.sqrt(np.maximum(variance, 0.0))
+        if is_constant.any():
+            mean[is_constant] = valid_values[last_valid[is_constant]]
+            std[is_constant] = 0.0
+        mean[nobs == 0] = np.nan
+        std[nobs < 2] = np.nan
+        return mean, std
+
+    def _window_sums(self, values, n):
+        cumulative_sum = np.concatenate([[0], np.cumsum(values)])
+        return cumulative_sum[self.window_size + 1:self.window_size + n + 1] - cumulative_sum[1:n + 1]
+
+    def _update_median(self, leaving, entering):
+        result = np.empty(len(entering))
+        sorted_values = self._sorted_values
+        for i, (old, val) in enumerate(zip(leaving, entering)):
+            if old == old:
+                del sorted_values[bisect_left(sorted_values, old)]
+            if val == val:
+                insort(sorted_values, val)
+            n = len(sorted_values)
+            if n == 0:
+                result[i] = math.nan
+            elif n % 2:
+                result[i] = sorted_values[n // 2]
+            else:
+                result[i] = (sorted_values[n // 2 - 1] + sorted_values[n // 2]) / 2
+        return result
+
+    def _update_extreme(self, entering, queue, is_min):
+        # The queue holds (sample index, value) of the candidates for the extreme of the window. The values are
+        # increasing (min) or decreasing (max), hence the extreme is the first candidate.
+        result = np.empty(len(entering))
+        for i, val in enumerate(entering, self.n_samples):
+            if val == val:
+                while queue and (queue[-1][1] >= val if is_min else queue[-1][1] <= val):
+                    queue.pop()
+                queue.append((i, val))
+            while queue and queue[0][0] <= i - self.window_size:
+                queue.popleft()
+            result[i - self.n_samples] = queue[0][1] if queue else math.nan
+        return result
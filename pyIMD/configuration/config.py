@@ -55,6 +55,24 @@ class Settings(object):
         self.cantilever_length = CANTILEVER_LENGTH
         self.cell_position = CELL_POSITION
         self.text_data_delimiter = TEXT_DATA_DELIMITER
+        self.sweep_fit_mode = SWEEP_FIT_MODE
+        self.sweep_fit_warm_start = SWEEP_FIT_WARM_START
+        self.n_workers = N_WORKERS
+        self.auto_initial_parameter_guess = AUTO_INITIAL_PARAMETER_GUESS
+        self.peak_tracking_calibration_interval = PEAK_TRACKING_CALIBRATION_INTERVAL
+        self.sweep_n_points = SWEEP_N_POINTS
+        self.text_data_cache = TEXT_DATA_CACHE
+        self.result_format = RESULT_FORMAT
+        self.result_cache_path = RESULT_CACHE_PATH
+        self.result_cache_size_mb = RESULT_CACHE_SIZE_MB
+        self.sweep_checkpoint_interval = SWEEP_CHECKPOINT_INTERVAL
+        self.create_figures = CREATE_FIGURES
+        self.figure_n_workers = FIGURE_N_WORKERS
+        self.figure_backend = FIGURE_BACKEND
+        self.figure_downsampling = FIGURE_DOWNSAMPLING
+        self.sweep_figure_interval = SWEEP_FIGURE_INTERVAL
+        self.sweep_figure_max_count = SWEEP_FIGURE_MAX_COUNT
+        self.sweep_figure_layout = SWEEP_FIGURE_LAYOUT
         # Project parameters
         self.project_folder_path = ''
         self.calculation_mode = 'PLL'
@@ -233,7 +251,8 @@ class Settings(object):
     figure_plot_every_nth_point = property(operator.attrgetter('_figure_plot_every_nth_point'))
     """
     Parameter defining how many data points are used for visualization. For very large data sets a number > 1 could 
-    increase the readability of the figure and lower the file size.
+    increase the readability of the figure and lower the file size. Only used if figure_downsampling is none, otherwise
+    the points are reduced to the pixel budget of the figure.
 
     Args:
         nth_point (`int`):    Pdf and png ar currently supported.
@@ -459,6 +478,263 @@ class Settings(object):
             raise Exception("Data text delimiter should be a of type string.")
         self._text_data_delimiter = delimiter
 
+    sweep_fit_mode = property(operator.attrgetter('_sweep_fit_mode'))
+    """
+      Parameter defining how the sweeps of a Cont.Sweep measurement are fitted.
+
+      Args:
+          mode (`str`):    Sequential fits one sweep after the other, Batch fits all sweeps at once.
+    """
+    @sweep_fit_mode.setter
+    def sweep_fit_mode(self, mode):
+        if not (type(mode) == str and mode in ['Sequential', 'Batch']):
+            raise Exception("Sweep fit mode should be of type str. Sequential or Batch")
+        self._sweep_fit_mode = mode
+
+    sweep_fit_warm_start = property(operator.attrgetter('_sweep_fit_warm_start'))
+    """
+      Parameter defining if the fit of a sweep is seeded with the fit parameters of the previous sweep. Only used in
+      the Sequential sweep fit mode.
+
+      Args:
+          warm_start (`bool`):    True seeds each sweep fit with the previous result. False uses the initial parameter
+                                  guess for every sweep.
+    """
+    @sweep_fit_warm_start.setter
+    def sweep_fit_warm_start(self, warm_start):
+        if not (type(warm_start) == bool):
+            raise Exception("Sweep fit warm start should be of type bool.")
+        self._sweep_fit_warm_start = warm_start
+
+    n_workers = property(operator.attrgetter('_n_workers'))
+    """
+      Parameter defining the number of worker processes used to fit the sweeps of a Cont.Sweep measurement in parallel.
+
+      Args:
+          n_workers (`int`):    Number of worker processes. 1 fits all sweeps in the current process.
+    """
+    @n_workers.setter
+    def n_workers(self, n_workers):
+        if not (type(n_workers) == int and n_workers > 0):
+            raise Exception("Number of workers should be of type int and > 0.")
+        self._n_workers = n_workers
+
+    auto_initial_parameter_guess = property(operator.attrgetter('_auto_initial_parameter_guess'))
+    """
+      Parameter defining if the initial parameter guess of every phase response fit is estimated from the data
+      (see pyIMD.analysis.calculations.estimate_initial_parameter_guess) instead of using the initial parameter guess.
+
+      Args:
+          is_auto (`bool`):    True estimates the initial parameter guess from the data. The initial parameter guess is
+                               only used for data without resonance. False uses the initial parameter guess.
+    """
+    @auto_initial_parameter_guess.setter
+    def auto_initial_parameter_guess(self, is_auto):
+        if not (type(is_auto) == bool):
+            raise Exception("Auto initial parameter guess should be of type bool.")
+        self._auto_initial_parameter_guess = is_auto
+
+    peak_tracking_calibration_interval = property(operator.attrgetter('_peak_tracking_calibration_interval'))
+    """
+      Parameter defining every how many sweeps the full phase response fit is run in the Peak.Tracking calculation
+      mode. The fits calibrate the background used to track the resonance frequency of the sweeps in between.
+
+      Args:
+          interval (`int`):    Fit every nth sweep. 1 fits every sweep.
+    """
+    @peak_tracking_calibration_interval.setter
+    def peak_tracking_calibration_interval(self, interval):
+        if not (type(interval) == int and interval > 0):
+            raise Exception("Peak tracking calibration interval should be of type int and > 0.")
+        self._peak_tracking_calibration_interval = interval
+
+    sweep_n_points = property(operator.attrgetter('_sweep_n_points'))
+    """
+      Parameter defining the number of points of each sweep of a Cont.Sweep measurement.
+
+      Args:
+          n_points (`int`):    Number of points per sweep.
+    """
+    @sweep_n_points.setter
+    def sweep_n_points(self, n_points):
+        if not (type(n_points) == int and n_points > 0):
+            raise Exception("Number of sweep points should be of type int and > 0.")
+        self._sweep_n_points = n_points
+
+    text_data_cache = property(operator.attrgetter('_text_data_cache'))
+    """
+      Parameter defining if the measured data of text files is cached as numpy array (.npy) next to the source
+      file. The cache is memory mapped on subsequent runs and refreshed if the source file or the read parameters change.
+
+      Args:
+          is_cached (`bool`):    True caches the parsed measured data. False parses the text file on every run.
+    """
+    @text_data_cache.setter
+    def text_data_cache(self, is_cached):
+        if not (type(is_cached) == bool):
+            raise Exception("Text data cache should be of type bool.")
+        self._text_data_cache = is_cached
+
+    result_format = property(operator.attrgetter('_result_format'))
+    """
+      Parameter defining the file format of the calculated cell mass results. Binary formats are compressed and
+      store the fit parameters and the run metadata alongside the mass (see pyIMD.io.write_to_disk.write_results).
+
+      Args:
+          file_format (`str`):    csv, parquet, feather (require pyarrow, pip install pyIMD[parquet]) or hdf5
+                                  (requires pytables, pip install pyIMD[hdf5]).
+    """
+    @result_format.setter
+    def result_format(self, file_format):
+        if not (file_format in ['csv', 'parquet', 'feather', 'hdf5']):
+            raise Exception("Result format should be one of csv, parquet, feather or hdf5.")
+        self._result_format = file_format
+
+    result_cache_path = property(operator.attrgetter('_result_cache_path'))
+    """
+      Parameter defining the directory of the result cache (see pyIMD.io.result_cache.ResultCache). Fit results and
+      the calculated mass are cached by the content of the data files and the settings they depend on, such that
+      unchanged projects are not recomputed. An empty path disables the cache.
+
+      Args:
+          path (`str`):    Path to the cache directory. Empty to disable the cache.
+    """
+    @result_cache_path.setter
+    def result_cache_path(self, path):
+        if not (type(path) == str):
+            raise Exception("Result cache path should be of type string.")
+        self._result_cache_path = path
+
+    result_cache_size_mb = property(operator.attrgetter('_result_cache_size_mb'))
+    """
+      Parameter defining the size budget of the result cache. The least recently used entries are evicted if the
+      cache exceeds it.
+
+      Args:
+          size (`float`):    Size budget of the result cache [in MB]
+    """
+    @result_cache_size_mb.setter
+    def result_cache_size_mb(self, size):
+        if not ((type(size) == float or type(size) == int) and size > 0):
+            raise Exception("Result cache size should be float or int and > 0.")
+        self._result_cache_size_mb = size
+
+    sweep_checkpoint_interval = property(operator.attrgetter('_sweep_checkpoint_interval'))
+    """
+      Parameter defining after how many fitted sweeps the fit results of a Cont.Sweep run are appended to a
+      checkpoint file in the project folder (see pyIMD.io.sweep_checkpoint.SweepCheckpoint). An interrupted run resumes
+      from the last checkpoint. 0 disables checkpointing.
+
+      Args:
+          interval (`int`):    Number of sweeps per checkpoint. 0 disables checkpointing.
+    """
+    @sweep_checkpoint_interval.setter
+    def sweep_checkpoint_interval(self, interval):
+        if not (type(interval) == int and interval >= 0):
+            raise Exception("Sweep checkpoint interval should be of type int and >= 0.")
+        self._sweep_checkpoint_interval = interval
+
+    create_figures = property(operator.attrgetter('_create_figures'))
+    """
+      Parameter defining if figures are created. Disable it to increase the throughput of batch runs.
+
+      Args:
+          is_create (`bool`):    Figures are created if True.
+    """
+    @create_figures.setter
+    def create_figures(self, is_create):
+        if not (type(is_create) == bool):
+            raise Exception("Create figures should be of type bool.")
+        self._create_figures = is_create
+
+    figure_n_workers = property(operator.attrgetter('_figure_n_workers'))
+    """
+      Parameter defining the number of background processes rendering the figures while the calculation continues
+      (see pyIMD.plotting.figure_queue.FigureQueue). Defaults to 1. 0 renders the figures in the calculating process,
+      which is also done if no process can be started.
+
+      Args:
+          n_workers (`int`):    Number of figure rendering processes.
+    """
+    @figure_n_workers.setter
+    def figure_n_workers(self, n_workers):
+        if not (type(n_workers) == int and n_workers >= 0):
+            raise Exception("Number of figure workers should be of type int and >= 0.")
+        self._figure_n_workers = n_workers
+
+    figure_backend = property(operator.attrgetter('_figure_backend'))
+    """
+      Parameter defining the library rendering the figures. plotnine (pyIMD.plotting.figures) or matplotlib, which draws
+      the same figures directly on the Agg canvas and is faster (pyIMD.plotting.agg_figures).
+
+      Args:
+          backend (`str`):    plotnine or matplotlib
+    """
+    @figure_backend.setter
+    def figure_backend(self, backend):
+        if not (backend in ['plotnine', 'matplotlib']):
+            raise Exception("Figure backend should be 'plotnine' or 'matplotlib'.")
+        self._figure_backend = backend
+
+    figure_downsampling = property(operator.attrgetter('_figure_downsampling'))
+    """
+      Parameter defining how the points of the mass figure are reduced to a budget of two points per pixel of the
+      figure width (see pyIMD.plotting.downsampling.downsample). min_max keeps the extremes of each pixel, lttb the
+      points of the largest triangle three buckets algorithm and none plots every nth point (see
+      figure_plot_every_nth_point).
+
+      Args:
+          method (`str`):    min_max, lttb or none
+    """
+    @figure_downsampling.setter
+    def figure_downsampling(self, method):
+        if not (method in ['min_max', 'lttb', 'none']):
+            raise Exception("Figure downsampling should be 'min_max', 'lttb' or 'none'.")
+        self._figure_downsampling = method
+
+    sweep_figure_interval = property(operator.attrgetter('_sweep_figure_interval'))
+    """
+      Parameter defining every how many sweeps the phase response and its fit are plotted as diagnostic figure
+      (ResFreqSweep) of a Cont.Sweep or Peak.Tracking run. 0 disables the diagnostic figures.
+
+      Args:
+          interval (`int`):    Number of sweeps between diagnostic figures. 0 disables them.
+    """
+    @sweep_figure_interval.setter
+    def sweep_figure_interval(self, interval):
+        if not (type(interval) == int and interval >= 0):
+            raise Exception("Sweep figure interval should be of type int and >= 0.")
+        self._sweep_figure_interval = interval
+
+    sweep_figure_max_count = property(operator.attrgetter('_sweep_figure_max_count'))
+    """
+      Parameter defining the maximal number of diagnostic sweep figures of a run. If the sweep figure interval selects
+      more sweeps, this many sweeps evenly spread over the selected ones are plotted. None plots all selected sweeps.
+
+      Args:
+          max_count (`int`):    Maximal number of diagnostic sweep figures. None plots all selected sweeps.
+    """
+    @sweep_figure_max_count.setter
+    def sweep_figure_max_count(self, max_count):
+        if not (max_count is None or (type(max_count) == int and max_count >= 1)):
+            raise Exception("Maximal sweep figure count should be None or of type int and >= 1.")
+        self._sweep_figure_max_count = max_count
+
+    sweep_figure_layout = property(operator.attrgetter('_sweep_figure_layout'))
+    """
+      Parameter defining how the diagnostic sweep figures are written. files writes one figure file per sweep
+      (ResFreqSweep_<row>), pdf all figures as pages of one pdf file and montage all figures tiled into one image
+      (ResFreqSweeps).
+
+      Args:
+          layout (`str`):    files, pdf or montage
+    """
+    @sweep_figure_layout.setter
+    def sweep_figure_layout(self, layout):
+        if not (layout in ['files', 'pdf', 'montage']):
+            raise Exception("Sweep figure layout should be 'files', 'pdf' or 'montage'.")
+        self._sweep_figure_layout = layout
+
     project_folder_path = property(operator.attrgetter('_project_folder_path'))
     """
        Parameter defining the path to the files.
@@ -477,7 +753,7 @@ class Settings(object):
        Parameter defining the calculation mode.
 
        Args:
-           mode (`str`):     The calculation mode. PLL, Cont.Sweep or Auto.
+           mode (`str`):     The calculation mode. PLL, Cont.Sweep, Peak.Tracking or Auto.
     """
     @calculation_mode.setter
     def calculation_mode(self, mode):
@@ -722,9 +998,9 @@ class Settings(object):
     def new_pyimd_project(self, pre_start_no_cell_path, pre_start_with_cell_path, measurements_path,
                           text_data_delimiter, read_text_data_from_line, calculation_mode, ** kwargs):
         """
-        Create a new pyIMD project with the following arguments. Two modes \
-        enable the analysis of different experimental setups. PLL mode and Cont.Sweep mode. For more information please
-        read the documentation.
+        Create a new pyIMD project with the following arguments. Three modes \
+        enable the analysis of different experimental setups. PLL mode, Cont.Sweep mode and Peak.Tracking mode. For more
+        information please read the documentation.
 
         Args:
             pre_start_no_cell_path (`str`):       File path + file name of initial frequency \
@@ -740,6 +1016,7 @@ class Settings(object):
                                                   and no data.
             calculation_mode (`str`):             PLL         := phase lock loops mode
                                                   Cont.Sweep  := sweep mode
+                                                  Peak.Tracking := sweep mode with resonance frequency tracking
                                                   Auto        := Auto detection of the mode (experimental)
         Keyword Args:
             figure_width (`float`):                  Width of result figures
@@ -793,6 +1070,25 @@ class Settings(object):
             number_of_data_per_frame (`float`):        Number of measurement points between two image frames.
             is_zero_outside_correction_range (`bool`):Bool determining if data will be set to zero outside of position
                                                      corrected range
+            sweep_fit_mode (`str`):                  Sweep fit mode (Sequential or Batch)
+            sweep_fit_warm_start (`bool`):           Seed each sweep fit with the result of the previous sweep
+            n_workers (`int`):                       Number of worker processes used to fit the sweeps
+            auto_initial_parameter_guess (`bool`):   Estimate the initial parameter guess of each fit from the data
+            peak_tracking_calibration_interval (`int`): Fit every nth sweep in Peak.Tracking mode
+            sweep_n_points (`int`):                  Number of points per sweep
+            text_data_cache (`bool`):                Cache the parsed measured text data next to the source file
+            result_format (`str`):                   File format of the results (csv, parquet, feather or hdf5)
+            result_cache_path (`str`):               Directory of the result cache. Empty disables the cache
+            result_cache_size_mb (`float`):          Size budget of the result cache [in MB]
+            sweep_checkpoint_interval (`int`):       Number of sweeps per checkpoint (0 disables checkpointing)
+            create_figures (`bool`):                 Figures are created if True
+            figure_n_workers (`int`):                Number of figure rendering processes (0 renders in process,
+                                                     default 1)
+            figure_backend (`str`):                  Library rendering the figures (plotnine or matplotlib)
+            figure_downsampling (`str`):             Downsampling of the mass figure (min_max, lttb or none)
+            sweep_figure_interval (`int`):           Number of sweeps between diagnostic sweep figures (0 disables them)
+            sweep_figure_max_count (`int`):          Maximal number of diagnostic sweep figures (empty plots all)
+            sweep_figure_layout (`str`):             Layout of the diagnostic sweep figures (files, pdf or montage)
         """
 
         try:
@@ -810,7 +1106,7 @@ class Settings(object):
                 self.text_data_delimiter = repr(text_data_delimiter).replace("'", "")
             if read_text_data_from_line == int(read_text_data_from_line) and read_text_data_from_line > 0:
                 self.read_text_data_from_line = read_text_data_from_line
-            if any(calculation_mode in s for s in ['Auto', 'PLL', 'Cont.Sweep']):
+            if any(calculation_mode in s for s in ['Auto', 'PLL', 'Cont.Sweep', 'Peak.Tracking']):
                 self.calculation_mode = calculation_mode
 
             for key, value in kwargs.items():
@@ -836,7 +1132,13 @@ class Settings(object):
             # Load pyIMD general settings (parameters)
             general_settings = doc['PyIMDSettings']['GeneralSettings']
             for key, value in general_settings.items():
-                if not key == 'text_data_delimiter':
+                if value is None:
+                    # Empty or white space only elements (i.e. an empty result_cache_path or a tab delimiter) keep
+                    # their current value, except the maximal sweep figure count for which empty means no cap
+                    if key == 'sweep_figure_max_count':
+                        self.sweep_figure_max_count = None
+                    continue
+                elif not key == 'text_data_delimiter':
                     try:
                         setattr(self, key, yaml.safe_load(json.loads(json.dumps(value))))
                     except Exception as e:
@@ -956,6 +1258,24 @@ class Settings(object):
             frequency_offset = etree.SubElement(general_settings, 'frequency_offset')
             read_text_data_from_line = etree.SubElement(general_settings, 'read_text_data_from_line')
             text_data_delimiter = etree.SubElement(general_settings, 'text_data_delimiter')
+            sweep_fit_mode = etree.SubElement(general_settings, 'sweep_fit_mode')
+            sweep_fit_warm_start = etree.SubElement(general_settings, 'sweep_fit_warm_start')
+            n_workers = etree.SubElement(general_settings, 'n_workers')
+            auto_initial_parameter_guess = etree.SubElement(general_settings, 'auto_initial_parameter_guess')
+            peak_tracking_calibration_interval = etree.SubElement(general_settings, 'peak_tracking_calibration_interval')
+            sweep_n_points = etree.SubElement(general_settings, 'sweep_n_points')
+            text_data_cache = etree.SubElement(general_settings, 'text_data_cache')
+            result_format = etree.SubElement(general_settings, 'result_format')
+            result_cache_path = etree.SubElement(general_settings, 'result_cache_path')
+            result_cache_size_mb = etree.SubElement(general_settings, 'result_cache_size_mb')
+            sweep_checkpoint_interval = etree.SubElement(general_settings, 'sweep_checkpoint_interval')
+            create_figures = etree.SubElement(general_settings, 'create_figures')
+            figure_n_workers = etree.SubElement(general_settings, 'figure_n_workers')
+            figure_backend = etree.SubElement(general_settings, 'figure_backend')
+            figure_downsampling = etree.SubElement(general_settings, 'figure_downsampling')
+            sweep_figure_interval = etree.SubElement(general_settings, 'sweep_figure_interval')
+            sweep_figure_max_count = etree.SubElement(general_settings, 'sweep_figure_max_count')
+            sweep_figure_layout = etree.SubElement(general_settings, 'sweep_figure_layout')
             # Add the SubSubElements for the project settings
             project_folder_path = etree.SubElement(project_settings, 'project_folder_path')
             data_pre_start_no_cell = etree.SubElement(project_settings, 'pre_start_no_cell_path')
@@ -1003,6 +1323,25 @@ class Settings(object):
             frequency_offset.text = str(self.frequency_offset)
             read_text_data_from_line.text = str(self.read_text_data_from_line)
             text_data_delimiter.text = self.text_data_delimiter
+            sweep_fit_mode.text = str(self.sweep_fit_mode)
+            sweep_fit_warm_start.text = str(self.sweep_fit_warm_start)
+            n_workers.text = str(self.n_workers)
+            auto_initial_parameter_guess.text = str(self.auto_initial_parameter_guess)
+            peak_tracking_calibration_interval.text = str(self.peak_tracking_calibration_interval)
+            sweep_n_points.text = str(self.sweep_n_points)
+            text_data_cache.text = str(self.text_data_cache)
+            result_format.text = str(self.result_format)
+            result_cache_path.text = str(self.result_cache_path)
+            result_cache_size_mb.text = str(self.result_cache_size_mb)
+            sweep_checkpoint_interval.text = str(self.sweep_checkpoint_interval)
+            create_figures.text = str(self.create_figures)
+            figure_n_workers.text = str(self.figure_n_workers)
+            figure_backend.text = str(self.figure_backend)
+            figure_downsampling.text = str(self.figure_downsampling)
+            sweep_figure_interval.text = str(self.sweep_figure_interval)
+            sweep_figure_max_count.text = '' if self.sweep_figure_max_count is None else \
+                str(self.sweep_figure_max_count)
+            sweep_figure_layout.text = str(self.sweep_figure_layout)
             project_folder_path.text = str(self.project_folder_path)
             data_pre_start_no_cell.text = str(self.pre_start_no_cell_path)
             data_pre_start_with_cell.text = str(self.pre_start_with_cell_path)
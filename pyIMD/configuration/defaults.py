@@ -34,3 +34,21 @@ READ_TEXT_DATA_FROM_LINE = 23
 CANTILEVER_LENGTH = 100
 CELL_POSITION = 5
 TEXT_DATA_DELIMITER = '\t'
+SWEEP_FIT_MODE = 'Sequential'
+SWEEP_FIT_WARM_START = False
+N_WORKERS = 1
+AUTO_INITIAL_PARAMETER_GUESS = False
+PEAK_TRACKING_CALIBRATION_INTERVAL = 50
+SWEEP_N_POINTS = 255
+TEXT_DATA_CACHE = False
+RESULT_FORMAT = 'csv'
+RESULT_CACHE_PATH = ''
+RESULT_CACHE_SIZE_MB = 1024
+SWEEP_CHECKPOINT_INTERVAL = 0
+CREATE_FIGURES = True
+FIGURE_N_WORKERS = 1
+FIGURE_BACKEND = 'plotnine'
+FIGURE_DOWNSAMPLING = 'min_max'
+SWEEP_FIGURE_INTERVAL = 100
+SWEEP_FIGURE_MAX_COUNT = None
+SWEEP_FIGURE_LAYOUT = 'files'
@@ -9,32 +9,55 @@
 # *     Andreas P. Cuny - initial API and implementation
 # *******************************************************************************/
 
-from PyQt5.QtWidgets import QApplication
 from pandas import concat, DataFrame
 from pyIMD.configuration.config import Settings
-from pyIMD.ui.settings import SettingsDialog
-from pyIMD.io.read_from_disk import read_from_text, read_from_file, read_tdms_metadata
-from pyIMD.io.write_to_disk import write_to_disk_as, write_concat_data
-from pyIMD.analysis.calculations import calculate_mass
+from pyIMD.io.read_from_disk import read_from_text, read_from_file
+from pyIMD.io.read_from_disk import read_sweep_block
+from pyIMD.io.write_to_disk import write_concat_data, write_results, check_result_format
+from pyIMD.io.result_cache import ResultCache, file_fingerprint
+from pyIMD.io.sweep_checkpoint import SweepCheckpoint
+from pyIMD.plotting.figure_queue import FigureQueue, render_figure, render_figure_pages
+from pyIMD.plotting.downsampling import get_figure_pixel_width
+from pyIMD.analysis.calculations import calculate_mass, calculate_pll_mass
 from pyIMD.analysis.calculations import calculate_resonance_frequencies, calculate_position_correction
+from pyIMD.analysis.calculations import calculate_sweep_resonance_frequencies, estimate_initial_parameter_guess
+from pyIMD.analysis.calculations import calculate_tracked_resonance_frequencies
+from pyIMD.analysis.rolling_statistics import RollingStatistics
 from pyIMD.configuration.defaults import *
-from pyIMD.utils.utils import set_backend
-from PyQt5.QtCore import pyqtSlot, QObject
-import matplotlib
-matplotlib.use(set_backend())
-from pyIMD.plotting.figures import plot_fitting, plot_response_shift, plot_mass
 import os
 import sys
+import time
+import shutil
 import logging
-from tqdm import trange
 import numpy as np
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from pyIMD import __version__
 
 __author__ = 'Andreas P. Cuny'
 
 
-class InertialMassDetermination(QObject):
+# Settings the cached fit results depend on (see InertialMassDetermination.get_cached_result)
+PRE_START_FIT_SETTINGS = ['text_data_delimiter', 'read_text_data_from_line', 'conversion_factor_hz_to_khz',
+                          'conversion_factor_deg_to_rad', 'initial_parameter_guess', 'lower_parameter_bounds',
+                          'upper_parameter_bounds', 'auto_initial_parameter_guess']
+SWEEP_FIT_SETTINGS = ['calculation_mode', 'conversion_factor_hz_to_khz', 'conversion_factor_deg_to_rad',
+                      'initial_parameter_guess', 'lower_parameter_bounds', 'upper_parameter_bounds',
+                      'auto_initial_parameter_guess', 'sweep_fit_mode', 'sweep_fit_warm_start',
+                      'peak_tracking_calibration_interval', 'sweep_n_points']
+# Settings the cached mass depends on in addition to the fit settings (see InertialMassDetermination.get_cached_mass)
+MASS_SETTINGS = ['calculation_mode', 'spring_constant', 'cell_position', 'cantilever_length', 'cell_offsets', 'area',
+                 'number_of_data_per_frame', 'image_start_index', 'position_correction_end_frame',
+                 'is_zero_outside_correction_range', 'conversion_factor_px_to_mum', 'rolling_window_size',
+                 'correct_for_frequency_offset', 'frequency_offset']
+# Settings splitting the sweeps into chunks. Only the warm start results depend on them (restart at each chunk).
+SWEEP_CHUNK_SETTINGS = ['n_workers', 'sweep_checkpoint_interval']
+# Columns of the measured PLL data (channels 0, 5 and 6 of the measurement file)
+PLL_COLUMNS = ['Time', 'Phase', 'Frequency']
+
+
+class InertialMassDetermination(object):
     """
     Constructs a IntertialMassDetermination object
     """
@@ -49,13 +72,11 @@ class InertialMassDetermination(QObject):
         self.settings = Settings()
         self.settings_dialog = None
         self._has_valid_configuration = 0
-        self._freq_idx = None
-        self._phase_idx = None
-        self._n_rows = None
         # Initialize data properties
         self.data_pre_start_no_cell = []
         self.data_pre_start_with_cell = []
         self.data_measured = []
+        self.sweep_block = None
         self.resonance_freq_pre_start_no_cell = []
         self.resonance_freq_pre_start_with_cell = []
         self.resonance_freq_measured = []
@@ -64,6 +85,11 @@ class InertialMassDetermination(QObject):
         self.fit_param_measured = []
         self.calculated_cell_mass = []
         self.position_correction_factor = []
+        self.last_error = None
+        # Pre start fits (and their figures) shared between the projects of a batch (see build_calibration_registry)
+        self.calibration_registry = None
+        # Renders the figures of a run in the background (see run_inertial_mass_determination)
+        self.figure_queue = None
 
         # Rename into self.settings.project_folder_path
         self.result_folder = []  # os.path.dirname(os.path.abspath(file_path3))
@@ -102,9 +128,9 @@ class InertialMassDetermination(QObject):
     def create_pyimd_project(self, pre_start_no_cell_path, pre_start_with_cell_path, measurements_path,
                              text_data_delimiter, read_text_data_from_line, calculation_mode, **kwargs):
         """
-        Create a pyIMD project with the following arguments. Two modes \
-        enable the analysis of different experimental setups. PLL mode and Cont.Sweep mode. For more information please
-        read the documentation.
+        Create a pyIMD project with the following arguments. Three modes \
+        enable the analysis of different experimental setups. PLL mode, Cont.Sweep mode and Peak.Tracking mode. For more
+        information please read the documentation.
 
         Args:
              pre_start_no_cell_path (`str`):       File path + file name of initial frequency \
@@ -119,6 +145,7 @@ class InertialMassDetermination(QObject):
                                                    Typically the first few lines contain header information and no data.
              calculation_mode (`str`):             PLL         := phase lock loops mode
                                                    Cont.Sweep  := sweep mode
+                                                   Peak.Tracking := sweep mode with resonance frequency tracking
                                                    Auto        := Auto detection of the mode (experimental)
         Keyword Args:
              figure_width (`float`):                  Width of result figures
@@ -169,6 +196,33 @@ class InertialMassDetermination(QObject):
              number_of_data_per_frame (`int`):        Number of measurement points between two image frames.
              is_zero_outside_correction_range (`bool`):Bool determining if data will be set to zero outside of position
                                                      corrected range
+             sweep_fit_mode (`str`):                  Sweep fit mode. Sequential fits one sweep after the other, Batch
+                                                      fits all sweeps at once.
+             sweep_fit_warm_start (`bool`):           Seed each sweep fit with the fit parameters of the previous sweep
+                                                      with a fallback to the initial parameter guess.
+             n_workers (`int`):                       Number of worker processes used to fit the sweeps in parallel.
+             auto_initial_parameter_guess (`bool`):   Estimate the initial parameter guess of each fit from the data
+                                                      instead of using initial_parameter_guess.
+             peak_tracking_calibration_interval (`int`): Fit every nth sweep in Peak.Tracking mode to calibrate
+                                                      the tracking of the resonance frequency.
+             sweep_n_points (`int`):                  Number of points per sweep in Cont.Sweep and Peak.Tracking mode.
+             text_data_cache (`bool`):                Cache the parsed measured text data as .npy next to the
+                                                      source file to skip parsing on subsequent runs.
+             result_format (`str`):                   File format of the results: csv (default), parquet, feather
+                                                      or hdf5. Binary formats include fit parameters and metadata.
+             result_cache_path (`str`):               Directory of the result cache to skip the fitting of unchanged
+                                                      data. Empty disables the cache.
+             result_cache_size_mb (`float`):          Size budget of the result cache [in MB].
+             sweep_checkpoint_interval (`int`):       Number of sweeps per checkpoint (0 disables checkpointing).
+             create_figures (`bool`):                 Figures are created if True.
+             figure_n_workers (`int`):                Number of figure rendering processes (0 renders in the calculating
+                                                      process, default 1).
+             figure_backend (`str`):                  Library rendering the figures (plotnine or matplotlib).
+             figure_downsampling (`str`):             Downsampling of the mass figure (min_max, lttb or none).
+             sweep_figure_interval (`int`):           Number of sweeps between diagnostic sweep figures (0 disables
+                                                      them).
+             sweep_figure_max_count (`int`):          Maximal number of diagnostic sweep figures (None plots all).
+             sweep_figure_layout (`str`):             Layout of the diagnostic sweep figures (files, pdf or montage).
         """
         try:
             self.settings.new_pyimd_project(pre_start_no_cell_path, pre_start_with_cell_path, measurements_path,
@@ -226,46 +280,47 @@ class InertialMassDetermination(QObject):
                              or png files directly to the disk.
         """
 
+        self.last_error = None
         if self._has_valid_configuration == 1:
             self.result_folder = self.settings.project_folder_path
             # Read data
             self.logger.info('Start reading all files')
             try:
+                # Fail before the calculation if the results cannot be written
+                check_result_format(self.settings.result_format)
+                if self.settings.create_figures:
+                    self.figure_queue = FigureQueue(self.settings.figure_n_workers)
                 self.data_pre_start_no_cell = read_from_text(self.settings.pre_start_no_cell_path,
                                                              self.settings.text_data_delimiter,
                                                              self.settings.read_text_data_from_line)
                 self.data_pre_start_with_cell = read_from_text(self.settings.pre_start_with_cell_path,
                                                                self.settings.text_data_delimiter,
                                                                self.settings.read_text_data_from_line)
-                self.data_measured = read_from_file(self.settings.measurements_path, self.settings.text_data_delimiter,
-                                                    header=None)
+                if self.settings.calculation_mode in ['Cont.Sweep', 'Peak.Tracking']:
+                    self.sweep_block = read_sweep_block(self.settings.measurements_path, self.settings.sweep_n_points)
+                    self.data_measured = []
+                    n_measured = self.sweep_block.n_sweeps
+                else:
+                    self.sweep_block = None
+                    # Only time [0], phase [5] and frequency [6] are used for PLL. Other TDMS channels are not read.
+                    self.data_measured = read_from_file(self.settings.measurements_path,
+                                                        self.settings.text_data_delimiter, header=None,
+                                                        channel_indices=[0, 5, 6],
+                                                        cache=self.settings.text_data_cache)
+                    self.data_measured.columns = PLL_COLUMNS
+                    n_measured = len(self.data_measured)
                 self.logger.info('Done reading all files')
-                if self.settings.calculation_mode == 'Cont.Sweep':
-                    # In case of sweep determine the correct rows
-                    self._freq_idx, self._phase_idx, self._n_rows = self.get_sweep_data_index()
 
                 # Convert data to the correct units
                 self.convert_data()
                 self.logger.info('Done converting units')
 
                 # Calc resonance frequency for pre start data without cell attached to cantilever
-                self.resonance_freq_pre_start_no_cell, self.fit_param_pre_start_no_cell = calculate_resonance_frequencies(
-                    self.data_pre_start_no_cell.iloc[:, 0], self.data_pre_start_no_cell.iloc[:, 2],
-                    self.settings.initial_parameter_guess, self.settings.lower_parameter_bounds,
-                    self.settings.upper_parameter_bounds)
-
-                figure_pre_start_no_cell = plot_fitting(self.data_pre_start_no_cell.iloc[:, 0],
-                                                        self.data_pre_start_no_cell.iloc[:, 2],
-                                                        self.resonance_freq_pre_start_no_cell,
-                                                        self.fit_param_pre_start_no_cell)
-
-                optional_fig_param = {'width': self.settings.figure_width, 'height': self.settings.figure_height,
-                                      'units': self.settings.figure_units,
-                                      'resolution': self.settings.figure_resolution_dpi}
-
-                write_to_disk_as(self.settings.figure_format, figure_pre_start_no_cell,
-                                 '{}'.format(self.result_folder + os.sep + self.settings.figure_name_pre_start_no_cell),
-                                 **optional_fig_param)
+                self.resonance_freq_pre_start_no_cell, self.fit_param_pre_start_no_cell = \
+                    self.fit_pre_start_data(self.data_pre_start_no_cell, self.settings.pre_start_no_cell_path,
+                                            self.settings.figure_name_pre_start_no_cell)
+
+                optional_fig_param = self.get_optional_figure_parameters()
                 self.logger.info('Done with pre start no cell resonance frequency calculation')
 
                 # Calc position correction for cell attached to cantilever
@@ -290,12 +345,8 @@ class InertialMassDetermination(QObject):
                                         self.settings.number_of_data_per_frame)
                     # Clip max_data_idx if higher than actual measured data. i. e if image_start_index is not 0
 
-                    if self.settings.calculation_mode == 'Cont.Sweep':
-                        if max_data_idx > (len(self.data_measured) / self._n_rows):
-                            max_data_idx = int(len(self.data_measured) / self._n_rows)
-                    else:
-                        if max_data_idx > len(self.data_measured):
-                            max_data_idx = len(self.data_measured)
+                    if max_data_idx > n_measured:
+                        max_data_idx = n_measured
 
                     new_x = np.linspace(min_data_idx, max_data_idx, int(pos_data['indices'].iloc[-1]))
                     interp_offsets = np.interp(new_x, pos_data['indices'], pos_data['offsets'])
@@ -303,17 +354,11 @@ class InertialMassDetermination(QObject):
 
                     # Define how measurements outside correction are treated. Either set to zero or left uncorrected
                     if self.settings.is_zero_outside_correction_range:
-                        position_correction_factor = np.zeros(len(self.data_measured))
-                        if self.settings.calculation_mode == 'Cont.Sweep':
-                            area = np.zeros(int(len(self.data_measured) / self._n_rows))
-                        else:
-                            area = np.zeros(len(self.data_measured))
+                        position_correction_factor = np.zeros(n_measured)
+                        area = np.zeros(n_measured)
                     else:
-                        position_correction_factor = np.ones(len(self.data_measured))
-                        if self.settings.calculation_mode == 'Cont.Sweep':
-                            area = np.ones(int(len(self.data_measured) / self._n_rows))
-                        else:
-                            area = np.ones(len(self.data_measured))
+                        position_correction_factor = np.ones(n_measured)
+                        area = np.ones(n_measured)
 
                     interp_offsets_corrected = calculate_position_correction(interp_offsets,
                                                                              self.settings.cantilever_length)
@@ -331,78 +376,65 @@ class InertialMassDetermination(QObject):
 
                 # Calc resonance frequency for pre start data with cell attached to cantilever
                 self.resonance_freq_pre_start_with_cell, self.fit_param_pre_start_with_cell = \
-                    calculate_resonance_frequencies(self.data_pre_start_with_cell.iloc[:, 0],
-                                                    self.data_pre_start_with_cell.iloc[:, 2],
-                                                    self.settings.initial_parameter_guess,
-                                                    self.settings.lower_parameter_bounds,
-                                                    self.settings.upper_parameter_bounds)
-
-                figure_pre_start_with_cell = plot_fitting(self.data_pre_start_with_cell.iloc[:, 0],
-                                                          self.data_pre_start_with_cell.iloc[:, 2],
-                                                          self.resonance_freq_pre_start_with_cell,
-                                                          self.fit_param_pre_start_with_cell)
-
-                write_to_disk_as(self.settings.figure_format, figure_pre_start_with_cell,
-                                 '{}'.format(self.result_folder + os.sep + self.settings.figure_name_pre_start_with_cell),
-                                 **optional_fig_param)
+                    self.fit_pre_start_data(self.data_pre_start_with_cell, self.settings.pre_start_with_cell_path,
+                                            self.settings.figure_name_pre_start_with_cell)
                 self.logger.info('Done with pre start with cell resonance frequency calculation')
 
-                fig = plot_response_shift(self.data_pre_start_no_cell.iloc[:, 0], self.data_pre_start_no_cell.iloc[:, 2],
-                                          self.resonance_freq_pre_start_no_cell, self.fit_param_pre_start_no_cell,
-                                          self.data_pre_start_with_cell.iloc[:, 0], self.data_pre_start_with_cell.iloc[:, 2],
-                                          self.resonance_freq_pre_start_with_cell, self.fit_param_pre_start_with_cell)
-
-                write_to_disk_as(self.settings.figure_format, fig,
-                                 '{}'.format(self.result_folder + os.sep + 'PreStartFrequencyShift'), **optional_fig_param)
+                self.write_figure('plot_response_shift',
+                                  (self.data_pre_start_no_cell.iloc[:, 0], self.data_pre_start_no_cell.iloc[:, 2],
+                                   self.resonance_freq_pre_start_no_cell, self.fit_param_pre_start_no_cell,
+                                   self.data_pre_start_with_cell.iloc[:, 0], self.data_pre_start_with_cell.iloc[:, 2],
+                                   self.resonance_freq_pre_start_with_cell, self.fit_param_pre_start_with_cell),
+                                  'PreStartFrequencyShift', **optional_fig_param)
                 self.logger.info('Done with pre start frequency shift figure generation')
-                if self.settings.calculation_mode == 'Cont.Sweep':
+                if self.settings.calculation_mode in ['Cont.Sweep', 'Peak.Tracking']:
                     # The continuous sweep mode
-                    self.calculated_cell_mass = []
-                    for iSweep in trange(0, len(self.data_measured), self._n_rows):
-                        # Default is 3 (Amplitude, Phase, Frequency) [+0, +1, +2]
-                        # Old Cytomass LabView is 4 (Offset, Frequency, Amplitude, Phase) [+0, +3, +1]
-                        # Calc resonance frequency and function fit for the ith sweep (iSweep)
-                        res_freq, param = calculate_resonance_frequencies(self.data_measured.iloc[iSweep + self._freq_idx, 0:255],
-                                                                          self.data_measured.iloc[iSweep + self._phase_idx, 0:255],
-                                                                          self.settings.initial_parameter_guess,
-                                                                          self.settings.lower_parameter_bounds,
-                                                                          self.settings.upper_parameter_bounds)
-                        # Calculate the mass for the ith sweep (iSweep)
-                        mass = calculate_mass(self.settings.spring_constant, res_freq, self.resonance_freq_pre_start_no_cell)
-                        # Store results in a list
-                        self.resonance_freq_measured.append(res_freq)
-                        self.fit_param_measured.append(param)
+                    frequency_matrix = self.sweep_block.frequency
+                    phase_matrix = self.sweep_block.phase
+                    n_sweeps = self.sweep_block.n_sweeps
+
+                    # Calc resonance frequency and function fit for all sweeps
+                    self.resonance_freq_measured, self.fit_param_measured = self.get_cached_result(
+                        'sweep_fit', [self.settings.measurements_path], self.get_sweep_fit_settings(), self.fit_sweeps)
+
+                    def calculate_sweep_mass():
+                        # Calculate the mass for all sweeps
+                        mass = calculate_mass(self.settings.spring_constant, self.resonance_freq_measured,
+                                              self.resonance_freq_pre_start_no_cell)
                         if len(self.settings.cell_offsets) == 0:
-                            self.calculated_cell_mass.append(mass * self.position_correction_factor)
+                            mass = mass * self.position_correction_factor
                         else:
-                            self.calculated_cell_mass.append(mass * self.position_correction_factor[int(iSweep/self._n_rows)])
-
-                        if np.remainder(iSweep, 300) == 0:
-                            figure_i_sweep = plot_fitting(self.data_measured.iloc[iSweep + self._freq_idx, 0:255].astype(float),
-                                                          self.data_measured.iloc[iSweep + self._phase_idx, 0:255].astype(float), res_freq, param)
-                            write_to_disk_as(self.settings.figure_format, figure_i_sweep,
-                                             '{}'.format(self.result_folder + os.sep + 'ResFreqSweep_' + str(iSweep)))
-                    calculated_cell_mass = concat([(self.data_measured.iloc[0:int(((len(self.data_measured)) / self._n_rows)-1), 256] -
-                                                    self.data_measured.iloc[0, 256]) / 3600,
-                                                   DataFrame(self.calculated_cell_mass, columns=['Mass (ng)'])], axis=1)
-                    calculated_cell_mass['Mean mass (ng)'] = calculated_cell_mass['Mass (ng)'].rolling(
-                        window=self.settings.rolling_window_size).mean()
-
-                    if len(self.settings.cell_offsets) != 0:
-                        calculated_cell_mass['Object area (um_sq)'] = area
+                            mass = mass * self.position_correction_factor[0:n_sweeps]
+
+                        sweep_time = pd.Series((self.sweep_block.time[0:n_sweeps - 1] - self.sweep_block.time[0]) /
+                                               3600, name='Time (h)')
+                        cell_mass = concat([sweep_time, DataFrame(mass, columns=['Mass (ng)'])], axis=1)
+                        cell_mass['Mean mass (ng)'] = RollingStatistics(self.settings.rolling_window_size).update(
+                            cell_mass['Mass (ng)'])['mean'].to_numpy()
+
+                        if len(self.settings.cell_offsets) != 0:
+                            cell_mass['Object area (um_sq)'] = area
+                        return cell_mass
+
+                    calculated_cell_mass = self.get_cached_mass(self.get_sweep_fit_settings(), calculate_sweep_mass)
+                    self.write_sweep_figures(frequency_matrix, phase_matrix, **optional_fig_param)
 
                     self.calculated_cell_mass = calculated_cell_mass
-                    figure_cell_mass = plot_mass(calculated_cell_mass, self.settings.figure_plot_every_nth_point)
-                    self.logger.info('Start writing figure to disk')
-                    write_to_disk_as(self.settings.figure_format, figure_cell_mass,
-                                     '{}'.format(self.result_folder + os.sep + self.settings.figure_name_measured_data),
-                                     **optional_fig_param)
-                    self.logger.info('Done writing figure to disk')
+                    self.write_figure('plot_mass', (calculated_cell_mass, self.settings.figure_plot_every_nth_point,
+                                                   *self.get_figure_downsampling()),
+                                      self.settings.figure_name_measured_data, **optional_fig_param)
                     self.logger.info('Start writing data to disk')
-                    calculated_cell_mass.to_csv(self.result_folder + os.sep +
-                                                self.settings.figure_name_measured_data + '.csv', index=False, na_rep="nan")
+                    fit_parameters = DataFrame(self.fit_param_measured, columns=['Q factor', 'Slope', 'Offset'])
+                    fit_parameters.insert(0, 'Resonance frequency (kHz)', self.resonance_freq_measured)
+                    fit_parameters.insert(0, 'Time (h)', (self.sweep_block.time[0:n_sweeps] -
+                                                          self.sweep_block.time[0]) / 3600)
+                    write_results(self.result_folder + os.sep + self.settings.figure_name_measured_data,
+                                  calculated_cell_mass, self.settings.result_format, fit_parameters=fit_parameters,
+                                  metadata=self.get_result_metadata())
                     self.calculated_cell_mass = calculated_cell_mass
                     self.logger.info('Done writing data to disk')
+                    if self.settings.sweep_checkpoint_interval > 0:
+                        self.get_sweep_checkpoint().remove()
 
                 else:
                     # The PLL mode
@@ -414,46 +446,49 @@ class InertialMassDetermination(QObject):
                             # offset value found.
                             n = int(self.settings.frequency_offset_n_measurements_used)
 
-                            auto_freq_offset = np.mean(self.data_measured.iloc[0:n, 6])
+                            auto_freq_offset = np.mean(self.data_measured['Frequency'].iloc[0:n])
                             self.logger.info('Offset calculation result: {}'.format(auto_freq_offset))
                             self.settings.frequency_offset = auto_freq_offset
 
-                    for iPLL in trange(0, len(self.data_measured)):
-                        if self.settings.correct_for_frequency_offset:
-                                mass = calculate_mass(self.settings.spring_constant, (self.data_measured.iloc[iPLL, 6] -
-                                                                                      self.settings.frequency_offset) +
-                                                      self.resonance_freq_pre_start_with_cell,
-                                                      self.resonance_freq_pre_start_no_cell)
-                        else:
-                            mass = calculate_mass(self.settings.spring_constant, self.data_measured.iloc[iPLL, 6] +
-                                                  self.resonance_freq_pre_start_with_cell,
-                                                  self.resonance_freq_pre_start_no_cell)
-
-                        if len(self.settings.cell_offsets) == 0:
-                            self.calculated_cell_mass.append(mass * self.position_correction_factor)
-                        else:
-                            self.calculated_cell_mass.append(mass * self.position_correction_factor[iPLL])
-
-                    calculated_cell_mass = concat([(self.data_measured.iloc[:, 0] - self.data_measured.iloc[1, 0]) / 3600,
-                                                   DataFrame(self.calculated_cell_mass, columns=['Mass (ng)'])], axis=1)
-                    calculated_cell_mass['Mean mass (ng)'] = calculated_cell_mass['Mass (ng)'].rolling(
-                        window=self.settings.rolling_window_size).mean()
-                    if len(self.settings.cell_offsets) != 0:
-                        calculated_cell_mass['Object area (um_sq)'] = area
+                    if self.settings.correct_for_frequency_offset:
+                        frequency_offset = self.settings.frequency_offset
+                    else:
+                        frequency_offset = None
 
+                    def calculate_pll_cell_mass():
+                        mass = calculate_pll_mass(self.settings.spring_constant,
+                                                  self.data_measured['Frequency'].to_numpy(dtype=float),
+                                                  self.resonance_freq_pre_start_with_cell,
+                                                  self.resonance_freq_pre_start_no_cell,
+                                                  self.position_correction_factor,
+                                                  frequency_offset=frequency_offset)
+
+                        pll_time = ((self.data_measured['Time'] - self.data_measured['Time'].iloc[1]) /
+                                    3600).rename('Time (h)')
+                        cell_mass = concat([pll_time, DataFrame(mass, columns=['Mass (ng)'])], axis=1)
+                        cell_mass['Mean mass (ng)'] = RollingStatistics(self.settings.rolling_window_size).update(
+                            cell_mass['Mass (ng)'])['mean'].to_numpy()
+                        if len(self.settings.cell_offsets) != 0:
+                            cell_mass['Object area (um_sq)'] = area
+                        return cell_mass
+
+                    calculated_cell_mass = self.get_cached_mass([], calculate_pll_cell_mass)
                     self.calculated_cell_mass = calculated_cell_mass
 
-                    figure_cell_mass = plot_mass(calculated_cell_mass, self.settings.figure_plot_every_nth_point)
-                    self.logger.info('Start writing figure to disk')
-                    write_to_disk_as(self.settings.figure_format, figure_cell_mass,
-                                     '{}'.format(self.result_folder + os.sep + self.settings.figure_name_measured_data),
-                                     **optional_fig_param)
-                    self.logger.info('Done writing figure to disk')
+                    self.write_figure('plot_mass', (calculated_cell_mass, self.settings.figure_plot_every_nth_point,
+                                                   *self.get_figure_downsampling()),
+                                      self.settings.figure_name_measured_data, **optional_fig_param)
                     self.logger.info('Start writing data to disk')
-                    calculated_cell_mass.to_csv(self.result_folder + os.sep +
-                                                self.settings.figure_name_measured_data + '.csv', index=False, na_rep="nan")
+                    write_results(self.result_folder + os.sep + self.settings.figure_name_measured_data,
+                                  calculated_cell_mass, self.settings.result_format,
+                                  metadata=self.get_result_metadata())
                     self.logger.info('Done writing data to disk')
 
+                if self.figure_queue is not None:
+                    self.logger.info('Waiting for {} figure(s)'.format(self.figure_queue.n_pending))
+                    self.figure_queue.wait()
+                    self.logger.info('Done writing figures to disk')
+
                 # Auto save project file
                 self.save_pyimd_project(self.result_folder + os.sep + 'AutoSaveProjectRun_{}.xml'.format(
                     datetime.now().strftime("%Y%m%d%H%M%S")))
@@ -462,36 +497,52 @@ class InertialMassDetermination(QObject):
 
                 self.logger.info('Done with all calculations')
             except Exception as e:
+                self.last_error = str(e)
                 self.logger.info('Error {}'.format(e))
+            finally:
+                if self.figure_queue is not None:
+                    self.figure_queue.close(cancel=True)
+                    self.figure_queue = None
 
         else:
             self.logger.info('No valid pyIMD configuration found. Please create or load a pyIMD project first.')
 
-    def run_batch_inertial_mass_determination(self, *args):
-        """ Runs the inertial mass determination calculation in batch mode. Specify one or multiple pyIMD project files
-        which will be run sequentially. NOTE: In a future release this will be parallelized using multiple threads to
-        perform the calculations in parallel to gain speed. Currently the focus is not on speed but the idea is to
-        analyze many experiments conveniently over night for example.
+    def run_batch_inertial_mass_determination(self, *args, n_workers=1):
+        """ Runs the inertial mass determination calculation in batch mode. Specify one or multiple pyIMD project files.
+        Each project is run with its own InertialMassDetermination object and settings (see run_pyimd_project). With
+        more than one worker the projects are run in parallel in a process pool. A failing project does not affect the
+        other projects.
 
         Args:
-            args (`list`):   List of one or many file paths + file names to valid pyIMD project files.
+            args (`list`):          List of one or many file paths + file names to valid pyIMD project files.
+            n_workers (`int`):      Number of projects run in parallel (optional)
 
         Returns:
-            void:            Returns result structured in a pandas data frame and saves function fit plots as pdf \
-                             files.
+            summary (`pandas data frame`): Returns the project file, status (Done, Failed or Invalid project), \
+                                    runtime, result folder, result file and error message of each project. Results \
+                                    and figures of each project are saved to its project folder.
         """
-        try:
-            for file in args:
-                self.load_pyimd_project(file)
-                # load each project configuration sequentially.
-                if self._has_valid_configuration == 1:
-                    # start calculations if configuration was valid
-                    self.logger.info(f"Batch processing: start analysis {file}")
-                    self.run_inertial_mass_determination()
-                else:
-                    self.logger.info('No valid pyIMD configuration found. Please create or load a pyIMD project first.')
-        except Exception as e:
-            self.logger.info("Error during opening project: " + str(e))
+        self.logger.info('Batch processing: start analysis of {} project(s) with {} worker(s)'.format(len(args),
+                                                                                                   n_workers))
+        if n_workers <= 1:
+            # Projects run one after another and fill the registry as they go
+            calibration_registry = {}
+            summary = [run_pyimd_project(file, calibration_registry) for file in args]
+        else:
+            # Worker processes get a copy of the registry. Fit the shared pre start files once up front.
+            calibration_registry = build_calibration_registry(args)
+            summary = []
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = [executor.submit(run_pyimd_project, file, calibration_registry) for file in args]
+                for file, future in zip(args, futures):
+                    try:
+                        summary.append(future.result())
+                    except Exception as e:
+                        # i.e. the worker process running the project died
+                        summary.append(_project_summary(file, 'Failed', 0.0, error=str(e)))
+        summary = DataFrame(summary)
+        self.logger.info('Batch processing: done\n{}'.format(summary[['Project', 'Status', 'Runtime (s)']]))
+        return summary
 
     def convert_data(self):
         """ Converts imported data to correct units needed for further calculation.
@@ -499,96 +550,374 @@ class InertialMassDetermination(QObject):
         try:
             attributes = ['data_pre_start_no_cell', 'data_pre_start_with_cell']
             for iAttribute in attributes:
-                getattr(self, str(iAttribute)).iloc[:, 0] = getattr(self, str(iAttribute)).iloc[:, 0] / \
-                                                            self.settings.conversion_factor_hz_to_khz
-                getattr(self, str(iAttribute)).iloc[:, 2] = getattr(self, str(iAttribute)).iloc[:, 2] / \
-                                                            self.settings.conversion_factor_deg_to_rad
-            if self.settings.calculation_mode == 'Cont.Sweep':
-                # Default is 3 (Amplitude, Phase, Frequency) [+0, +1, +2]
-                # New is 4 (Offset, Frequency, Amplitude, Phase) [+0, +3, +1]
-                for iSweep in range(0, len(self.data_measured), self._n_rows):
-                    # Calc resonance frequency and function fit for the ith sweep (iSweep)
-                    self.data_measured.iloc[iSweep + self._phase_idx, 0:255] = \
-                        self.data_measured.iloc[iSweep + self._phase_idx, 0:255] / \
-                        self.settings.conversion_factor_deg_to_rad
-                    self.data_measured.iloc[iSweep + self._freq_idx, 0:255] = \
-                        self.data_measured.iloc[iSweep + self._freq_idx, 0:255] / \
-                        self.settings.conversion_factor_hz_to_khz
+                self.convert_pre_start_data(getattr(self, str(iAttribute)))
+            if self.settings.calculation_mode in ['Cont.Sweep', 'Peak.Tracking']:
+                self.sweep_block.convert_units(self.settings.conversion_factor_hz_to_khz,
+                                               self.settings.conversion_factor_deg_to_rad)
             else:
-                self.data_measured.iloc[:, 5] = self.data_measured.iloc[:, 5] / self.settings.conversion_factor_deg_to_rad
-                self.data_measured.iloc[:, 6] = self.data_measured.iloc[:, 6] / self.settings.conversion_factor_hz_to_khz
+                self.data_measured['Phase'] = self.data_measured['Phase'] / self.settings.conversion_factor_deg_to_rad
+                self.data_measured['Frequency'] = self.data_measured['Frequency'] / \
+                    self.settings.conversion_factor_hz_to_khz
         except Exception as e:
             self.logger.info("Error during data conversion: " + str(e))
 
-    def get_sweep_group_index(self, groups):
-        """
-        Returns the index of the tdms group called 'sweep data'.
-        """
-        for idx, group in enumerate(groups):
-            if group.name.lower() == 'sweep data':
-                return idx
-
-    def get_sweep_data_index(self):
-        """
-        Returns the row indices of the tdms group 'sweep data' for the frequency, phase and the number of expected
-        rows that keep repeating.
-        I.e if there are 3 defined column names Amplitude, Phase, Frequency followed by Untitled 3 ... n we would expect
-        this data to be in junks of 3 rows.
-        """
-        groups = read_tdms_metadata(self.settings.measurements_path)
-        group_channel = groups[self.get_sweep_group_index(groups)]
-        # Ideally all researchers using cytomass would stick to a naming convention. If not add your fancy name to the
-        # list below that corresponds to the center frequency.
-        freq_str = '\t'.join(['Frequency', 'Center', 'Centre', 'Center Frequency', 'Centre Frequency'])
-        # Ideally all researchers using cytomass would stick to a naming convention. If not add your fancy name to the
-        # list below that corresponds to the phase.
-        phase_str = '\t'.join(['Phase'])
-        amplitude_str = '\t'.join(['Amplitude', 'Amp\n'])
-        offset_str = '\t'.join(['Offset'])
-        other_column_name = ['Untitled'.lower(), 'Unbenannt'.lower()]  # We use this to determine how many repeating rows we should expect.
-        # I.e if there are 3 defined column names Amplitude, Phase, Frequency followed by Untitled 3 ... n we would
-        # expect this data to be in junks of 3 rows.
-        n_rows = None
-        for idx, ch in enumerate(group_channel.channels()):
-            if ch.name.lower() in freq_str.lower():
-                freq_idx = idx
-            if ch.name.lower() in phase_str.lower():
-                phase_idx = idx
-            if ch.name.lower() in amplitude_str.lower():
-                amp_idx = idx
-            if ch.name.lower() in offset_str.lower():
-                offset_idx = idx
-            if ch.name.lower()[0:9].strip() in other_column_name:
-                if n_rows is None:
-                    n_rows = idx
-
-        # Data format of cytomass prototype that we need to convert
-        if n_rows == 4:
-            data = self.data_measured
-
-            sweeps = np.arange(0, len(data), n_rows)
-            data = concat([data.iloc[:, :], data.iloc[:, -1]], axis=1)
-
-            for iSweep in trange(0, len(data), n_rows):
-                data.iloc[iSweep + 2, 0:255] = data.iloc[iSweep + offset_idx, 0:255].astype(float) + \
-                                               data.iloc[iSweep + freq_idx, 0:255].astype(float)
-                data.iloc[iSweep + 1, 0:255] = data.iloc[iSweep + phase_idx, 0:255].astype(float)
-                data.iloc[iSweep + 0, 0:255] = data.iloc[iSweep + amp_idx, 0:255].astype(float)
-
-                data.iloc[int(iSweep/n_rows), 256] = ((data.iloc[int(iSweep/n_rows), 256].to_datetime64() - np.datetime64(
-                    '1970-01-01T00:00:00Z')) / np.timedelta64(1, 's')).item()
-
-            data = data.drop(index=sweeps + 3)
-            data = data.reset_index(drop=True)
-            times = data.iloc[:, 256]
-            data.iloc[:, 256] = times
-            self.data_measured = data
-
-            # reset indices
-            freq_idx = 2
-            phase_idx = 1
-            n_rows = 3
-        return freq_idx, phase_idx, n_rows
+    def convert_pre_start_data(self, data):
+        """ Converts frequency [0] and phase [2] of pre start data in place to kHz and Rad.
+        """
+        data.iloc[:, 0] = data.iloc[:, 0] / self.settings.conversion_factor_hz_to_khz
+        data.iloc[:, 2] = data.iloc[:, 2] / self.settings.conversion_factor_deg_to_rad
+
+    def calculate_pre_start_resonance_frequency(self, data, file):
+        """
+        Calculates the resonance frequency of pre start data by fitting its phase response. The result is cached \
+        (see get_cached_result).
+
+        Args:
+            data (`pandas data frame`):         Pre start data with frequency [in kHz] in the first and phase [in Rad] \
+                                                in the third column.
+            file (`str`):                       File path + file name of the pre start data.
+
+        Returns:
+            resonance_frequency (`float`):      Resonance frequency [in kHz]
+        Returns:
+            curve_fit_parameter (`float array`): Curve fit parameters.
+        """
+        def fit_pre_start():
+            return calculate_resonance_frequencies(data.iloc[:, 0], data.iloc[:, 2],
+                                                   self.get_initial_parameter_guess(data.iloc[:, 0], data.iloc[:, 2]),
+                                                   self.settings.lower_parameter_bounds,
+                                                   self.settings.upper_parameter_bounds)
+        return self.get_cached_result('pre_start_fit', [file], PRE_START_FIT_SETTINGS, fit_pre_start)
+
+    def fit_pre_start_data(self, data, file, figure_name):
+        """
+        Calculates the resonance frequency of pre start data (see calculate_pre_start_resonance_frequency) and writes \
+        the figure of the fit to the result folder. With a calibration_registry (batch mode) a pre start file is \
+        fitted and its figure rendered only once per batch. Other projects using the same file and settings reuse the \
+        fit and get a copy of the figure.
+
+        Args:
+            data (`pandas data frame`):         Pre start data with frequency [in kHz] in the first and phase [in Rad] \
+                                                in the third column.
+            file (`str`):                       File path + file name of the pre start data.
+            figure_name (`str`):                File name of the figure (without extension).
+
+        Returns:
+            resonance_frequency (`float`):      Resonance frequency [in kHz]
+        Returns:
+            curve_fit_parameter (`float array`): Curve fit parameters.
+        """
+        registry = self.calibration_registry if self.calibration_registry is not None else {}
+        key = self.get_result_key('pre_start_fit', [file], PRE_START_FIT_SETTINGS)
+        if key in registry:
+            self.logger.info('Using calibration fit of {} from the batch'.format(file))
+        else:
+            registry[key] = {'result': self.calculate_pre_start_resonance_frequency(data, file), 'figures': {}}
+        resonance_frequency, curve_fit_parameter = registry[key]['result']
+
+        if not self.settings.create_figures:
+            return resonance_frequency, curve_fit_parameter
+        optional_fig_param = self.get_optional_figure_parameters()
+        figure_key = ResultCache.make_key(self.settings.figure_format, self.settings.figure_backend, optional_fig_param)
+        figure_file = '{}.{}'.format(self.result_folder + os.sep + figure_name, self.settings.figure_format)
+        shared_figure_file = registry[key]['figures'].get(figure_key)
+        if shared_figure_file is not None and os.path.isfile(shared_figure_file):
+            if os.path.abspath(shared_figure_file) != os.path.abspath(figure_file):
+                shutil.copyfile(shared_figure_file, figure_file)
+        else:
+            self.write_figure('plot_fitting', (data.iloc[:, 0], data.iloc[:, 2], resonance_frequency,
+                                               curve_fit_parameter), figure_name, **optional_fig_param)
+            registry[key]['figures'][figure_key] = figure_file
+        return resonance_frequency, curve_fit_parameter
+
+    def write_figure(self, plot_name, plot_args, figure_name, **kwargs):
+        """
+        Writes a figure to the result folder. During a run the figure is rendered in the background by the figure \
+        queue (see pyIMD.plotting.figure_queue.FigureQueue), otherwise immediately. Nothing is written if \
+        create_figures is disabled.
+
+        Args:
+            plot_name (`str`):                  Name of the plot function (i.e. plot_fitting, see figure_backend)
+            plot_args (`tuple`):                Arguments of the plot function.
+            figure_name (`str`):                File name of the figure (without extension).
+
+        Keyword Args:
+            width, height, units, resolution:   Figure size and resolution (optional, see get_optional_figure_parameters)
+        """
+        if not self.settings.create_figures:
+            return
+        file = self.result_folder + os.sep + figure_name
+        if self.figure_queue is None:
+            render_figure(plot_name, plot_args, self.settings.figure_format, file, self.settings.figure_backend,
+                          **kwargs)
+        else:
+            self.figure_queue.submit(plot_name, plot_args, self.settings.figure_format, file,
+                                     self.settings.figure_backend, **kwargs)
+
+    def write_sweep_figures(self, frequency_matrix, phase_matrix, **kwargs):
+        """
+        Writes the diagnostic figures (phase response and fit) of the sweeps selected by get_sweep_figure_indices \
+        after all sweeps are fitted. Depending on sweep_figure_layout each figure is written to its own file \
+        (ResFreqSweep_<row>) rendered in parallel by the figure queue, or all figures are written to one pdf file or \
+        montage image (ResFreqSweeps) rendered by one process of the figure queue.
+
+        Args:
+            frequency_matrix (`float array`):   Frequency of each sweep (n_sweeps x n_points array) [in kHz]
+            phase_matrix (`float array`):       Phase of each sweep (n_sweeps x n_points array) [in radians]
+
+        Keyword Args:
+            width, height, units, resolution:   Figure size and resolution (optional, see get_optional_figure_parameters)
+        """
+        if not self.settings.create_figures:
+            return
+        indices = self.get_sweep_figure_indices(len(self.resonance_freq_measured))
+        # Copies such that only the selected sweeps are sent to the rendering processes
+        plot_args_list = [(frequency_matrix[i].copy(), phase_matrix[i].copy(), self.resonance_freq_measured[i],
+                           self.fit_param_measured[i]) for i in indices]
+        if self.settings.sweep_figure_layout == 'files':
+            # Figure names keep the row of the sweep in the TDMS file (3 rows per sweep)
+            for i, plot_args in zip(indices, plot_args_list):
+                self.write_figure('plot_fitting', plot_args, 'ResFreqSweep_' + str(3 * i), **kwargs)
+        elif len(indices) > 0:
+            file = self.result_folder + os.sep + 'ResFreqSweeps'
+            if self.figure_queue is None:
+                render_figure_pages('plot_fitting', plot_args_list, self.settings.figure_format, file,
+                                    self.settings.sweep_figure_layout, self.settings.figure_backend, **kwargs)
+            else:
+                self.figure_queue.submit_pages('plot_fitting', plot_args_list, self.settings.figure_format, file,
+                                               self.settings.sweep_figure_layout, self.settings.figure_backend,
+                                               **kwargs)
+        self.logger.info('Done with sweep figure generation ({} sweeps)'.format(len(indices)))
+
+    def get_sweep_figure_indices(self, n_sweeps):
+        """
+        Gets the sweeps plotted as diagnostic figures: every sweep_figure_interval-th sweep and, if these are more \
+        than sweep_figure_max_count, that many sweeps evenly spread over them.
+
+        Args:
+            n_sweeps (`int`):                   Number of sweeps.
+
+        Returns:
+            indices (`int array`):              Returns the indices of the sweeps to plot.
+        """
+        if self.settings.sweep_figure_interval == 0:
+            return np.empty(0, dtype=int)
+        indices = np.arange(0, n_sweeps, self.settings.sweep_figure_interval)
+        max_count = self.settings.sweep_figure_max_count
+        if max_count is not None and max_count < len(indices):
+            indices = indices[np.unique(np.linspace(0, len(indices) - 1, max_count).round().astype(int))]
+        return indices
+
+    def fit_sweeps(self):
+        """
+        Calculates the resonance frequency of all sweeps of the sweep block by fitting their phase response \
+        (Cont.Sweep) or by tracking the resonance between calibration fits (Peak.Tracking). With a \
+        sweep_checkpoint_interval the Cont.Sweep fits are run in chunks of that many sweeps and each chunk is appended \
+        to the checkpoint file (see get_sweep_checkpoint). A run with the same data and settings resumes after the last \
+        checkpointed sweep. Warm start restarts from the initial parameter guess at each chunk.
+
+        Returns:
+            resonance_frequency (`float array`): Resonance frequency of each sweep [in kHz]
+        Returns:
+            curve_fit_parameter (`float array`): Curve fit parameters of each sweep (n_sweeps x 3 array)
+        """
+        frequency_matrix = self.sweep_block.frequency
+        phase_matrix = self.sweep_block.phase
+        n_sweeps = self.sweep_block.n_sweeps
+        fit_options = {'fit_mode': self.settings.sweep_fit_mode,
+                       'warm_start': self.settings.sweep_fit_warm_start,
+                       'n_workers': self.settings.n_workers,
+                       'logger': self.logger}
+        if self.settings.calculation_mode == 'Peak.Tracking':
+            self.logger.info('Start tracking {} sweeps (full fit of every {}th sweep)'.format(
+                n_sweeps, self.settings.peak_tracking_calibration_interval))
+            result = calculate_tracked_resonance_frequencies(
+                frequency_matrix, phase_matrix, self.get_initial_parameter_guess(frequency_matrix, phase_matrix),
+                self.settings.lower_parameter_bounds, self.settings.upper_parameter_bounds,
+                calibration_interval=self.settings.peak_tracking_calibration_interval, **fit_options)
+            self.logger.info('Done tracking sweeps')
+        elif self.settings.sweep_checkpoint_interval > 0:
+            checkpoint = self.get_sweep_checkpoint()
+            completed_freq, completed_param = checkpoint.read()
+            n_completed = min(len(completed_freq), n_sweeps)
+            if n_completed > 0:
+                self.logger.info('Resume fitting after sweep {} from checkpoint {}'.format(n_completed,
+                                                                                          checkpoint.file))
+            self.logger.info('Start fitting {} sweeps ({} mode, {} worker(s), checkpoint every {} sweeps)'.format(
+                n_sweeps - n_completed, self.settings.sweep_fit_mode, self.settings.n_workers,
+                self.settings.sweep_checkpoint_interval))
+            resonance_frequency = np.empty(n_sweeps)
+            curve_fit_parameter = np.empty((n_sweeps, 3))
+            resonance_frequency[0:n_completed] = completed_freq[0:n_completed]
+            curve_fit_parameter[0:n_completed] = completed_param[0:n_completed]
+            initial_param_guess = np.broadcast_to(self.get_initial_parameter_guess(frequency_matrix, phase_matrix),
+                                                  (n_sweeps, 4))
+            for start in range(n_completed, n_sweeps, self.settings.sweep_checkpoint_interval):
+                end = min(start + self.settings.sweep_checkpoint_interval, n_sweeps)
+                resonance_frequency[start:end], curve_fit_parameter[start:end] = calculate_sweep_resonance_frequencies(
+                    frequency_matrix[start:end], phase_matrix[start:end], initial_param_guess[start:end],
+                    self.settings.lower_parameter_bounds, self.settings.upper_parameter_bounds, **fit_options)
+                checkpoint.append(start, resonance_frequency[start:end], curve_fit_parameter[start:end])
+            self.logger.info('Done fitting sweeps')
+            result = resonance_frequency, curve_fit_parameter
+        else:
+            self.logger.info('Start fitting {} sweeps ({} mode, {} worker(s))'.format(
+                n_sweeps, self.settings.sweep_fit_mode, self.settings.n_workers))
+            result = calculate_sweep_resonance_frequencies(
+                frequency_matrix, phase_matrix, self.get_initial_parameter_guess(frequency_matrix, phase_matrix),
+                self.settings.lower_parameter_bounds, self.settings.upper_parameter_bounds, **fit_options)
+            self.logger.info('Done fitting sweeps')
+        return result
+
+    def get_sweep_checkpoint(self):
+        """
+        Gets the checkpoint of the sweep fits of the current run. The checkpoint file is stored in the project folder \
+        and belongs to the content of the measurement file and the fit settings.
+
+        Returns:
+            checkpoint (`SweepCheckpoint`):     Checkpoint object (see pyIMD.io.sweep_checkpoint.SweepCheckpoint).
+        """
+        return SweepCheckpoint(os.path.join(self.settings.project_folder_path, '{}Checkpoint.csv'.format(
+            self.settings.figure_name_measured_data)),
+            self.get_result_key('sweep_fit', [self.settings.measurements_path], self.get_sweep_fit_settings()))
+
+    def get_sweep_fit_settings(self):
+        """
+        Gets the names of the settings the sweep fit results depend on. The settings only splitting the sweeps into \
+        chunks (number of workers, checkpoint interval) are included with warm start only.
+
+        Returns:
+            setting_names (`list`):             Names of the settings.
+        """
+        if self.settings.sweep_fit_warm_start:
+            return SWEEP_FIT_SETTINGS + SWEEP_CHUNK_SETTINGS
+        return SWEEP_FIT_SETTINGS
+
+    def get_cached_result(self, name, files, setting_names, calculate):
+        """
+        Gets a result from the result cache (see pyIMD.io.result_cache.ResultCache) or calculates and caches it. The \
+        cache key consists of the name, the content of the files and the values of the given settings. Without a \
+        result_cache_path the result is always calculated.
+
+        Args:
+            name (`str`):                       Name of the result.
+            files (`list`):                     Files (paths + file names) the result depends on.
+            setting_names (`list`):             Names of the settings the result depends on.
+            calculate (`function`):             Function without arguments calculating the result.
+
+        Returns:
+            result (`object`):                  Returns the cached or calculated result.
+        """
+        if self.settings.result_cache_path == '':
+            return calculate()
+        cache = ResultCache(self.settings.result_cache_path, self.settings.result_cache_size_mb)
+        key = self.get_result_key(name, files, setting_names)
+        result = cache.get(key)
+        if result is None:
+            result = calculate()
+            cache.put(key, result)
+        else:
+            self.logger.info('Using cached {} result'.format(name))
+        return result
+
+    def get_cached_mass(self, fit_setting_names, calculate):
+        """
+        Gets the mass series of the current run from the result cache or calculates and caches it (see \
+        get_cached_result). The key consists of the measurement and pre start files, the fit settings of the \
+        measurement and the pre start data and the settings of the mass calculation.
+
+        Args:
+            fit_setting_names (`list`):         Names of the fit settings of the measurement (i.e. sweep fit settings).
+            calculate (`function`):             Function without arguments calculating the mass data frame.
+
+        Returns:
+            calculated_cell_mass (`pandas data frame`): Returns the time, mass and mean mass data frame.
+        """
+        return self.get_cached_result('mass', [self.settings.measurements_path, self.settings.pre_start_no_cell_path,
+                                               self.settings.pre_start_with_cell_path],
+                                      list(fit_setting_names) + PRE_START_FIT_SETTINGS + MASS_SETTINGS, calculate)
+
+    def get_result_key(self, name, files, setting_names):
+        """
+        Gets the key identifying a result by its name, the content of the files and the values of the given settings.
+
+        Args:
+            name (`str`):                       Name of the result.
+            files (`list`):                     Files (paths + file names) the result depends on.
+            setting_names (`list`):             Names of the settings the result depends on.
+
+        Returns:
+            key (`str`):                        Returns the key as hex digest.
+        """
+        return ResultCache.make_key(name, [file_fingerprint(file) for file in files],
+                                    {setting: getattr(self.settings, setting) for setting in setting_names})
+
+    def get_initial_parameter_guess(self, frequency, phase):
+        """
+        Gets the initial parameter guess for the phase response fit. If auto_initial_parameter_guess is set, the guess \
+        is estimated from the data (one guess per sweep), otherwise the configured initial parameter guess is used.
+
+        Args:
+            frequency (`float array`):          Frequency [in kHz] of one sweep or of several sweeps (one per row).
+            phase (`float array`):              Phase [in Rad] of the same shape as frequency.
+
+        Returns:
+            initial_param_guess (`float array`): Initial parameter guess (1x4 array or n_sweeps x 4 array).
+        """
+        if self.settings.auto_initial_parameter_guess:
+            return estimate_initial_parameter_guess(frequency, phase, self.settings.lower_parameter_bounds,
+                                                    self.settings.upper_parameter_bounds,
+                                                    self.settings.initial_parameter_guess)
+        return self.settings.initial_parameter_guess
+
+    def get_optional_figure_parameters(self):
+        """
+        Gets the size and resolution of the figures written to disk (see pyIMD.io.write_to_disk.write_to_disk_as).
+
+        Returns:
+            optional_fig_param (`dict`):        Figure width, height, units and resolution.
+        """
+        return {'width': self.settings.figure_width, 'height': self.settings.figure_height,
+                'units': self.settings.figure_units, 'resolution': self.settings.figure_resolution_dpi}
+
+    def get_figure_downsampling(self):
+        """
+        Gets the point budget (two points per pixel of the figure width) and the downsampling method of the mass \
+        figure (see pyIMD.plotting.downsampling.downsample).
+
+        Returns:
+            max_points (`int`):                 Maximal number of points plotted or None to plot all points.
+        Returns:
+            downsampling (`str`):               Downsampling method.
+        """
+        if self.settings.figure_downsampling == 'none':
+            return None, 'none'
+        return 2 * get_figure_pixel_width(self.settings.figure_width, self.settings.figure_units,
+                                          self.settings.figure_resolution_dpi), self.settings.figure_downsampling
+
+    def get_result_metadata(self):
+        """
+        Gets the metadata of the current run stored alongside the results in the binary result formats.
+
+        Returns:
+            metadata (`dict`):                  Run metadata.
+        """
+        metadata = {'pyIMD_version': __version__,
+                    'date': datetime.now().isoformat(),
+                    'calculation_mode': self.settings.calculation_mode,
+                    'measurements_path': self.settings.measurements_path,
+                    'pre_start_no_cell_path': self.settings.pre_start_no_cell_path,
+                    'pre_start_with_cell_path': self.settings.pre_start_with_cell_path,
+                    'spring_constant': self.settings.spring_constant,
+                    'cell_position': self.settings.cell_position,
+                    'cantilever_length': self.settings.cantilever_length,
+                    'resonance_freq_pre_start_no_cell': self.resonance_freq_pre_start_no_cell,
+                    'fit_param_pre_start_no_cell': self.fit_param_pre_start_no_cell,
+                    'resonance_freq_pre_start_with_cell': self.resonance_freq_pre_start_with_cell,
+                    'fit_param_pre_start_with_cell': self.fit_param_pre_start_with_cell}
+        if np.ndim(self.position_correction_factor) == 0:
+            metadata['position_correction_factor'] = self.position_correction_factor
+        return metadata
 
     def concatenate_files(self, directory, time_interval, **kwargs):
         """
@@ -601,6 +930,8 @@ class InertialMassDetermination(QObject):
         Keyword Args:
             delimiter (`str`):                Delimiter to be used in the data file to separate columns.(i.e. \t, \s)
                                               If empty it uses default given by settings.
+            n_workers (`int`):                Number of worker processes used to parse the files in parallel.
+                                              If empty the files are parsed sequentially.
         Returns:
               file (`void`):                  Writes concatenated data to single .csv file.
         """
@@ -608,9 +939,11 @@ class InertialMassDetermination(QObject):
             delimiter = kwargs.get('delimiter')
         else:
             delimiter = self.settings.text_data_delimiter
+        n_workers = kwargs.get('n_workers', 1)
         try:
             self.logger.info("Start concatenating files: ")
-            write_concat_data(directory, delimiter=delimiter, time_interval=time_interval)
+            write_concat_data(directory, delimiter=delimiter, time_interval=time_interval,
+                              n_workers=n_workers)
         except Exception as e:
             self.logger.info("Error during concatenating files: " + str(e))
 
@@ -638,6 +971,9 @@ class InertialMassDetermination(QObject):
         """
         Shows the settings dialog in a pop up window.
         """
+        # The user interface (PyQt5) is only imported when used such that the engine runs without a display
+        from PyQt5.QtWidgets import QApplication
+        from pyIMD.ui.settings import SettingsDialog
         if self.settings_dialog is None:
             app = QApplication([])
             SettingsDialog(self.__settings)
@@ -648,7 +984,6 @@ class InertialMassDetermination(QObject):
             self.settings_dialog.show()
             app.exec_()
 
-    @pyqtSlot(dict, name="on_settings_changed")
     def on_settings_changed(self, changed_settings):
         """
         Update settings
@@ -663,7 +998,6 @@ class InertialMassDetermination(QObject):
         """
         self.settings_dialog.send_to_console_signal.connect(self.handle_change_console_text)
 
-    @pyqtSlot(str, name="handle_change_console_text")
     def handle_change_console_text(self, string):
         """
         Args:
@@ -671,3 +1005,77 @@ class InertialMassDetermination(QObject):
         """
         # self.print_to_console(string)
         self.logger.info(string)
+
+
+def run_pyimd_project(project_file, calibration_registry=None):
+    """
+    Runs the inertial mass determination of a single pyIMD project file with a new InertialMassDetermination object.
+    Used by the batch mode to run projects independently (i.e. in worker processes).
+
+    Args:
+        project_file (`str`):       File path + file name of a pyIMD project file.
+        calibration_registry (`dict`): Pre start fits shared between the projects of a batch (optional, see \
+                                    build_calibration_registry)
+
+    Returns:
+        summary (`dict`):           Returns the project file, status (Done, Failed or Invalid project), runtime, result
+                                    folder, result file and error message of the project.
+    """
+    start = time.perf_counter()
+    try:
+        imd = InertialMassDetermination()
+        imd.load_pyimd_project(project_file)
+        if imd._has_valid_configuration != 1:
+            return _project_summary(project_file, 'Invalid project', time.perf_counter() - start)
+        imd.logger.info('Batch processing: start analysis {}'.format(project_file))
+        imd.calibration_registry = calibration_registry
+        imd.run_inertial_mass_determination()
+    except Exception as e:
+        return _project_summary(project_file, 'Failed', time.perf_counter() - start, error=str(e))
+
+    result_file = os.path.join(imd.settings.project_folder_path, '{}.{}'.format(
+        imd.settings.figure_name_measured_data, {'hdf5': 'h5'}.get(imd.settings.result_format,
+                                                                   imd.settings.result_format)))
+    return _project_summary(project_file, 'Failed' if imd.last_error is not None else 'Done',
+                            time.perf_counter() - start, imd.settings.project_folder_path,
+                            result_file if os.path.isfile(result_file) else '', imd.last_error)
+
+
+def build_calibration_registry(project_files):
+    """
+    Fits each unique pre start file of a batch once and writes its figure to the folder of the first project using it. \
+    Pre start files are identified by their content and the fit settings (see \
+    InertialMassDetermination.get_result_key). Projects which cannot be read are skipped here and reported when run.
+
+    Args:
+        project_files (`list`):     File paths + file names of pyIMD project files.
+
+    Returns:
+        calibration_registry (`dict`): Returns the pre start fits and figure files by key (see \
+                                    InertialMassDetermination.fit_pre_start_data).
+    """
+    calibration_registry = {}
+    for project_file in project_files:
+        try:
+            imd = InertialMassDetermination()
+            imd.load_pyimd_project(project_file)
+            if imd._has_valid_configuration != 1:
+                continue
+            imd.calibration_registry = calibration_registry
+            imd.result_folder = imd.settings.project_folder_path
+            for file, figure_name in [(imd.settings.pre_start_no_cell_path, imd.settings.figure_name_pre_start_no_cell),
+                                      (imd.settings.pre_start_with_cell_path,
+                                       imd.settings.figure_name_pre_start_with_cell)]:
+                if imd.get_result_key('pre_start_fit', [file], PRE_START_FIT_SETTINGS) in calibration_registry:
+                    continue
+                data = read_from_text(file, imd.settings.text_data_delimiter, imd.settings.read_text_data_from_line)
+                imd.convert_pre_start_data(data)
+                imd.fit_pre_start_data(data, file, figure_name)
+        except Exception:
+            continue
+    return calibration_registry
+
+
+def _project_summary(project_file, status, runtime, result_folder='', result_file='', error=None):
+    return {'Project': project_file, 'Status': status, 'Runtime (s)': runtime, 'Result folder': result_folder,
+            'Result file': result_file, 'Error': '' if error is None else error}
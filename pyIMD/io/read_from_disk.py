@@ -9,41 +9,226 @@
 # *     Andreas P. Cuny - initial API and implementation
 # *******************************************************************************/
 
+import os
+import re
+import json
+import numpy as np
 from os import path
 from numpy import nan
 from nptdms import TdmsFile
-from pandas import read_csv, concat, DataFrame, Series
+from pandas import read_csv, concat, DataFrame
+from pyIMD.io.sweep_block import SweepBlock
 import pathlib
 
 __author__ = 'Andreas P. Cuny'
 
 
-def read_from_tdms(file):
+def read_from_tdms(file, channel_indices=None):
     """
     Method to read data from National Instruments technical data management streaming files (TDMS).
 
     Args:
-        file (`str`):              File path + file name string.
+        file (`str`):                  File path + file name string.
+        channel_indices (`int list`):  Indices of the channels to read. Only these channels are streamed from the \
+                                       file (see read_tdms_chunks) into a preallocated array and returned in the \
+                                       given order. All channels are read if None (optional)
 
     Returns:
         data (`pandas data frame`):  Returns data structured in a pandas data frame.
     """
-    tdms_file = TdmsFile(file)
-    data = tdms_file.as_dataframe(time_index=False, absolute_time=False)
-    return data
+    if channel_indices is None:
+        tdms_file = TdmsFile(file)
+        data = tdms_file.as_dataframe(time_index=False, absolute_time=False)
+        return data
 
+    channels = [ch for group in read_tdms_metadata(file) for ch in group.channels()]
+    channels = [channels[idx] for idx in channel_indices]
+    values = np.empty((max([len(ch) for ch in channels], default=0), len(channels)))
+    start = 0
+    for chunk in read_tdms_chunks(file, channel_indices=channel_indices):
+        values[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    return DataFrame(values, columns=[ch.path for ch in channels])
 
-def read_from_text(file, delimiter, read_from_row, header=0):
+
+def read_sweep_block(file, n_points=255, chunk_size=3072):
     """
-    Method to read data from text files.
+    Method to read the sweeps of a Cont.Sweep measurement from a TDMS file into a SweepBlock. The rows of the sweep \
+    data group are assigned to frequency, phase and amplitude by their channel names (see \
+    read_sweep_channel_index). Data of the Cytomass prototype with a separate frequency offset row is converted \
+    as well. The file is streamed in chunks (see read_tdms_chunks) and only the first n_points channels and the time \
+    stamp channel of the sweep data group are read.
+
+    Args:
+        file (`str`):                  File path + file name string.
+        n_points (`int`):              Number of points per sweep (optional)
+        chunk_size (`int`):            Number of rows read at once. Rounded down to a multiple of the number of rows \
+                                       per sweep (optional)
+
+    Returns:
+        sweep_block (`SweepBlock`):    Returns the sweeps as SweepBlock.
+
+    Raises:
+        ValueError:                    If the amplitude, phase or frequency channel or the number of rows per sweep \
+                                       is not found.
+    """
+    amp_idx, phase_idx, freq_idx, offset_idx, n_rows = read_sweep_channel_index(file)
+    if n_rows is None:
+        raise ValueError("No unnamed (Untitled) channel after the named rows of the sweep data group in {}, the "
+                         "number of rows per sweep is unknown.".format(file))
+    for name, idx in [('Amplitude', amp_idx), ('Phase', phase_idx), ('Frequency', freq_idx)]:
+        if idx is None or idx >= n_rows:
+            raise ValueError("{} channel not found within the first {} channels of the sweep data group in "
+                             "{}.".format(name, n_rows, file))
+    group = [group for group in read_tdms_metadata(file) if group.name.lower() == 'sweep data'][0]
+    channels = group.channels()
+    n_sweeps = len(channels[0]) // n_rows
+    frequency = np.empty((n_sweeps, n_points))
+    phase = np.empty((n_sweeps, n_points))
+    amplitude = np.empty((n_sweeps, n_points))
+    time = np.empty(n_sweeps)
+
+    chunk_size = max(chunk_size // n_rows, 1) * n_rows
+    start = 0
+    for chunk in read_tdms_chunks(file, group.name, list(range(0, n_points)) + [len(channels) - 1], chunk_size):
+        stop = min(start + len(chunk) // n_rows, n_sweeps)
+        if stop > start:
+            sweep_data = chunk[0:(stop - start) * n_rows, 0:n_points].reshape(stop - start, n_rows, n_points)
+            frequency[start:stop], phase[start:stop], amplitude[start:stop] = _split_sweep_rows(
+                sweep_data, amp_idx, phase_idx, freq_idx, offset_idx)
+        # The time stamp of sweep i is stored in row i of the last channel
+        chunk_start = start * n_rows
+        if chunk_start < n_sweeps:
+            n_time = min(len(chunk), n_sweeps - chunk_start)
+            time[chunk_start:chunk_start + n_time] = chunk[0:n_time, -1]
+        start = start + len(chunk) // n_rows
+
+    return SweepBlock(frequency, phase, amplitude, time)
+
+
+def _split_sweep_rows(sweep_data, amp_idx, phase_idx, freq_idx, offset_idx):
+    """
+    Splits sweeps (n_sweeps x n_rows x n_points array) into frequency, phase and amplitude. The frequency offset row \
+    of the Cytomass prototype (offset_idx not None) is added to the frequency.
+    """
+    frequency = sweep_data[:, freq_idx, :]
+    if offset_idx is not None:
+        frequency = frequency + sweep_data[:, offset_idx, :]
+    return frequency, sweep_data[:, phase_idx, :], sweep_data[:, amp_idx, :]
+
+
+def read_tdms_chunks(file, group_name=None, channel_indices=None, chunk_size=65536):
+    """
+    Generator to read data from National Instruments technical data management streaming files (TDMS) in chunks. \
+    The file is opened in streaming mode and only the requested channels are read. Hence, the memory needed is \
+    bounded by the chunk size and not by the file size.
+
+    Args:
+        file (`str`):                  File path + file name string.
+        group_name (`str`):            Name of the group to read (case insensitive). All channels of all groups \
+                                       are read if None (optional)
+        channel_indices (`int list`):  Indices of the channels to read within the group. All channels are read \
+                                       if None (optional)
+        chunk_size (`int`):            Number of rows per chunk (optional)
+
+    Returns:
+        chunk (`float array`):         Yields the data as (chunk_size x n_channels) array. Channels shorter than \
+                                       the longest selected channel are padded with NaN. Time stamps are \
+                                       converted to seconds since epoch.
+    """
+    with TdmsFile.open(file) as tdms_file:
+        if group_name is None:
+            channels = [ch for group in tdms_file.groups() for ch in group.channels()]
+        else:
+            groups = [group for group in tdms_file.groups() if group.name.lower() == group_name.lower()]
+            if len(groups) == 0:
+                raise Exception("Group {} not found in {}".format(group_name, file))
+            channels = groups[0].channels()
+        if channel_indices is not None:
+            channels = [channels[idx] for idx in channel_indices]
+        channel_lengths = [len(ch) for ch in channels]
+        n_rows = max(channel_lengths, default=0)
+
+        for offset in range(0, n_rows, chunk_size):
+            length = min(chunk_size, n_rows - offset)
+            chunk = np.full((length, len(channels)), np.nan)
+            for idx, ch in enumerate(channels):
+                if offset < channel_lengths[idx]:
+                    values = _to_seconds(ch.read_data(offset, length))
+                    chunk[0:len(values), idx] = values
+            yield chunk
+
+
+def read_sweep_channel_index(file):
+    """
+    Method to read the row indices of frequency, phase, amplitude and frequency offset within a sweep of the TDMS \
+    group 'sweep data' from the channel names. The number of rows per sweep is given by the position of the first \
+    unnamed channel. I.e if there are 3 defined channel names Amplitude, Phase, Frequency followed by Untitled 3 ... n \
+    we would expect this data to be in junks of 3 rows.
+
+    Args:
+        file (`str`):                  File path + file name string.
+
+    Returns:
+        indices (`tuple`):             Returns the row indices (amplitude, phase, frequency, offset) and the number \
+                                       of rows per sweep. The offset index is None if there is no offset row.
+    """
+    groups = read_tdms_metadata(file)
+    group_channel = [group for group in groups if group.name.lower() == 'sweep data'][0]
+    # Ideally all researchers using cytomass would stick to a naming convention. If not add your fancy name to the
+    # list below that corresponds to the center frequency.
+    freq_str = '\t'.join(['Frequency', 'Center', 'Centre', 'Center Frequency', 'Centre Frequency'])
+    # Ideally all researchers using cytomass would stick to a naming convention. If not add your fancy name to the
+    # list below that corresponds to the phase.
+    phase_str = '\t'.join(['Phase'])
+    amplitude_str = '\t'.join(['Amplitude', 'Amp\n'])
+    offset_str = '\t'.join(['Offset'])
+    # We use this to determine how many repeating rows we should expect.
+    other_column_name = ['Untitled'.lower(), 'Unbenannt'.lower()]
+    amp_idx, phase_idx, freq_idx, offset_idx, n_rows = None, None, None, None, None
+    for idx, ch in enumerate(group_channel.channels()):
+        if ch.name.lower() in freq_str.lower():
+            freq_idx = idx
+        if ch.name.lower() in phase_str.lower():
+            phase_idx = idx
+        if ch.name.lower() in amplitude_str.lower():
+            amp_idx = idx
+        if ch.name.lower() in offset_str.lower():
+            offset_idx = idx
+        if ch.name.lower()[0:9].strip() in other_column_name:
+            if n_rows is None:
+                n_rows = idx
+    return amp_idx, phase_idx, freq_idx, offset_idx, n_rows
+
+
+def _to_seconds(times):
+    """
+    Converts a series or an array of time stamps to seconds since epoch. Numeric time stamps are returned as float \
+    array.
+    """
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return (times.astype('datetime64[ns]') - np.datetime64('1970-01-01T00:00:00')) / np.timedelta64(1, 's')
+    return times.astype(float)
+
+
+def read_from_text(file, delimiter, read_from_row, header=0, cache=False):
+    """
+    Method to read data from text files. The decimal separator (and the delimiter if None) are sniffed from the \
+    beginning of the file (see sniff_text_format) such that the file is parsed only once.
 
     Args:
         file (`str`):                       File path + file name.
-        delimiter (`str`):                  Delimiter used in the data file to separate columns
+        delimiter (`str`, `None`):          Delimiter used in the data file to separate columns. Sniffed from the \
+                                            file if None.
         read_from_row (`int`, `None`):      Row number from where to start reading data to be able \
                                             to skip heading text rows. Make sure that you keep the \
                                             Frequency, Amplitude and Phase headers.
-        header (`bool`):            True if file has a header. False otherwise
+        header (`bool`):            True if file has a header. False otherwise. 'infer' sniffs the header from \
+                                    the file.
+        cache (`bool`):             True caches the parsed data as .npy file next to the source file. The cache \
+                                    is memory mapped on subsequent calls and refreshed if the file or the read \
+                                    parameters change (optional)
 
     Returns:
         data (`pandas data frame`):  Returns data structured in a pandas data frame.
@@ -55,18 +240,127 @@ def read_from_text(file, delimiter, read_from_row, header=0):
         unit = col_name_0[col_name_0.find("(") + 1:col_name_0.find(")")]
         data = concat([raw_data.iloc[:, 0] + raw_data.iloc[:, 1], raw_data.iloc[:, 2:4]], axis=1)
         data.rename(columns={0: ('Frequency (%s)' % unit)}, inplace=True)
-    else:
-        data = read_csv(file, sep=delimiter, skiprows=read_from_row, header=header)
+        return data
 
-    # Handle cases where data in text files is represented with commas instead of periods.
-    if type(data.iloc[1, 0]) == str:
-        data = read_csv(file, sep=delimiter, skiprows=read_from_row, decimal=",", header=header)
+    if delimiter is not None:
+        # Delimiters from the settings may be escaped (i.e '\\t')
+        delimiter = delimiter.encode().decode('unicode_escape')
+    text_format = sniff_text_format(file, read_from_row, delimiter)
+    delimiter = text_format['delimiter']
+    if header == 'infer':
+        header = text_format['header']
+    read_parameters = [delimiter, text_format['decimal'], read_from_row, header]
+
+    if cache:
+        data = _read_text_cache(file, read_parameters)
+        if data is not None:
+            return data
+    # Data in text files may be represented with commas instead of periods.
+    data = read_csv(file, sep=delimiter, skiprows=read_from_row, decimal=text_format['decimal'], header=header)
+    if cache:
+        _write_text_cache(file, data, read_parameters)
     return data
 
 
+def sniff_text_format(file, read_from_row=None, delimiter=None, n_bytes=65536):
+    """
+    Method to sniff the delimiter, the decimal separator and the header of a text data file from its first bytes.
+
+    Args:
+        file (`str`):                       File path + file name.
+        read_from_row (`int`, `None`):      Row number from where the data starts (optional)
+        delimiter (`str`, `None`):          Delimiter used in the data file to separate columns. Sniffed if None \
+                                            (optional)
+        n_bytes (`int`):                    Number of bytes to sniff from (optional)
+
+    Returns:
+        text_format (`dict`):               Returns the delimiter (tab, semicolon, comma or space), the decimal \
+                                            separator ('.' or ',') and the header (0 if the first row contains \
+                                            text, None otherwise).
+    """
+    with open(file, 'r', errors='replace', newline='') as f:
+        sample = f.read(n_bytes)
+    lines = sample.splitlines()
+    if len(sample) == n_bytes:
+        # The last line might be incomplete
+        lines = lines[0:-1]
+    if read_from_row is not None:
+        lines = lines[read_from_row:]
+    lines = [line for line in lines if line.strip()]
+    data_lines = lines[1:] if len(lines) > 1 else lines
+
+    if delimiter is None:
+        delimiter = ','
+        for candidate in ['\t', ';', ',', ' ']:
+            n_fields = set(len(line.split(candidate)) for line in data_lines)
+            if len(n_fields) == 1 and n_fields.pop() > 1:
+                delimiter = candidate
+                break
+
+    decimal = '.'
+    if delimiter != ',':
+        comma_number = re.compile(r'^[-+]?\d*,\d+([eE][-+]?\d+)?$')
+        if any(comma_number.match(field.strip()) for line in data_lines for field in line.split(delimiter)):
+            decimal = ','
+
+    header = None
+    if len(lines) > 0:
+        for field in lines[0].split(delimiter):
+            try:
+                float(field.strip().replace(decimal, '.'))
+            except ValueError:
+                header = 0
+                break
+
+    return {'delimiter': delimiter, 'decimal': decimal, 'header': header}
+
+
+def _read_text_cache(file, read_parameters):
+    """
+    Reads the cached data of a text file as memory mapped array. Returns None if there is no valid cache.
+    """
+    cache_file, meta_file = file + '.npy', file + '.json'
+    if not (path.isfile(cache_file) and path.isfile(meta_file)):
+        return None
+    try:
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+        if meta['key'] != _text_cache_key(file, read_parameters):
+            return None
+        # Copy on write: changes to the data are kept in memory and never written to the cache
+        values = np.load(cache_file, mmap_mode='c')
+    except (OSError, ValueError, KeyError):
+        return None
+    return DataFrame(values, columns=meta['columns'], copy=False)
+
+
+def _write_text_cache(file, data, read_parameters):
+    """
+    Writes the parsed data of a text file as .npy next to the file. Only numeric data is cached.
+    """
+    if not all(np.issubdtype(dtype, np.number) for dtype in data.dtypes):
+        return
+    try:
+        np.save(file + '.npy', data.to_numpy(dtype=float))
+        with open(file + '.json', 'w') as f:
+            json.dump({'key': _text_cache_key(file, read_parameters), 'columns': data.columns.tolist()}, f)
+    except OSError:
+        pass
+
+
+def _text_cache_key(file, read_parameters):
+    """
+    Key of a text data cache. The cache is valid as long as the file size, modification time and read parameters \
+    do not change.
+    """
+    stat = os.stat(file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'read_parameters': read_parameters}
+
+
 def read_from_dat(file, delimiter):
     """
-    Method to read data from dat files (i.e from Nanonis software).
+    Method to read data from dat files (i.e from Nanonis software). The header section is scanned once (see \
+    read_dat_metadata) and the data block is parsed in a single pass by the C parser of pandas.
 
     Args:
         file (`str`):                File path + file name.
@@ -75,18 +369,52 @@ def read_from_dat(file, delimiter):
     Returns:
         data (`pandas data frame`):  Returns data structured in a pandas data frame.
     """
-    data_raw = read_csv(file, header=None)
-    start_idx = data_raw[0].index[data_raw[0].str.find('[DATA]') == 0][0] + 1
-    data_raw = data_raw.iloc[start_idx:-1]
-    data = data_raw[0].apply(lambda x: Series(str(x).split(delimiter.encode().decode('unicode_escape'))))
-    data.columns = data.iloc[0]
-    data = data.drop(data.index[0])
-    data = data.reset_index(drop=True)
-    data = data.astype(float)
+    _, n_header_lines = _scan_dat_header(file, delimiter)
+    data = read_csv(file, sep=delimiter.encode().decode('unicode_escape'), skiprows=n_header_lines, header=0,
+                    dtype=float, skip_blank_lines=True)
+    # The last row is skipped as it may be incomplete if the file is still being written.
+    data = data.iloc[0:-1].reset_index(drop=True)
     return data
 
 
-def read_from_file(file, delimiter, header=0):
+def read_dat_metadata(file, delimiter='\t'):
+    """
+    Method to read the header metadata from dat files (i.e from Nanonis software).
+
+    Args:
+        file (`str`):                File path + file name.
+        delimiter (`str`):           Delimiter used in the data file to separate columns (optional)
+
+    Returns:
+        metadata (`dict`):           Returns the header entries as {name: value} dict. Values are strings (empty if \
+                                     there is no value) or lists of strings if an entry has multiple values.
+    """
+    metadata, _ = _scan_dat_header(file, delimiter)
+    return metadata
+
+
+def _scan_dat_header(file, delimiter):
+    """
+    Scans the header section of a dat file up to the [DATA] tag. Returns the header metadata and the number of \
+    lines before the column names of the data block.
+    """
+    delimiter = delimiter.encode().decode('unicode_escape')
+    metadata = {}
+    with open(file, 'r', errors='replace') as f:
+        for n_lines, line in enumerate(f):
+            if line.startswith('[DATA]'):
+                return metadata, n_lines + 1
+            fields = [field.strip() for field in line.rstrip('\r\n').split(delimiter)]
+            while len(fields) > 1 and fields[-1] == '':
+                fields.pop()
+            if len(fields) == 1 and fields[0] != '':
+                metadata[fields[0]] = ''
+            elif fields[0] != '':
+                metadata[fields[0]] = fields[1] if len(fields) == 2 else fields[1:]
+    raise Exception("No [DATA] section found in {}".format(file))
+
+
+def read_from_file(file, delimiter, header=0, channel_indices=None, cache=False):
     """
     Method to read data from a file.
 
@@ -94,22 +422,26 @@ def read_from_file(file, delimiter, header=0):
         file (`str`):               File path + file name to a .TDMS or .txt file.
         delimiter (`str`):          Delimiter used in the data file to separate columns
         header (`int`):            True if file has a header. False otherwise
+        channel_indices (`int list`): Indices of the channels to read. Only these columns are returned in the given \
+                                    order. TDMS files are streamed (see read_from_tdms). All channels are read if None \
+                                    (optional)
+        cache (`bool`):             True caches the parsed data of text files (see read_from_text) (optional)
 
     Returns:
         data (`pandas data frame`):  Returns data structured in a pandas data frame.
     """
     p = pathlib.Path(file)
     if p.suffix == '.tdms':
-        data = read_from_tdms(file)
+        data = read_from_tdms(file, channel_indices)
         return data
     elif p.suffix == '.dat':
         data = read_from_dat(file, delimiter)
     elif p.suffix == '.txt':
-        data = read_from_text(file, delimiter, None, header)
+        data = read_from_text(file, delimiter, None, header, cache)
     elif p.suffix == '':
-        data = read_from_text(file, delimiter, None, header)
+        data = read_from_text(file, delimiter, None, header, cache)
     elif p.suffix == '.csv':
-        data = read_from_text(file, delimiter, None, header)
+        data = read_from_text(file, delimiter, None, header, cache)
 
     # Check how many columns we have. For PLL we expect only 2 (minimal) or 7 (default TDMS file). For Cont.Sweep we
     # expect 256 columns. Reshape to correct format if needed.
@@ -118,6 +450,8 @@ def read_from_file(file, delimiter, header=0):
         df.iloc[:, 0] = data.iloc[:, 0]
         df.iloc[:, 6] = data.iloc[:, 1]
         data = df
+    if channel_indices is not None:
+        data = data.iloc[:, channel_indices]
 
     return data
 
@@ -0,0 +1,146 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import os
+import json
+import pickle
+import hashlib
+from pyIMD import __version__
+
+__author__ = 'Andreas P. Cuny'
+
+
+class ResultCache(object):
+    """
+    Disk cache for intermediate results (i.e. fit results) of pyIMD runs. Each entry is stored as pickle file named \
+    by its key in the cache directory. Entries are evicted least recently used first as soon as the total size of \
+    the cache exceeds its size budget.
+    """
+
+    def __init__(self, cache_path, max_size_mb=1024):
+        """
+        Constructs a ResultCache object.
+
+        Args:
+            cache_path (`str`):        Path to the cache directory. Created if it does not exist.
+            max_size_mb (`float`):     Size budget of the cache [in MB] (optional)
+        """
+        self.cache_path = cache_path
+        self.max_size_mb = max_size_mb
+        os.makedirs(cache_path, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Creates a cache key from json serializable parts (i.e. file fingerprints and settings) and the pyIMD version \
+        such that an update does not reuse results of the previous version.
+
+        Returns:
+            key (`str`):               Returns the key as hex digest.
+        """
+        key_json = json.dumps([__version__, parts], sort_keys=True,
+                              default=lambda x: x.tolist() if hasattr(x, 'tolist') else str(x))
+        return hashlib.sha256(key_json.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Gets an entry from the cache and marks it as recently used.
+
+        Args:
+            key (`str`):               Cache key.
+
+        Returns:
+            value (`object`):          Returns the cached value or None if there is no entry for the key or the \
+                                       entry cannot be loaded (i.e. truncated or written by other versions of its \
+                                       dependencies). Entries that cannot be loaded are removed.
+        """
+        file = self._entry_file(key)
+        try:
+            with open(file, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(file)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+            return None
+        return value
+
+    def put(self, key, value):
+        """
+        Puts an entry into the cache and evicts the least recently used entries if the cache exceeds its budget.
+
+        Args:
+            key (`str`):               Cache key.
+            value (`object`):          Value to cache. Needs to be picklable.
+        """
+        file = self._entry_file(key)
+        # Write to a temporary file first such that concurrent runs never read partially written entries.
+        tmp_file = '{}.{}.tmp'.format(file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, file)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache size is within its budget.
+        """
+        entries = []
+        for file_name in os.listdir(self.cache_path):
+            if file_name.endswith('.pkl'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_path, file_name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_name))
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, file_name in sorted(entries):
+            if total_size <= self.max_size_mb * 1024 * 1024:
+                break
+            try:
+                os.remove(os.path.join(self.cache_path, file_name))
+            except OSError:
+                pass
+            total_size -= size
+
+    def _entry_file(self, key):
+        return os.path.join(self.cache_path, key + '.pkl')
+
+
+def file_fingerprint(file, full_hash_max_size_mb=64, sample_size=1048576):
+    """
+    Fingerprint of the content of a file. Files up to full_hash_max_size_mb are hashed completely. For larger files \
+    the size, the modification time and a hash of samples at the start, middle and end of the file are used.
+
+    Args:
+        file (`str`):                       File path + file name.
+        full_hash_max_size_mb (`float`):    Maximal file size [in MB] to hash completely (optional)
+        sample_size (`int`):                Size of each sample [in bytes] of larger files (optional)
+
+    Returns:
+        fingerprint (`str`):                Returns the fingerprint as hex digest.
+    """
+    stat = os.stat(file)
+    file_hash = hashlib.sha1(str(stat.st_size).encode())
+    with open(file, 'rb') as f:
+        if stat.st_size <= full_hash_max_size_mb * 1024 * 1024:
+            for block in iter(lambda: f.read(sample_size), b''):
+                file_hash.update(block)
+        else:
+            file_hash.update(str(stat.st_mtime_ns).encode())
+            for offset in [0, (stat.st_size - sample_size) // 2, stat.st_size - sample_size]:
+                f.seek(offset)
+                file_hash.update(f.read(sample_size))
+    return file_hash.hexdigest()
@@ -0,0 +1,87 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import numpy as np
+from pandas import DataFrame
+
+__author__ = 'Andreas P. Cuny'
+
+
+class SweepBlock(object):
+    """
+    Array backed container for the sweeps of a Cont.Sweep measurement. Frequency, phase and amplitude are stored as \
+    contiguous float64 arrays with one row per sweep (n_sweeps x n_points) and the time stamp of each sweep as a \
+    vector (n_sweeps).
+    """
+
+    def __init__(self, frequency, phase, amplitude, time):
+        """
+        Constructs a SweepBlock object.
+
+        Args:
+            frequency (`float array`):    Frequencies of all sweeps (n_sweeps x n_points array)
+            phase (`float array`):        Phases of all sweeps (n_sweeps x n_points array)
+            amplitude (`float array`):    Amplitudes of all sweeps (n_sweeps x n_points array)
+            time (`float array`):         Time stamp of each sweep [in s] (n_sweeps array)
+        """
+        self.frequency = np.ascontiguousarray(frequency, dtype=float)
+        self.phase = np.ascontiguousarray(phase, dtype=float)
+        self.amplitude = np.ascontiguousarray(amplitude, dtype=float)
+        self.time = np.ascontiguousarray(time, dtype=float)
+        if self.frequency.ndim != 2 or self.phase.shape != self.frequency.shape or \
+                self.amplitude.shape != self.frequency.shape:
+            raise Exception("Frequency, phase and amplitude of a sweep block should be arrays of the same shape "
+                            "(n_sweeps x n_points).")
+        if self.time.shape != (self.frequency.shape[0],):
+            raise Exception("Sweep block should have one time stamp per sweep.")
+
+    def __len__(self):
+        return self.n_sweeps
+
+    @property
+    def n_sweeps(self):
+        """
+        Number of sweeps.
+        """
+        return self.frequency.shape[0]
+
+    @property
+    def n_points(self):
+        """
+        Number of points per sweep.
+        """
+        return self.frequency.shape[1]
+
+    def convert_units(self, conversion_factor_hz_to_khz, conversion_factor_deg_to_rad):
+        """
+        Converts frequency and phase in place.
+
+        Args:
+            conversion_factor_hz_to_khz (`float`):     Frequency is divided by this factor
+            conversion_factor_deg_to_rad (`float`):    Phase is divided by this factor
+        """
+        self.frequency /= conversion_factor_hz_to_khz
+        self.phase /= conversion_factor_deg_to_rad
+
+    def to_data_frame(self):
+        """
+        Returns the sweeps in the interleaved layout of the TDMS files with 3 rows per sweep: amplitude [+0], \
+        phase [+1] and frequency [+2]. The last column contains the time stamps of the sweeps in its first n_sweeps \
+        rows.
+
+        Returns:
+            data (`pandas data frame`):   Sweep data as pandas data frame.
+        """
+        data = DataFrame(np.stack([self.amplitude, self.phase, self.frequency], axis=1).reshape(-1, self.n_points))
+        time = np.full(len(data), np.nan)
+        time[0:self.n_sweeps] = self.time
+        data[self.n_points] = time
+        return data
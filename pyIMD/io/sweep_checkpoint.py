@@ -0,0 +1,100 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import os
+import numpy as np
+
+__author__ = 'Andreas P. Cuny'
+
+
+class SweepCheckpoint(object):
+    """
+    Append only checkpoint file of the fit results of a Cont.Sweep run. The first line holds the key of the run (i.e. \
+    the content of the measurement file and the fit settings). Each following line holds the sweep index, the \
+    resonance frequency and the curve fit parameters of one sweep as comma separated values. Lines of an interrupted \
+    write are ignored when the checkpoint is read.
+    """
+
+    def __init__(self, file, key):
+        """
+        Constructs a SweepCheckpoint object.
+
+        Args:
+            file (`str`):              File path + file name of the checkpoint file.
+            key (`str`):               Key of the run. A checkpoint with a different key is discarded.
+        """
+        self.file = file
+        self.key = key
+
+    def read(self):
+        """
+        Reads the fit results of the sweeps completed so far.
+
+        Returns:
+            resonance_frequency (`float array`): Resonance frequency of each completed sweep [in kHz]
+        Returns:
+            curve_fit_parameter (`float array`): Curve fit parameters of each completed sweep (n_completed x 3 array)
+        """
+        rows = []
+        # Binary mode such that the offsets are the byte offsets of the lines on any platform
+        try:
+            with open(self.file, 'rb') as f:
+                content = f.read()
+        except OSError:
+            content = b''
+        lines = content.split(b'\n')
+        if lines[0] != '# {}'.format(self.key).encode('utf-8'):
+            return np.empty(0), np.empty((0, 3))
+        valid_size = len(lines[0]) + 1
+        # The last element is empty or an incomplete line (i.e. interrupted while appending)
+        for line in lines[1:-1]:
+            values = line.split(b',')
+            try:
+                if len(values) != 5 or int(values[0]) != len(rows):
+                    break
+                rows.append([float(value) for value in values[1:]])
+            except ValueError:
+                break
+            valid_size += len(line) + 1
+        if valid_size < len(content):
+            # Drop the incomplete tail such that the next append continues after the last complete sweep
+            with open(self.file, 'r+b') as f:
+                f.truncate(valid_size)
+        rows = np.array(rows, dtype=float).reshape(-1, 4)
+        return rows[:, 0], rows[:, 1:]
+
+    def append(self, start, resonance_frequency, curve_fit_parameter):
+        """
+        Appends the fit results of consecutive sweeps and flushes them to disk. Creates the checkpoint file if it \
+        does not exist or belongs to a different run.
+
+        Args:
+            start (`int`):                          Index of the first sweep.
+            resonance_frequency (`float array`):    Resonance frequency of each sweep [in kHz]
+            curve_fit_parameter (`float array`):    Curve fit parameters of each sweep (n x 3 array)
+        """
+        if start == 0 or not os.path.isfile(self.file):
+            with open(self.file, 'w', encoding='utf-8', newline='') as f:
+                f.write('# {}\n'.format(self.key))
+        rows = np.column_stack([np.arange(start, start + len(resonance_frequency)), resonance_frequency,
+                                curve_fit_parameter])
+        # No newline translation, the lines end with \n on any platform (see read)
+        with open(self.file, 'a', encoding='utf-8', newline='') as f:
+            np.savetxt(f, rows, delimiter=',', fmt=['%d', '%.17g', '%.17g', '%.17g', '%.17g'])
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        """
+        Removes the checkpoint file (i.e. after the results of the run have been written).
+        """
+        if os.path.isfile(self.file):
+            os.remove(self.file)
@@ -10,13 +10,23 @@
 # *******************************************************************************/
 
 import os
-from pandas import DataFrame
-from tqdm import trange
+import re
+import json
+import importlib.util
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
 from pyIMD.error.error_handler import ArgumentError
 from pyIMD.io.read_from_disk import read_from_dat
 
 __author__ = 'Andreas P. Cuny'
 
+# Optional module, its package and the pyIMD extra installing it of the binary result formats (see write_results)
+RESULT_FORMAT_DEPENDENCIES = {'parquet': ('pyarrow', 'pyarrow', 'parquet'),
+                              'feather': ('pyarrow', 'pyarrow', 'parquet'),
+                              'hdf5': ('tables', 'pytables', 'hdf5')}
+
 
 def write_to_png(plot_object, file, **kwargs):
     """
@@ -35,16 +45,7 @@ def write_to_png(plot_object, file, **kwargs):
     Returns:
            png file (`void`):         Writes figure to disk as png
     """
-    if 'width' and 'height' and 'units' and 'resolution' in kwargs:
-        width = kwargs.get('width')
-        height = kwargs.get('height')
-        units = kwargs.get('units')
-        resolution = kwargs.get('resolution')
-        plot_object.save(filename='{}.png'.format(file), width=width, height=height, units=units, dpi=resolution)
-    elif not kwargs:
-        plot_object.save(filename='{}.png'.format(file))
-    else:
-        raise ArgumentError(write_to_png.__doc__)
+    _save_plot_object(plot_object, '{}.png'.format(file), 'png', write_to_png.__doc__, **kwargs)
 
 
 def write_to_pdf(plot_object, file, **kwargs):
@@ -65,16 +66,7 @@ def write_to_pdf(plot_object, file, **kwargs):
           pdf file (`void`):            Writes figure to disk as pdf
 
     """
-    if 'width' and 'height' and 'units' and 'resolution' in kwargs:
-        width = kwargs.get('width')
-        height = kwargs.get('height')
-        units = kwargs.get('units')
-        resolution = kwargs.get('resolution')
-        plot_object.save(filename='{}.pdf'.format(file), width=width, height=height, units=units, dpi=resolution)
-    elif not kwargs:
-        plot_object.save(filename='{}.pdf'.format(file))
-    else:
-        raise ArgumentError(write_to_pdf.__doc__)
+    _save_plot_object(plot_object, '{}.pdf'.format(file), 'pdf', write_to_pdf.__doc__, **kwargs)
 
 
 def write_to_disk_as(file_format, plot_object, file, **kwargs):
@@ -104,26 +96,216 @@ def write_to_disk_as(file_format, plot_object, file, **kwargs):
         raise Exception("This figure format is currently not supported.")
 
 
-def write_concat_data(directory, delimiter, time_interval):
+def write_to_pdf_pages(plot_objects, file, **kwargs):
     """
-    Method to write concatenate data from single dat files (i.e data logger from Nanonis software).
+    Method to write figures as the pages of one pdf file
+
+    Args:
+        plot_objects (`iterable`):      ggplot objects. Each figure is drawn and written before the next one is created.
+        file (`str`):                   File path + file name of the pdf file to save
+
+    Keyword Args:
+         width (`int`):                 Figure width (optional)
+         height (`int`):                Figure height (optional)
+         units ('str`):                 Figure units (optional) 'in', 'mm' or 'cm'
+         resolution (`int`):            Figure resolution in dots per inch [dpi] (optional)
+
+    Returns:
+          pdf file (`void`):            Writes the figures to disk as pages of a pdf file
+    """
+    # Imported here such that the calculation does not depend on matplotlib
+    from matplotlib.backends.backend_pdf import PdfPages
+    with PdfPages('{}.pdf'.format(file)) as pdf:
+        for plot_object in plot_objects:
+            _save_plot_object(plot_object, pdf, 'pdf', write_to_pdf_pages.__doc__, **kwargs)
+
+
+def write_to_montage(file_format, plot_objects, file, **kwargs):
+    """
+    Method to write figures tiled into one image. The figures are arranged in a grid with about as many columns as \
+    rows. Each tile has the size and resolution of a single figure.
+
+    Args:
+        file_format (`str`):            File format identifier i.e. png or pdf
+        plot_objects (`iterable`):      ggplot objects. Each figure is drawn before the next one is created.
+        file (`str`):                   File path + file name of the image to save
+
+    Keyword Args:
+         width (`int`):                 Figure width (optional)
+         height (`int`):                Figure height (optional)
+         units ('str`):                 Figure units (optional) 'in', 'mm' or 'cm'
+         resolution (`int`):            Figure resolution in dots per inch [dpi] (optional)
+
+    Returns:
+          file (`void`):                Writes the montage to disk in the respective file format
+    """
+    # Imported here such that the calculation does not depend on matplotlib
+    from io import BytesIO
+    from matplotlib.image import imread, imsave
+    tiles = []
+    for plot_object in plot_objects:
+        buffer = BytesIO()
+        _save_plot_object(plot_object, buffer, 'png', write_to_montage.__doc__, **kwargs)
+        buffer.seek(0)
+        tiles.append((imread(buffer, format='png')[:, :, 0:3] * 255).round().astype(np.uint8))
+    if len(tiles) == 0:
+        raise Exception("A montage needs at least one figure.")
+    tile_row_count = max(tile.shape[0] for tile in tiles)
+    tile_col_count = max(tile.shape[1] for tile in tiles)
+    # Same grid as pyIMD.plotting.figures.get_montage_array_size without a given size
+    col_count = int(np.ceil(np.sqrt(tile_row_count * len(tiles) / tile_col_count)))
+    row_count = int(np.ceil(len(tiles) / col_count))
+    montage = np.full((row_count * tile_row_count, col_count * tile_col_count, 3), 255, dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        row, col = divmod(i, col_count)
+        montage[row * tile_row_count:row * tile_row_count + tile.shape[0],
+                col * tile_col_count:col * tile_col_count + tile.shape[1]] = tile
+    imsave('{}.{}'.format(file, file_format), montage, format=file_format, dpi=kwargs.get('resolution', 100))
+
+
+def _save_plot_object(plot_object, file, file_format, usage, **kwargs):
+    # Either all or none of the figure size keyword arguments are given, otherwise the usage is raised
+    if all(key in kwargs for key in ('width', 'height', 'units', 'resolution')):
+        plot_object.save(filename=file, format=file_format, width=kwargs.get('width'), height=kwargs.get('height'),
+                         units=kwargs.get('units'), dpi=kwargs.get('resolution'))
+    elif not kwargs:
+        plot_object.save(filename=file, format=file_format)
+    else:
+        raise ArgumentError(usage)
+
+
+def write_results(file, calculated_cell_mass, result_format='csv', fit_parameters=None, metadata=None):
+    """
+    Method to write the calculated cell mass in various file formats. CSV writes the mass only. The columnar binary \
+    formats are compressed and store the fit parameters and the run metadata as well:
+
+        parquet:    file.parquet (mass) and file_FitParameters.parquet with the metadata in the schema metadata \
+                    (key 'pyIMD'). Requires pyarrow.
+
+        feather:    file.feather (mass) and file_FitParameters.feather with the metadata in the schema metadata \
+                    (key 'pyIMD'). Requires pyarrow.
+
+        hdf5:       file.h5 with the keys 'mass' and 'fit_parameters' and the metadata as attribute of 'mass'. \
+                    Requires pytables.
+
+    Args:
+        file (`str`):                               File path + file name without extension
+        calculated_cell_mass (`pandas data frame`): Calculated cell mass
+        result_format (`str`):                      File format identifier i.e. csv, parquet, feather or hdf5 \
+                                                    (optional)
+        fit_parameters (`pandas data frame`):       Fit parameters of the measured data (optional)
+        metadata (`dict`):                          Run metadata (optional)
+
+    Returns:
+          file (`void`):                            Writes results to disk in the respective file format
+    """
+    if result_format == 'csv':
+        calculated_cell_mass.to_csv(file + '.csv', index=False, na_rep="nan")
+        return
+
+    tables = {'mass': calculated_cell_mass.rename(columns=str)}
+    if fit_parameters is not None:
+        tables['fit_parameters'] = fit_parameters.rename(columns=str)
+    metadata_json = json.dumps(metadata if metadata is not None else {},
+                               default=lambda x: x.tolist() if hasattr(x, 'tolist') else str(x))
+
+    if result_format in ['parquet', 'feather']:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            import pyarrow.feather as feather
+        except ImportError:
+            raise Exception("Result format {} requires pyarrow.".format(result_format))
+        for key, data in tables.items():
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'pyIMD': metadata_json.encode()})
+            file_name = file if key == 'mass' else file + '_FitParameters'
+            if result_format == 'parquet':
+                pq.write_table(table, file_name + '.parquet', compression='zstd')
+            else:
+                feather.write_feather(table, file_name + '.feather', compression='zstd')
+    elif result_format == 'hdf5':
+        try:
+            from pandas import HDFStore
+            store = HDFStore(file + '.h5', mode='w', complevel=5, complib='zlib')
+        except ImportError:
+            raise Exception("Result format hdf5 requires pytables.")
+        with store:
+            for key, data in tables.items():
+                store.put(key, data)
+            store.get_storer('mass').attrs.metadata = json.loads(metadata_json)
+    else:
+        raise Exception("This result format is currently not supported.")
+
+
+def check_result_format(result_format):
+    """
+    Checks that the optional dependencies of a result format (see write_results) are installed, i.e. before the \
+    calculation is started. They are installed with the pyIMD extras parquet (pyarrow) and hdf5 (pytables).
+
+    Args:
+        result_format (`str`):      File format identifier i.e. csv, parquet, feather or hdf5
+    """
+    if result_format in RESULT_FORMAT_DEPENDENCIES:
+        module, package, extra = RESULT_FORMAT_DEPENDENCIES[result_format]
+        if importlib.util.find_spec(module) is None:
+            raise Exception("Result format {} requires {}. Install it with pip install pyIMD[{}].".format(
+                result_format, package, extra))
+
+
+def write_concat_data(directory, delimiter, time_interval, n_workers=1):
+    """
+    Method to write concatenate data from single dat files (i.e data logger from Nanonis software). The dat files \
+    of the directory are read in natural sort order (i.e file_2 before file_10) and each file is appended to the \
+    output file directly after parsing. Hence, memory usage does not depend on the number of files.
 
     Args:
         directory (`str`):                Directory containing files to concatenate.
         delimiter (`str`):                Delimiter to be used in the data file to separate columns.
         time_interval (`int`):            Measurement time interval in milliseconds.
+        n_workers (`int`):                Number of worker processes used to parse the files in parallel (optional)
 
     Returns:
           file (`void`):                  Writes concatenated data to single .csv file.
 
     """
-    files = os.listdir(directory)
-    appended_data = DataFrame()
-    for iFile in trange(0, len(files)):
-        data = read_from_dat(directory + os.sep + files[iFile], delimiter=delimiter)
-        appended_data = appended_data.append(DataFrame(data=data), ignore_index=True)
+    files = sorted([file for file in os.listdir(directory) if file.lower().endswith('.dat')], key=natural_sort_key)
+    files = [directory + os.sep + file for file in files]
+    n_rows = 0
+    with open(directory + os.sep + 'DataLoggerConCat.csv', 'w', newline='') as output_file:
+        for data in tqdm(_parse_dat_files(files, delimiter, n_workers), total=len(files)):
+            data['Time (ms)'] = (n_rows + np.arange(data.shape[0])) * time_interval
+            data.iloc[:, ::-1].to_csv(output_file, sep='\t', index=False, header=False)
+            n_rows = n_rows + data.shape[0]
+
 
-    time = [x * time_interval for x in range(0, appended_data.shape[0])]
-    appended_data['Time (ms)'] = time
-    appended_data = appended_data.iloc[:, ::-1]
-    appended_data.to_csv(directory + os.sep + 'DataLoggerConCat.csv', sep='\t', index=False, header=False)
+def _parse_dat_files(files, delimiter, n_workers):
+    """
+    Generator parsing dat files in the given order. With more than one worker the files are parsed in a process pool \
+    with at most 2 x n_workers files in flight.
+    """
+    if n_workers <= 1:
+        for file in files:
+            yield read_from_dat(file, delimiter=delimiter)
+        return
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = deque()
+        for file in files:
+            pending.append(executor.submit(read_from_dat, file, delimiter))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def natural_sort_key(file_name):
+    """
+    Key to sort file names in natural order i.e. numbers within the names are compared by their value.
+
+    Args:
+        file_name (`str`):                File name.
+
+    Returns:
+          key (`list`):                   Returns the sort key.
+    """
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', file_name)]
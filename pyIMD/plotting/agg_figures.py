@@ -0,0 +1,158 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from pyIMD.analysis.curve_fit import fit_function
+from pyIMD.plotting.downsampling import downsample_mass
+
+__author__ = 'Andreas P. Cuny'
+
+# Figures of pyIMD.plotting.figures drawn directly with matplotlib on the Agg canvas (figure_backend 'matplotlib').
+# The functions take the same arguments and return objects saved like ggplot objects (see write_to_disk_as).
+
+
+class AggFigure(object):
+    """
+    Matplotlib figure drawn on the Agg canvas. It is saved with the same arguments as a ggplot object.
+    """
+
+    def __init__(self, figure):
+        """
+        Constructs an AggFigure object.
+
+        Args:
+            figure (`matplotlib figure`):   Figure to save.
+        """
+        self.figure = figure
+        FigureCanvasAgg(figure)
+
+    def save(self, filename, format=None, width=None, height=None, units='in', dpi=100):
+        """
+        Saves the figure. The file format is given by the extension of the file name or by format.
+
+        Args:
+            filename (`str`):               File path + file name of the figure to save or a file object
+            format (`str`):                 File format identifier i.e. png or pdf (optional)
+            width (`float`):                Figure width (optional)
+            height (`float`):               Figure height (optional)
+            units (`str`):                  Figure units (optional) 'in', 'mm' or 'cm'
+            dpi (`int`):                    Figure resolution in dots per inch [dpi] (optional)
+        """
+        if width is not None and height is not None:
+            inches_per_unit = {'in': 1.0, 'cm': 1 / 2.54, 'mm': 1 / 25.4}[units]
+            self.figure.set_size_inches(width * inches_per_unit, height * inches_per_unit)
+        self.figure.savefig(filename, format=format, dpi=dpi)
+
+
+def plot_fitting(x, y, resonance_frequency, parameter):
+    """ Plots the phase response and the corresponding fit of the harmonic damped oscillator.
+
+    Args:
+        x (`float array`):                       X coordinates (frequency in kHz). Pandas series or numpy array.
+        y (`float array`):                       Y coordinates (phase in radians). Pandas series or numpy array.
+        resonance_frequency (`float array`):     Resonance frequency given by the fit of x and y
+        parameter (`float array`):               Others parameters of function fit (Q factor, offset, linear background)
+
+    Returns:
+        p (`AggFigure`):                         Returns an AggFigure object
+    """
+    x = np.asarray(x, dtype=float)
+    figure, axes = _create_figure((15, 7))
+    axes.plot(x, np.asarray(y, dtype=float), 'o', color='black', markersize=4)
+    axes.plot(x, fit_function(x, resonance_frequency, parameter[0], parameter[1], parameter[2]), color='red',
+              linewidth=1)
+    axes.set_xlabel('Frequency (kHz)')
+    axes.set_ylabel('Phase (rad)')
+    return AggFigure(figure)
+
+
+def plot_response_shift(x, y, resonance_frequency_without, parameter_without, xx, yy, resonance_frequency_with,
+                        parameter):
+    """ Plots the phase response of pre start data without and with cell attached to cantilever with the
+    respective function fit.
+
+    Args:
+        x (`float array`):                               X coordinates w/o cell (frequency in kHz)
+        y (`float array`):                               Y coordinates w/o cell (phase in radians)
+        xx (`float array`):                              X coordinates w/ cell(frequency in kHz)
+        yy (`float array`):                              Y coordinates w/ cell (phase in radians)
+        resonance_frequency_without (`float array`):     Resonance frequency given by the fit of x and y  w/o cell
+        resonance_frequency_with (`float array`):        Resonance frequency given by the fit of x and y w/ cell
+        parameter (`float array`):                       Others parameters of function fit (Q factor, offset, linear
+                                                         background) w/o cell
+        parameter_without (`float array`):               Others parameters of function fit (Q factor, offset, linear
+                                                         background) w/ cell
+
+    Returns:
+        p (`AggFigure`):                                 Returns an AggFigure object
+    """
+    x = np.asarray(x, dtype=float)
+    xx = np.asarray(xx, dtype=float)
+    figure, axes = _create_figure((15, 7))
+    raw_data = axes.plot(xx, np.asarray(yy, dtype=float), 'o', x, np.asarray(y, dtype=float), 'o', alpha=0.6,
+                         markersize=4)
+    function_fits = axes.plot(xx, fit_function(xx, resonance_frequency_with, parameter[0], parameter[1], parameter[2]),
+                              x, fit_function(x, resonance_frequency_without, parameter_without[0],
+                                              parameter_without[1], parameter_without[2]))
+    axes.set_xlabel('Frequency (kHz)')
+    axes.set_ylabel('Phase (rad)')
+    # Legends right of the axes. The first one is added as artist such that the second one does not replace it and
+    # is not clipped such that the layout makes room for it.
+    raw_data_legend = axes.legend(raw_data, ['Raw phase w cell att.', 'Raw phase w/o cell att.'], title='Raw data',
+                                  loc='upper left', bbox_to_anchor=(1.02, 1), frameon=False)
+    axes.add_artist(raw_data_legend)
+    raw_data_legend.set_clip_on(False)
+    axes.legend(function_fits, ['Phase fit w cell att.', 'Phase fit w/o cell att.'], title='Function fits',
+                loc='lower left', bbox_to_anchor=(1.02, 0), frameon=False)
+    return AggFigure(figure)
+
+
+def plot_mass(calculated_cell_mass, plot_every_nth_point, max_points=None, downsampling='min_max'):
+    """ Plots the resulting mass
+
+    Args:
+        calculated_cell_mass (`pandas data frame`):  Pandas data frame [Nx3] with time and calculated cell mass and
+                                                     rolling mean averaged cell mass
+        plot_every_nth_point (`int`):                If 1 all data points are plotted. Otherwise every nth data point is
+                                                     used for plotting. Only used without max_points.
+        max_points (`int`):                          Maximal number of data points plotted, i.e. two per pixel of the
+                                                     figure width. None plots every nth point. (optional)
+        downsampling (`str`):                        Method selecting the points plotted if there are more than
+                                                     max_points (optional, see downsampling.downsample_mass)
+
+    Returns:
+        p (`AggFigure`):                             Returns an AggFigure object
+    """
+    col_names = list(calculated_cell_mass)
+    data = calculated_cell_mass.iloc[:, 0:3].to_numpy(dtype=float)
+    point_indices, line_indices = downsample_mass(data[:, 0], data[:, 1], data[:, 2], plot_every_nth_point,
+                                                  max_points, downsampling)
+    figure, axes = _create_figure((6.4, 4.8))
+    # Rasterize the (many) points such that vector formats (pdf) stay small
+    axes.plot(data[point_indices, 0], data[point_indices, 1], 'o', color='black', alpha=0.1, markersize=3,
+              markeredgewidth=0, rasterized=True)
+    # The line breaks at NaN rows (i.e. masked regions)
+    axes.plot(data[line_indices, 0], data[line_indices, 2], color='red')
+    axes.set_xlabel('Time (h)')
+    axes.set_ylabel(col_names[1])
+    axes.grid(True, color='0.9')
+    return AggFigure(figure)
+
+
+def _create_figure(figure_size):
+    # The constrained layout is applied when the figure is saved, i.e. after it is resized to the figure settings
+    figure = Figure(figsize=figure_size, constrained_layout=True)
+    axes = figure.add_subplot(1, 1, 1)
+    axes.spines['top'].set_visible(False)
+    axes.spines['right'].set_visible(False)
+    return figure, axes
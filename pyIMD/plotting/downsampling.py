@@ -0,0 +1,190 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import numpy as np
+
+__author__ = 'Andreas P. Cuny'
+
+
+def downsample(x, y, n_out, method='min_max'):
+    """
+    Selects the points of a time series to plot such that its visual appearance is preserved with about n_out \
+    points. Each contiguous segment of finite points is downsampled separately with a share of n_out proportional \
+    to its length. Of each gap between two segments (i.e. a masked region) the first point is selected as well, such \
+    that a line plotted through the selected points breaks at the gap instead of bridging it.
+
+    Args:
+        x (`float array`):          X coordinates (i.e. time). Pandas series or numpy array.
+        y (`float array`):          Y coordinates (i.e. mass). Pandas series or numpy array.
+        n_out (`int`):              Number of finite points selected. Segments too short for their downsampling \
+                                    method are selected entirely.
+        method (`str`):             min_max := minimum and maximum of each bucket (see downsample_min_max)
+                                    lttb    := largest triangle three buckets (see downsample_lttb)
+                                    none    := all points are selected (optional)
+
+    Returns:
+        indices (`int array`):      Returns the sorted indices of the selected points.
+    """
+    if method == 'min_max':
+        select, min_points = downsample_min_max, 2
+    elif method == 'lttb':
+        select, min_points = downsample_lttb, 3
+    elif method == 'none':
+        return np.arange(len(y))
+    else:
+        raise Exception("Downsampling method {} is not supported. Use 'min_max', 'lttb' or 'none'.".format(method))
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    is_finite = np.isfinite(x) & np.isfinite(y)
+    n_finite = np.count_nonzero(is_finite)
+    if n_finite == len(y):
+        return select(x, y, n_out)
+    # Start and end of the contiguous segments of finite points
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], is_finite, [False]]).astype(int)))
+    indices = []
+    for i, (start, end) in enumerate(zip(edges[0::2], edges[1::2])):
+        if i > 0:
+            # First point of the gap before this segment (end of the previous segment)
+            indices.append([edges[2 * i - 1]])
+        n_segment = max(int(n_out * (end - start) / n_finite), min_points)
+        indices.append(start + select(x[start:end], y[start:end], n_segment))
+    return np.concatenate(indices).astype(int) if len(indices) > 0 else np.empty(0, dtype=int)
+
+
+def downsample_mass(time, mass, mean_mass, plot_every_nth_point=1, max_points=None, method='min_max'):
+    """
+    Selects the points of the mass figure, i.e. the mass plotted as points and its rolling mean plotted as line. \
+    Without a point budget every nth point is selected. With a point budget mass and rolling mean are downsampled \
+    separately (see downsample) and plot_every_nth_point is not applied.
+
+    Args:
+        time (`float array`):               Time. Pandas series or numpy array.
+        mass (`float array`):               Mass. Pandas series or numpy array.
+        mean_mass (`float array`):          Rolling mean of the mass. Pandas series or numpy array.
+        plot_every_nth_point (`int`):       Every nth point is selected if there is no point budget (optional)
+        max_points (`int`):                 Point budget of mass and rolling mean. None selects every nth point. \
+                                            (optional)
+        method (`str`):                     Downsampling method (optional, see downsample)
+
+    Returns:
+        point_indices (`int array`):        Returns the sorted indices of the mass points.
+    Returns:
+        line_indices (`int array`):         Returns the sorted indices of the rolling mean line including the first \
+                                            point of each gap.
+    """
+    if max_points is None:
+        indices = np.arange(0, len(mass), plot_every_nth_point)
+        return indices, indices
+    mass = np.asarray(mass, dtype=float)
+    point_indices = downsample(time, mass, max_points, method)
+    # Gap points only break lines, there is nothing to plot as point
+    point_indices = point_indices[np.isfinite(mass[point_indices])]
+    return point_indices, downsample(time, mean_mass, max_points, method)
+
+
+def downsample_lttb(x, y, n_out):
+    """
+    Largest triangle three buckets downsampling. The first and the last point are kept and the points in between are \
+    split into n_out - 2 buckets. Of each bucket the point forming the largest triangle with the point selected in the \
+    previous bucket and the mean of the next bucket is selected. The buckets are processed in order as each selection \
+    depends on the previous one; the areas within a bucket are computed vectorized.
+
+    Args:
+        x (`float array`):          X coordinates (i.e. time)
+        y (`float array`):          Y coordinates (i.e. mass)
+        n_out (`int`):              Maximal number of points selected (>= 3)
+
+    Returns:
+        indices (`int array`):      Returns the sorted indices of the selected points.
+    """
+    x, y, valid = _finite_points(x, y)
+    n = len(valid)
+    if n <= n_out:
+        return valid
+    if n_out < 3:
+        raise Exception("Largest triangle three buckets downsampling needs at least 3 points.")
+
+    # Bucket i spans edges[i] to edges[i + 1]. The first and the last point are not part of any bucket.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[0:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[0:n - 1], edges[:-1]) / counts
+    # Third point of the triangle: mean of the next bucket or the last point for the last bucket
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y[i] - y[a]))
+        a = start + np.argmax(area)
+        selected[i + 1] = a
+    return valid[selected]
+
+
+def downsample_min_max(x, y, n_out):
+    """
+    Min/max downsampling. The points are split into n_out / 2 consecutive buckets of equal size and the minimum and \
+    the maximum of each bucket are selected. Short spikes are kept as they are the extremes of their bucket.
+
+    Args:
+        x (`float array`):          X coordinates (i.e. time)
+        y (`float array`):          Y coordinates (i.e. mass)
+        n_out (`int`):              Maximal number of points selected (>= 2)
+
+    Returns:
+        indices (`int array`):      Returns the sorted indices of the selected points.
+    """
+    x, y, valid = _finite_points(x, y)
+    n = len(valid)
+    if n <= n_out:
+        return valid
+    if n_out < 2:
+        raise Exception("Min/max downsampling needs at least 2 points.")
+
+    bucket_size = int(np.ceil(n / (n_out // 2)))
+    n_buckets = int(np.ceil(n / bucket_size))
+    buckets = np.full(n_buckets * bucket_size, np.nan)
+    buckets[0:n] = y
+    buckets = buckets.reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    # The padding of the last bucket is never selected
+    min_idx = offsets + np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1)
+    max_idx = offsets + np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1)
+    return valid[np.unique(np.concatenate([min_idx, max_idx]))]
+
+
+def get_figure_pixel_width(width, units, resolution):
+    """
+    Calculates the width of a figure in pixels, i.e. to derive the point budget of downsample.
+
+    Args:
+        width (`float`):            Figure width
+        units (`str`):              Figure units 'in', 'mm' or 'cm'
+        resolution (`int`):         Figure resolution in dots per inch [dpi]
+
+    Returns:
+        pixel_width (`int`):        Returns the figure width in pixels.
+    """
+    return int(round(width * {'in': 1.0, 'cm': 1 / 2.54, 'mm': 1 / 25.4}[units] * resolution))
+
+
+def _finite_points(x, y):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(valid) == len(y):
+        return x, y, valid
+    return x[valid], y[valid], valid
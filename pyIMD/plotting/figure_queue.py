@@ -0,0 +1,190 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pyIMD.io.write_to_disk import write_to_disk_as, write_to_pdf_pages, write_to_montage
+
+__author__ = 'Andreas P. Cuny'
+
+
+class FigureQueue(object):
+    """
+    Queue rendering figures in background processes while the calculation continues. A figure is specified by the \
+    name of a plot function of pyIMD.plotting.figures, its arguments (data arrays), the file to write it to and the \
+    figure backend. Errors of a figure are raised by wait. If the rendering processes cannot be started (i.e. on \
+    platforms without process pools) the figures are rendered in the calling process.
+    """
+
+    def __init__(self, n_workers=1):
+        """
+        Constructs a FigureQueue object.
+
+        Args:
+            n_workers (`int`):         Number of rendering processes. 0 renders each figure when it is submitted \
+                                       in the calling process. (optional)
+        """
+        self.n_workers = n_workers
+        self._executor = None
+        # Submitted futures and the (function, args, kwargs) rendering them
+        self._futures = []
+        self._tasks = []
+        if n_workers > 0:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=n_workers)
+            except (OSError, NotImplementedError):
+                self._executor = None
+
+    def submit(self, plot_name, plot_args, file_format, file, figure_backend='plotnine', **kwargs):
+        """
+        Submits a figure to be rendered and written to disk.
+
+        Args:
+            plot_name (`str`):         Name of the plot function in pyIMD.plotting.figures (i.e. plot_fitting)
+            plot_args (`tuple`):       Arguments of the plot function.
+            file_format (`str`):       File format identifier i.e. png or pdf
+            file (`str`):              File path + file name of the figure (without extension)
+            figure_backend (`str`):    plotnine or matplotlib (optional, see render_figure)
+
+        Keyword Args:
+            width, height, units, resolution: Figure size and resolution (optional, see write_to_disk_as)
+        """
+        self._submit(render_figure, (plot_name, plot_args, file_format, file, figure_backend), kwargs)
+
+    def submit_pages(self, plot_name, plot_args_list, file_format, file, layout='pdf', figure_backend='plotnine',
+                     **kwargs):
+        """
+        Submits a set of figures to be rendered and written to disk as one file (see render_figure_pages). The set \
+        is rendered by one process.
+
+        Args:
+            plot_name (`str`):         Name of the plot function in pyIMD.plotting.figures (i.e. plot_fitting)
+            plot_args_list (`list`):   Arguments of the plot function (tuple) of each figure.
+            file_format (`str`):       File format identifier of the montage i.e. png or pdf
+            file (`str`):              File path + file name of the file (without extension)
+            layout (`str`):            pdf or montage (optional, see render_figure_pages)
+            figure_backend (`str`):    plotnine or matplotlib (optional, see render_figure)
+
+        Keyword Args:
+            width, height, units, resolution: Size and resolution of each figure (optional, see write_to_disk_as)
+        """
+        self._submit(render_figure_pages, (plot_name, plot_args_list, file_format, file, layout, figure_backend),
+                     kwargs)
+
+    def _submit(self, function, args, kwargs):
+        if self._executor is not None:
+            try:
+                self._futures.append(self._executor.submit(function, *args, **kwargs))
+                self._tasks.append((function, args, kwargs))
+                return
+            except (BrokenProcessPool, RuntimeError, OSError, AssertionError):
+                # The rendering processes cannot be started (i.e. daemonic batch workers before Python 3.9 cannot
+                # have children), render this and the next figures in the calling process
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        function(*args, **kwargs)
+
+    @property
+    def n_pending(self):
+        """
+        Number of submitted figures not rendered yet.
+        """
+        return sum(not future.done() for future in self._futures)
+
+    def wait(self):
+        """
+        Waits until all submitted figures are written to disk and stops the rendering processes. Figures lost with a \
+        broken rendering process are rendered in the calling process.
+
+        Returns:
+            n_figures (`int`):         Returns the number of figures rendered in the background.
+        """
+        try:
+            for future, (function, args, kwargs) in zip(self._futures, self._tasks):
+                try:
+                    future.result()
+                except BrokenProcessPool:
+                    function(*args, **kwargs)
+        finally:
+            self.close()
+        return len(self._futures)
+
+    def close(self, cancel=False):
+        """
+        Stops the rendering processes.
+
+        Args:
+            cancel (`bool`):           If True figures not being rendered yet are dropped. (optional)
+        """
+        if self._executor is not None:
+            if cancel:
+                # shutdown(cancel_futures=True) needs Python >= 3.9
+                for future in self._futures:
+                    future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def render_figure(plot_name, plot_args, file_format, file, figure_backend='plotnine', **kwargs):
+    """
+    Creates a figure with a plot function and writes it to disk. The plot functions of the plotnine backend are \
+    defined in pyIMD.plotting.figures, the ones of the matplotlib backend in pyIMD.plotting.agg_figures.
+
+    Args:
+        plot_name (`str`):         Name of the plot function (i.e. plot_fitting)
+        plot_args (`tuple`):       Arguments of the plot function.
+        file_format (`str`):       File format identifier i.e. png or pdf
+        file (`str`):              File path + file name of the figure (without extension)
+        figure_backend (`str`):    plotnine or matplotlib (optional)
+
+    Keyword Args:
+        width, height, units, resolution: Figure size and resolution (optional, see write_to_disk_as)
+    """
+    write_to_disk_as(file_format, getattr(_get_figures(figure_backend), plot_name)(*plot_args), file, **kwargs)
+
+
+def render_figure_pages(plot_name, plot_args_list, file_format, file, layout='pdf', figure_backend='plotnine',
+                        **kwargs):
+    """
+    Creates a set of figures with a plot function and writes them to disk as one file. The figures are created one \
+    by one such that only one of them is held in memory.
+
+    Args:
+        plot_name (`str`):         Name of the plot function (i.e. plot_fitting)
+        plot_args_list (`list`):   Arguments of the plot function (tuple) of each figure.
+        file_format (`str`):       File format identifier of the montage i.e. png or pdf
+        file (`str`):              File path + file name of the file (without extension)
+        layout (`str`):            pdf     := each figure is a page of a pdf file (see write_to_pdf_pages)
+                                   montage := the figures are tiled into one image (see write_to_montage) (optional)
+        figure_backend (`str`):    plotnine or matplotlib (optional, see render_figure)
+
+    Keyword Args:
+        width, height, units, resolution: Size and resolution of each figure (optional, see write_to_disk_as)
+    """
+    plot = getattr(_get_figures(figure_backend), plot_name)
+    plot_objects = (plot(*plot_args) for plot_args in plot_args_list)
+    if layout == 'pdf':
+        write_to_pdf_pages(plot_objects, file, **kwargs)
+    elif layout == 'montage':
+        write_to_montage(file_format, plot_objects, file, **kwargs)
+    else:
+        raise Exception("Figure layout {} is not supported. Use 'pdf' or 'montage'.".format(layout))
+
+
+def _get_figures(figure_backend):
+    # Imported here such that only rendering processes load the plotting libraries
+    if figure_backend == 'matplotlib':
+        from pyIMD.plotting import agg_figures as figures
+    elif figure_backend == 'plotnine':
+        from pyIMD.plotting import figures
+    else:
+        raise Exception("Figure backend {} is not supported. Use 'plotnine' or 'matplotlib'.".format(figure_backend))
+    return figures
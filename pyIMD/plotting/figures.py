@@ -12,8 +12,9 @@
 import math
 import warnings
 import numpy as np
-from pandas import concat, melt
+from pandas import concat, melt, Series
 from pyIMD.analysis.curve_fit import fit_function
+from pyIMD.plotting.downsampling import downsample_mass
 from plotnine import ggplot, aes, geom_line, geom_point, theme_bw, labs, xlab, ylab, theme, theme_seaborn, \
     element_line, element_rect
 
@@ -26,14 +27,18 @@ def plot_fitting(x, y, resonance_frequency, parameter):
     """ Plots the phase response and the corresponding fit of the harmonic damped oscillator.
 
     Args:
-        x (`float array`):                       X coordinates (frequency in kHz)
-        y (`float array`):                       Y coordinates (phase in radians)
+        x (`float array`):                       X coordinates (frequency in kHz). Pandas series or numpy array.
+        y (`float array`):                       Y coordinates (phase in radians). Pandas series or numpy array.
         resonance_frequency (`float array`):     Resonance frequency given by the fit of x and y
         parameter (`float array`):               Others parameters of function fit (Q factor, offset, linear background)
 
     Returns:
         p (`ggplot object`):                     Returns a ggplot object
     """
+    if not isinstance(x, Series):
+        x = Series(x)
+    if not isinstance(y, Series):
+        y = Series(y)
     y_fit = fit_function(x, resonance_frequency, parameter[0], parameter[1], parameter[2])
     y_fit.name = 'Phase fit'
     x.name = 'Frequency (kHz)'
@@ -101,14 +106,18 @@ def plot_response_shift(x, y, resonance_frequency_without, parameter_without, xx
     return p
 
 
-def plot_mass(calculated_cell_mass, plot_every_nth_point):
+def plot_mass(calculated_cell_mass, plot_every_nth_point, max_points=None, downsampling='min_max'):
     """ Plots the resulting mass
 
     Args:
         calculated_cell_mass (`pandas data frame`):  Pandas data frame [Nx3] with time and calculated cell mass and
                                                      rolling mean averaged cell mass
         plot_every_nth_point (`int`):                If 1 all data points are plotted. Otherwise every nth data point is
-                                                     used for plotting.
+                                                     used for plotting. Only used without max_points.
+        max_points (`int`):                          Maximal number of data points plotted, i.e. two per pixel of the
+                                                     figure width. None plots every nth point. (optional)
+        downsampling (`str`):                        Method selecting the points plotted if there are more than
+                                                     max_points (optional, see downsampling.downsample_mass)
 
     Returns:
         p (`ggplot object`):                         Returns a ggplot plot object
@@ -118,13 +127,15 @@ def plot_mass(calculated_cell_mass, plot_every_nth_point):
     col_names = list(calculated_cell_mass)
     col_names[0] = 'Time (h)'
     calculated_cell_mass.columns = col_names
-    calculated_cell_mass = calculated_cell_mass.iloc[::plot_every_nth_point, :]
     calculated_cell_mass = calculated_cell_mass.astype(float)  # To make sure time is a float at this point
-
-    # Plot data
-    p = ggplot(data=calculated_cell_mass, mapping=aes(x=col_names[0], y=col_names[1])) + \
-        geom_point(alpha=0.1) + \
-        geom_line(aes(y=col_names[2]), color='red') + \
+    point_indices, line_indices = downsample_mass(calculated_cell_mass.iloc[:, 0], calculated_cell_mass.iloc[:, 1],
+                                                  calculated_cell_mass.iloc[:, 2], plot_every_nth_point, max_points,
+                                                  downsampling)
+
+    # Plot data. The line breaks at NaN rows (i.e. masked regions).
+    p = ggplot(mapping=aes(x=col_names[0])) + \
+        geom_point(data=calculated_cell_mass.iloc[point_indices], mapping=aes(y=col_names[1]), alpha=0.1) + \
+        geom_line(data=calculated_cell_mass.iloc[line_indices], mapping=aes(y=col_names[2]), color='red') + \
         theme_bw()
     return p
 
@@ -0,0 +1,311 @@
+# /********************************************************************************
+# * Copyright © 2018-2019, ETH Zurich, D-BSSE, Andreas P. Cuny & Gotthold Fläschner
+# * All rights reserved. This program and the accompanying materials
+# * are made available under the terms of the GNU Public License v3.0
+# * which accompanies this distribution, and is available at
+# * http://www.gnu.org/licenses/gpl
+# *
+# * Contributors:
+# *     Andreas P. Cuny - initial API and implementation
+# *******************************************************************************/
+
+import os
+import sys
+import glob
+import time
+import tempfile
+import subprocess
+import numpy as np
+from scipy import optimize
+from pandas import read_csv, Series, DataFrame, concat
+from pyIMD.analysis.curve_fit import fit_function, fit_function_jacobian
+from pyIMD.analysis.calculations import calculate_sweep_resonance_frequencies, estimate_initial_parameter_guess
+from pyIMD.analysis.calculations import calculate_tracked_resonance_frequencies
+from pyIMD.analysis.rolling_statistics import RollingStatistics
+from pyIMD.io.read_from_disk import read_from_dat
+from pyIMD.plotting.figure_queue import FigureQueue, render_figure
+from pyIMD.plotting.downsampling import downsample_lttb, downsample_min_max
+
+__author__ = 'Andreas P. Cuny'
+
+# Benchmarks of performance critical code paths. Run with: python -m pyIMD.tests.benchmarks
+
+
+def create_sweeps(n_sweeps, n_points=255, seed=0):
+    """
+    Creates synthetic sweep data (frequency in kHz and phase in rad) with slowly drifting resonance frequencies.
+
+    Returns:
+        frequency_matrix (`float array`):   Frequencies (n_sweeps x n_points array)
+        phase_matrix (`float array`):       Phases (n_sweeps x n_points array)
+    """
+    random_state = np.random.RandomState(seed)
+    resonance_frequency = 73.0 - np.linspace(0, 0.5, n_sweeps) + random_state.normal(0, 0.01, n_sweeps)
+    frequency_matrix = np.linspace(43, 103, n_points)[None, :] + random_state.normal(0, 0.005, (n_sweeps, 1))
+    phase_matrix = fit_function(frequency_matrix, resonance_frequency[:, None], 3.2, 0.014, -1.0) + \
+        random_state.normal(0, 0.02, (n_sweeps, n_points))
+    return frequency_matrix, phase_matrix
+
+
+def benchmark_sweep_fit_modes(n_sweeps=2000):
+    """
+    Compares the per sweep curve_fit path with the batched sweep fitter.
+    """
+    frequency_matrix, phase_matrix = create_sweeps(n_sweeps)
+    results = {}
+    for fit_mode in ['Sequential', 'Batch']:
+        start = time.perf_counter()
+        results[fit_mode] = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix,
+                                                                  [70.0, 2.0, 0.0, 0.0], [10.0, 1.0, -3, -3],
+                                                                  [100.0, 5.0, 3, 3], fit_mode=fit_mode)
+        print('Sweep fit mode {}: {} sweeps in {:.2f} s'.format(fit_mode, n_sweeps, time.perf_counter() - start))
+    print('Max. resonance frequency difference: {:.3e} kHz'.format(
+        np.max(np.abs(results['Sequential'][0] - results['Batch'][0]))))
+
+
+def benchmark_fit_function_jacobian(n_sweeps=200):
+    """
+    Compares the number of fit_function evaluations of curve_fit with the finite difference and the analytic Jacobian.
+    """
+    frequency_matrix, phase_matrix = create_sweeps(n_sweeps)
+    for jac in [None, fit_function_jacobian]:
+        n_evaluations = [0]
+
+        def counted_fit_function(*args):
+            n_evaluations[0] += 1
+            return fit_function(*args)
+
+        start = time.perf_counter()
+        for iSweep in range(0, n_sweeps):
+            optimize.curve_fit(counted_fit_function, frequency_matrix[iSweep], phase_matrix[iSweep],
+                               p0=[70.0, 2.0, 0.0, 0.0], bounds=([10.0, 1.0, -3, -3], [100.0, 5.0, 3, 3]), jac=jac)
+        print('Jacobian {}: {:.1f} fit_function evaluations per sweep, {:.2f} s'.format(
+            'analytic' if jac else 'finite difference', n_evaluations[0] / n_sweeps, time.perf_counter() - start))
+
+
+def benchmark_sweep_fit_warm_start(n_sweeps=1000):
+    """
+    Compares the number of fit_function evaluations of the sequential sweep fit with and without warm start.
+    """
+    import pyIMD.analysis.calculations as calculations
+    frequency_matrix, phase_matrix = create_sweeps(n_sweeps)
+    for warm_start in [False, True]:
+        n_evaluations = [0]
+
+        def counted_fit_function(*args):
+            n_evaluations[0] += 1
+            return fit_function(*args)
+
+        calculations.fit_function = counted_fit_function
+        start = time.perf_counter()
+        calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix, [70.0, 2.0, 0.0, 0.0],
+                                              [10.0, 1.0, -3, -3], [100.0, 5.0, 3, 3], warm_start=warm_start)
+        print('Warm start {}: {:.1f} fit_function evaluations per sweep, {:.2f} s'.format(
+            warm_start, n_evaluations[0] / n_sweeps, time.perf_counter() - start))
+    calculations.fit_function = fit_function
+
+
+def benchmark_auto_initial_parameter_guess(n_sweeps=1000):
+    """
+    Compares the number of fit_function evaluations of the sequential sweep fit starting from the default initial \
+    parameter guess and from the estimated initial parameter guess.
+    """
+    import pyIMD.analysis.calculations as calculations
+    frequency_matrix, phase_matrix = create_sweeps(n_sweeps)
+    for is_auto in [False, True]:
+        n_evaluations = [0]
+
+        def counted_fit_function(*args):
+            n_evaluations[0] += 1
+            return fit_function(*args)
+
+        start = time.perf_counter()
+        initial_param_guess = [70.0, 2.0, 0.0, 0.0]
+        if is_auto:
+            initial_param_guess = estimate_initial_parameter_guess(frequency_matrix, phase_matrix, [10.0, 1.0, -3, -3],
+                                                                   [100.0, 5.0, 3, 3], initial_param_guess)
+        calculations.fit_function = counted_fit_function
+        calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix, initial_param_guess,
+                                              [10.0, 1.0, -3, -3], [100.0, 5.0, 3, 3])
+        calculations.fit_function = fit_function
+        print('Auto initial parameter guess {}: {:.1f} fit_function evaluations per sweep, {:.2f} s'.format(
+            is_auto, n_evaluations[0] / n_sweeps, time.perf_counter() - start))
+
+
+def benchmark_peak_tracking(n_sweeps=2000, calibration_interval=50):
+    """
+    Compares the runtime and accuracy of fitting every sweep with the peak tracking of the resonance frequency.
+    """
+    frequency_matrix, phase_matrix = create_sweeps(n_sweeps)
+    start = time.perf_counter()
+    fitted_freq, _ = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix, [70.0, 2.0, 0.0, 0.0],
+                                                           [10.0, 1.0, -3, -3], [100.0, 5.0, 3, 3])
+    print('Full fit: {} sweeps in {:.2f} s'.format(n_sweeps, time.perf_counter() - start))
+    start = time.perf_counter()
+    tracked_freq, _ = calculate_tracked_resonance_frequencies(frequency_matrix, phase_matrix, [70.0, 2.0, 0.0, 0.0],
+                                                              [10.0, 1.0, -3, -3], [100.0, 5.0, 3, 3],
+                                                              calibration_interval=calibration_interval)
+    print('Peak tracking (fit every {}th sweep): {} sweeps in {:.2f} s, mean abs. difference {:.4f} kHz'.format(
+        calibration_interval, n_sweeps, time.perf_counter() - start, np.mean(np.abs(tracked_freq - fitted_freq))))
+
+
+def _read_from_dat_line_by_line(file, delimiter):
+    """
+    Previous implementation of read_from_dat splitting every line through a pandas Series. Used as reference.
+    """
+    data_raw = read_csv(file, header=None)
+    start_idx = data_raw[0].index[data_raw[0].str.find('[DATA]') == 0][0] + 1
+    data_raw = data_raw.iloc[start_idx:-1]
+    data = data_raw[0].apply(lambda x: Series(str(x).split(delimiter.encode().decode('unicode_escape'))))
+    data.columns = data.iloc[0]
+    data = data.drop(data.index[0])
+    data = data.reset_index(drop=True)
+    return data.astype(float)
+
+
+def benchmark_read_from_dat(n_repeats=10):
+    """
+    Compares the runtime of reading the Nanonis example files with the single pass parser and the line by line \
+    reference implementation.
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'examples', 'data', 'nanonis_long_term')
+    for file in sorted(glob.glob(os.path.join(data_dir, '*.dat'))):
+        timings = []
+        for read_dat in [_read_from_dat_line_by_line, read_from_dat]:
+            start = time.perf_counter()
+            for _ in range(n_repeats):
+                data = read_dat(file, '\\t')
+            timings.append((time.perf_counter() - start) / n_repeats)
+        print('Read {} ({} rows): line by line {:.1f} ms, single pass {:.1f} ms'.format(
+            os.path.basename(file), len(data), 1000 * timings[0], 1000 * timings[1]))
+
+
+def benchmark_import_time(n_repeats=5):
+    """
+    Measures the time to import the engine (pyIMD.imd) in a fresh interpreter and lists the user interface and \
+    plotting libraries it loads. There should be none (see test_imd.testHeadlessImport).
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    code = 'import sys, pyIMD.imd; print(sorted(set(sys.modules) & {"PyQt5", "plotnine", "matplotlib", "IPython"}))'
+    timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], cwd=package_dir, capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+    print('Import pyIMD.imd: {:.2f} s (median of {}), loaded UI/plotting modules: {}'.format(
+        np.median(timings), n_repeats, result.stdout.strip()))
+
+
+def benchmark_figure_backends(n_mass_points=100000):
+    """
+    Compares the render time and file size of the figures of a run with the plotnine and the matplotlib (Agg) \
+    figure backend.
+    """
+    frequency_matrix, phase_matrix = create_sweeps(2)
+    parameter = [3.2, 0.014, -1.0]
+    mass = DataFrame({'Time (h)': np.arange(n_mass_points) / 3600,
+                      'Mass (ng)': np.random.RandomState(0).normal(1.0, 0.3, n_mass_points)})
+    mass['Mean mass (ng)'] = mass['Mass (ng)'].rolling(1000).mean()
+    figures = [('plot_fitting', (frequency_matrix[0], phase_matrix[0], 73.0, parameter)),
+               ('plot_response_shift', (Series(frequency_matrix[0]), Series(phase_matrix[0]), 73.0, parameter,
+                                        Series(frequency_matrix[1]), Series(phase_matrix[1]), 72.9, parameter)),
+               ('plot_mass', (mass, 1))]
+    figure_dir = tempfile.mkdtemp()
+    try:
+        for plot_name, plot_args in figures:
+            for file_format in ['png', 'pdf']:
+                results = []
+                for figure_backend in ['plotnine', 'matplotlib']:
+                    file = os.path.join(figure_dir, '{}_{}'.format(plot_name, figure_backend))
+                    start = time.perf_counter()
+                    render_figure(plot_name, plot_args, file_format, file, figure_backend, width=16.5, height=20,
+                                  units='cm', resolution=72)
+                    results.append((time.perf_counter() - start, os.path.getsize('{}.{}'.format(file, file_format))))
+                print('{} ({}): plotnine {:.2f} s {:.0f} kB, matplotlib {:.2f} s {:.0f} kB'.format(
+                    plot_name, file_format, results[0][0], results[0][1] / 1024, results[1][0], results[1][1] / 1024))
+    finally:
+        for file in os.listdir(figure_dir):
+            os.remove(os.path.join(figure_dir, file))
+        os.rmdir(figure_dir)
+
+
+def benchmark_downsampling(n_points=1000000, n_out=3200):
+    """
+    Compares the time needed to select the points of the mass figure by a fixed stride, largest triangle three \
+    buckets and min/max downsampling and whether a short spike is kept.
+    """
+    t = np.arange(n_points) / 3600
+    m = np.random.RandomState(0).normal(1.0, 0.3, n_points)
+    m[n_points // 3] = 10
+    methods = [('stride', lambda: np.arange(0, n_points, int(np.ceil(n_points / n_out)))),
+               ('lttb', lambda: downsample_lttb(t, m, n_out)),
+               ('min_max', lambda: downsample_min_max(t, m, n_out))]
+    for name, select in methods:
+        start = time.perf_counter()
+        idx = select()
+        print('{}: {:.3f} s, {} points, spike kept: {}'.format(name, time.perf_counter() - start, len(idx),
+                                                                n_points // 3 in idx))
+
+
+def benchmark_sweep_figures(n_figures=30, n_workers=2, figure_backend='matplotlib'):
+    """
+    Compares the time needed to write diagnostic sweep figures as individual files, pages of one pdf file and one \
+    montage image with the figure queue.
+    """
+    frequency_matrix, phase_matrix = create_sweeps(n_figures)
+    plot_args_list = [(frequency_matrix[i], phase_matrix[i], 73.0, [3.2, 0.014, -1.0]) for i in range(n_figures)]
+    figure_size = {'width': 16.5, 'height': 20, 'units': 'cm', 'resolution': 72}
+    figure_dir = tempfile.mkdtemp()
+    try:
+        for layout in ['files', 'pdf', 'montage']:
+            start = time.perf_counter()
+            queue = FigureQueue(n_workers)
+            if layout == 'files':
+                for i, plot_args in enumerate(plot_args_list):
+                    queue.submit('plot_fitting', plot_args, 'png',
+                                 os.path.join(figure_dir, 'ResFreqSweep_{}'.format(i)), figure_backend, **figure_size)
+            else:
+                queue.submit_pages('plot_fitting', plot_args_list, 'png', os.path.join(figure_dir, layout), layout,
+                                   figure_backend, **figure_size)
+            queue.wait()
+            files = os.listdir(figure_dir)
+            print('{}: {:.2f} s, {} file(s), {:.0f} kB'.format(layout, time.perf_counter() - start, len(files), sum(
+                os.path.getsize(os.path.join(figure_dir, file)) for file in files) / 1024))
+            for file in files:
+                os.remove(os.path.join(figure_dir, file))
+    finally:
+        os.rmdir(figure_dir)
+
+
+def benchmark_rolling_statistics(n_samples=125000, n_chunks=250, window_size=1000):
+    """
+    Compares updating the rolling mean of a series fed chunk by chunk with RollingStatistics to recalculating the \
+    pandas rolling mean of the full series after each chunk.
+    """
+    mass = np.random.RandomState(0).normal(1.0, 0.3, n_samples)
+    chunks = np.array_split(mass, n_chunks)
+    start = time.perf_counter()
+    statistics = RollingStatistics(window_size)
+    incremental = concat([statistics.update(chunk) for chunk in chunks])['mean']
+    incremental_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(1, n_chunks + 1):
+        recalculated = Series(np.concatenate(chunks[0:i])).rolling(window=window_size).mean()
+    recalculated_time = time.perf_counter() - start
+    print('Rolling mean of {} chunks: incremental {:.2f} s, recalculated {:.2f} s, equal: {}'.format(
+        n_chunks, incremental_time, recalculated_time, np.allclose(incremental, recalculated, rtol=1e-12,
+                                                                   equal_nan=True)))
+
+
+if __name__ == "__main__":
+    benchmark_sweep_fit_modes()
+    benchmark_fit_function_jacobian()
+    benchmark_sweep_fit_warm_start()
+    benchmark_auto_initial_parameter_guess()
+    benchmark_peak_tracking()
+    benchmark_read_from_dat()
+    benchmark_import_time()
+    benchmark_figure_backends()
+    benchmark_downsampling()
+    benchmark_sweep_figures()
+    benchmark_rolling_statistics()
@@ -9,10 +9,19 @@
 # *     Andreas P. Cuny - initial API and implementation
 # *******************************************************************************/
 
+import logging
+import numpy as np
 import pandas as pd
 from unittest import TestCase, main
 from pyIMD.analysis.calculations import calculate_resonance_frequencies, calculate_position_correction, calculate_mass
+from pyIMD.analysis.calculations import calculate_pll_mass, calculate_sweep_resonance_frequencies
+from pyIMD.analysis.calculations import estimate_initial_parameter_guess, calculate_tracked_resonance_frequencies
+from pyIMD.analysis.calculations import track_resonance_frequencies
+from pyIMD.analysis.batch_fit import fit_resonance_batch
+from pyIMD.analysis.rolling_statistics import RollingStatistics
+from scipy import optimize
 from pyIMD.analysis.calculations import fit_function
+from pyIMD.analysis.curve_fit import fit_function_jacobian
 
 
 class TestAnalysis(TestCase):
@@ -164,6 +173,32 @@ class TestAnalysis(TestCase):
         self.assertEqual(fit_function(1, 1, 1, 1, 1), 2)
         self.assertEqual(fit_function(10, 10, 10, 10, 10), 110)
 
+    def testFitFunctionJacobian(self):
+        x = np.linspace(43, 103, 255)
+        params = np.array([73.0, 3.2, 0.014, -1.0])
+        jacobian = fit_function_jacobian(x, *params)
+        self.assertEqual(jacobian.shape, (255, 4))
+
+        # Compare to central differences
+        for j in range(4):
+            h = 1e-6 * max(abs(params[j]), 1)
+            params_up = params.copy()
+            params_up[j] += h
+            params_down = params.copy()
+            params_down[j] -= h
+            numeric = (fit_function(x, *params_up) - fit_function(x, *params_down)) / (2 * h)
+            np.testing.assert_allclose(jacobian[:, j], numeric, rtol=1e-5, atol=1e-8)
+
+        # Same fit result as with the finite difference Jacobian
+        random_state = np.random.RandomState(1)
+        phase = fit_function(x, *params) + random_state.normal(0, 0.02, 255)
+        expected_result, _ = optimize.curve_fit(fit_function, x, phase, p0=[70.0, 2.0, 0.0, 0.0],
+                                                bounds=([10.0, 1.0, -3, -3], [100.0, 5.0, 3, 3]))
+        ret = calculate_resonance_frequencies(x, phase, [70.0, 2.0, 0.0, 0.0], [10.0, 1.0, -3, -3],
+                                              [100.0, 5.0, 3, 3])
+        self.assertAlmostEqual(ret[0], expected_result[0], places=6)
+        np.testing.assert_allclose(ret[1], expected_result[1:], rtol=1e-5)
+
     def testCalculatePositionCorrection(self):
         expected_result = 1.153459551762745
         cell_position = 5
@@ -181,6 +216,215 @@ class TestAnalysis(TestCase):
 
         self.assertEqual(round(ret, 7), round(expected_result, 7))
 
+    def testCalculatePllMass(self):
+        spring_constant = 4
+        res_freq_pre_start_no_cell = 73.00250958110351
+        res_freq_pre_start_with_cell = 72.5
+        frequency_offset = 0.01
+        frequency_shift = np.random.RandomState(42).normal(0, 0.05, 1000)
+        position_correction_factor = np.linspace(1, 1.2, 1000)
+
+        # Reference: per data point calculation
+        expected_result = []
+        for i in range(0, len(frequency_shift)):
+            mass = calculate_mass(spring_constant,
+                                  (frequency_shift[i] - frequency_offset) + res_freq_pre_start_with_cell,
+                                  res_freq_pre_start_no_cell)
+            expected_result.append(mass * position_correction_factor[i])
+
+        ret = calculate_pll_mass(spring_constant, frequency_shift, res_freq_pre_start_with_cell,
+                                 res_freq_pre_start_no_cell, position_correction_factor,
+                                 frequency_offset=frequency_offset)
+        np.testing.assert_allclose(ret, expected_result, rtol=1e-12)
+
+        ret = calculate_pll_mass(spring_constant, frequency_shift, res_freq_pre_start_with_cell,
+                                 res_freq_pre_start_no_cell, 1.153459551762745)
+        self.assertEqual(ret.shape, (1000,))
+        self.assertAlmostEqual(ret[0], calculate_mass(spring_constant, frequency_shift[0] +
+                                                      res_freq_pre_start_with_cell, res_freq_pre_start_no_cell) *
+                               1.153459551762745, places=12)
+
+    def testFitResonanceBatch(self):
+        random_state = np.random.RandomState(0)
+        frequency = np.linspace(43, 103, 255)
+        resonance_frequency = random_state.uniform(70, 76, 20)
+        frequency_matrix = frequency[None, :] + random_state.normal(0, 0.1, (20, 1))
+        phase_matrix = fit_function(frequency_matrix, resonance_frequency[:, None], 3.2, 0.014, -1.0) + \
+            random_state.normal(0, 0.02, (20, 255))
+        initial_param_guess = [70.0, 2.0, 0.0, 0.0]
+        lower_param_bounds = [10.0, 1.0, -3, -3]
+        upper_param_bounds = [100.0, 5.0, 3, 3]
+
+        ret_freq, ret_param = fit_resonance_batch(frequency_matrix, phase_matrix, initial_param_guess,
+                                                  lower_param_bounds, upper_param_bounds)
+        self.assertEqual(ret_freq.shape, (20,))
+        self.assertEqual(ret_param.shape, (20, 3))
+
+        expected_freq, expected_param = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix,
+                                                                              initial_param_guess, lower_param_bounds,
+                                                                              upper_param_bounds)
+        np.testing.assert_allclose(ret_freq, expected_freq, rtol=1e-6)
+        np.testing.assert_allclose(ret_param, expected_param, rtol=1e-4, atol=1e-6)
+
+        batch_freq, batch_param = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix,
+                                                                        initial_param_guess, lower_param_bounds,
+                                                                        upper_param_bounds, fit_mode='Batch')
+        np.testing.assert_array_equal(batch_freq, ret_freq)
+
+    def testCalculateSweepResonanceFrequenciesWarmStart(self):
+        random_state = np.random.RandomState(2)
+        frequency = np.linspace(43, 103, 255)
+        resonance_frequency = np.linspace(73, 72, 30)
+        # A sweep with a jump to a different resonance to trigger the fallback to the initial parameter guess
+        resonance_frequency[15] = 60
+        frequency_matrix = np.tile(frequency, (30, 1))
+        phase_matrix = fit_function(frequency_matrix, resonance_frequency[:, None], 3.2, 0.014, -1.0) + \
+            random_state.normal(0, 0.02, (30, 255))
+        initial_param_guess = [70.0, 2.0, 0.0, 0.0]
+        lower_param_bounds = [10.0, 1.0, -3, -3]
+        upper_param_bounds = [100.0, 5.0, 3, 3]
+
+        expected_freq, expected_param = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix,
+                                                                              initial_param_guess, lower_param_bounds,
+                                                                              upper_param_bounds)
+        ret_freq, ret_param = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix,
+                                                                    initial_param_guess, lower_param_bounds,
+                                                                    upper_param_bounds, warm_start=True)
+        np.testing.assert_allclose(ret_freq, expected_freq, rtol=1e-6)
+        np.testing.assert_allclose(ret_param, expected_param, rtol=1e-4, atol=1e-6)
+        self.assertAlmostEqual(ret_freq[15], 60, places=1)
+
+    def testEstimateInitialParameterGuess(self):
+        random_state = np.random.RandomState(0)
+        expected_param = np.array([[30.0, 3.0, 0.02, -0.5], [95.0, 4.0, -0.01, 0.5], [73.0, 3.2, 0.014, -1.0]])
+        frequency_matrix = np.linspace(0.65, 1.35, 255)[None, :] * expected_param[:, :1]
+        phase_matrix = fit_function(frequency_matrix, *[expected_param[:, i, None] for i in range(4)]) + \
+            random_state.normal(0, 0.02, (3, 255))
+        initial_param_guess = [70.0, 2.0, 0.0, 0.0]
+        lower_param_bounds = [10.0, 1.0, -3, -3]
+        upper_param_bounds = [100.0, 5.0, 3, 3]
+
+        ret_guess = estimate_initial_parameter_guess(frequency_matrix, phase_matrix, lower_param_bounds,
+                                                     upper_param_bounds, initial_param_guess)
+        self.assertEqual(ret_guess.shape, (3, 4))
+        np.testing.assert_allclose(ret_guess[:, 0], expected_param[:, 0], rtol=0.01)
+        np.testing.assert_allclose(ret_guess[:, 1], expected_param[:, 1], rtol=0.25)
+        # Estimating in blocks gives the same guesses
+        np.testing.assert_array_equal(estimate_initial_parameter_guess(frequency_matrix, phase_matrix,
+                                                                       lower_param_bounds, upper_param_bounds,
+                                                                       initial_param_guess, block_size=2), ret_guess)
+
+        # The fits started from the estimate converge to the fits started from the default guess
+        expected_freq, _ = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix, initial_param_guess,
+                                                                 lower_param_bounds, upper_param_bounds)
+        ret_freq, _ = calculate_sweep_resonance_frequencies(frequency_matrix, phase_matrix, ret_guess,
+                                                            lower_param_bounds, upper_param_bounds)
+        np.testing.assert_allclose(ret_freq, expected_freq, rtol=1e-6)
+
+        # Single sweep returns a single guess and a sweep without resonance falls back to the default guess
+        ret_guess = estimate_initial_parameter_guess(frequency_matrix[0], phase_matrix[0], lower_param_bounds,
+                                                     upper_param_bounds, initial_param_guess)
+        self.assertEqual(ret_guess.shape, (4,))
+        ret_guess = estimate_initial_parameter_guess(frequency_matrix[0], np.zeros(255), lower_param_bounds,
+                                                     upper_param_bounds, initial_param_guess)
+        np.testing.assert_array_equal(ret_guess, initial_param_guess)
+
+    def testCalculateTrackedResonanceFrequencies(self):
+        random_state = np.random.RandomState(1)
+        expected_freq = 84.4 - np.linspace(0, 0.3, 200) + random_state.normal(0, 0.01, 200)
+        frequency_matrix = np.linspace(54.1, 113.9, 255)[None, :] + random_state.normal(0, 0.005, (200, 1))
+        phase_matrix = fit_function(frequency_matrix, expected_freq[:, None], 3.0, 0.023, -1.95) + \
+            random_state.normal(0, 0.005, (200, 255))
+        initial_param_guess = [70.0, 2.0, 0.0, 0.0]
+        lower_param_bounds = [10.0, 1.0, -3, -3]
+        upper_param_bounds = [100.0, 5.0, 3, 3]
+
+        fitted_freq, _ = calculate_sweep_resonance_frequencies(frequency_matrix[::20], phase_matrix[::20],
+                                                               initial_param_guess, lower_param_bounds,
+                                                               upper_param_bounds)
+        ret_freq, ret_param = calculate_tracked_resonance_frequencies(frequency_matrix, phase_matrix,
+                                                                      initial_param_guess, lower_param_bounds,
+                                                                      upper_param_bounds, calibration_interval=20)
+        self.assertEqual(ret_param.shape, (200, 3))
+        np.testing.assert_array_equal(ret_freq[::20], fitted_freq)
+        np.testing.assert_allclose(ret_freq, expected_freq, atol=0.05)
+
+    def testTrackResonanceFrequenciesInvalidSweeps(self):
+        random_state = np.random.RandomState(2)
+        expected_freq = np.full(40, 84.4)
+        frequency_matrix = np.tile(np.linspace(54.1, 113.9, 255), (40, 1))
+        phase_matrix = fit_function(frequency_matrix, expected_freq[:, None], 3.0, 0.023, -1.95) + \
+            random_state.normal(0, 0.005, (40, 255))
+        # A flat sweep (no crossing) and a sweep with NaN's between the calibration sweeps
+        phase_matrix[5] = 0.0
+        phase_matrix[25, 100:110] = np.nan
+        lower_param_bounds = [10.0, 1.0, -3, -3]
+        upper_param_bounds = [100.0, 5.0, 3, 3]
+
+        tracked_freq = track_resonance_frequencies(frequency_matrix, phase_matrix, np.full(40, 0.023),
+                                                   np.full(40, -1.95))
+        self.assertTrue(np.isnan(tracked_freq[5]))
+        self.assertTrue(np.isnan(tracked_freq[25]))
+        np.testing.assert_allclose(np.delete(tracked_freq, [5, 25]), 84.4, atol=0.05)
+
+        ret_freq, ret_param = calculate_tracked_resonance_frequencies(frequency_matrix, phase_matrix,
+                                                                      [70.0, 2.0, 0.0, 0.0], lower_param_bounds,
+                                                                      upper_param_bounds, calibration_interval=20)
+        # The flat sweep falls back to the full fit, the sweep with NaN's cannot be fitted
+        fitted_freq, fitted_param = calculate_sweep_resonance_frequencies(frequency_matrix[5:6], phase_matrix[5:6],
+                                                                          [70.0, 2.0, 0.0, 0.0], lower_param_bounds,
+                                                                          upper_param_bounds)
+        self.assertEqual(ret_freq[5], fitted_freq[0])
+        np.testing.assert_array_equal(ret_param[5], fitted_param[0])
+        self.assertTrue(np.isnan(ret_freq[25]))
+        np.testing.assert_allclose(np.delete(ret_freq, [5, 25]), 84.4, atol=0.05)
+
+    def testRollingStatistics(self):
+        mass = np.random.RandomState(0).normal(1.0, 0.3, 3000)
+        mass[np.random.RandomState(1).rand(3000) < 0.05] = np.nan
+        mass[1000:1200] = np.nan
+        mass[2000:2100] = 1.5
+
+        for window_size, min_periods in [(1, None), (50, None), (50, 10), (7, 0)]:
+            rolling = pd.Series(mass).rolling(window=window_size, min_periods=min_periods)
+            statistics = RollingStatistics(window_size, min_periods, ['mean', 'median', 'std', 'min', 'max'])
+            result = pd.concat([statistics.update(chunk) for chunk in np.split(mass, [1, 7, 500, 1100, 2050])])
+
+            pd.testing.assert_index_equal(result.index, pd.RangeIndex(3000))
+            np.testing.assert_allclose(result['mean'], rolling.mean(), rtol=1e-12, atol=1e-15)
+            np.testing.assert_array_equal(result['median'], rolling.median())
+            np.testing.assert_array_equal(result['min'], rolling.min())
+            np.testing.assert_array_equal(result['max'], rolling.max())
+            np.testing.assert_allclose(result['std'], rolling.std(), rtol=1e-12, atol=1e-15)
+        self.assertEqual(statistics.n_samples, 3000)
+
+        with self.assertRaises(Exception):
+            RollingStatistics(10, statistics=['variance'])
+        with self.assertRaises(Exception):
+            RollingStatistics(10, min_periods=11)
+
+    def testCalculateSweepResonanceFrequenciesParallel(self):
+        random_state = np.random.RandomState(3)
+        frequency_matrix = np.tile(np.linspace(43, 103, 255), (25, 1))
+        phase_matrix = fit_function(frequency_matrix, np.linspace(73, 72, 25)[:, None], 3.2, 0.014, -1.0) + \
+            random_state.normal(0, 0.02, (25, 255))
+        initial_param_guess = [70.0, 2.0, 0.0, 0.0]
+        lower_param_bounds = [10.0, 1.0, -3, -3]
+        upper_param_bounds = [100.0, 5.0, 3, 3]
+
+        for fit_mode in ['Sequential', 'Batch']:
+            expected_freq, expected_param = calculate_sweep_resonance_frequencies(
+                frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds, upper_param_bounds,
+                fit_mode=fit_mode)
+            with self.assertLogs('pyIMD.test_analysis') as logs:
+                ret_freq, ret_param = calculate_sweep_resonance_frequencies(
+                    frequency_matrix, phase_matrix, initial_param_guess, lower_param_bounds, upper_param_bounds,
+                    fit_mode=fit_mode, n_workers=2, logger=logging.getLogger('pyIMD.test_analysis'))
+            # One message per completed chunk (4 chunks per worker)
+            self.assertEqual(len(logs.output), 8)
+            np.testing.assert_allclose(ret_freq, expected_freq, rtol=1e-10)
+            np.testing.assert_allclose(ret_param, expected_param, rtol=1e-8, atol=1e-10)
+
 
 if __name__ == "__main__":
     main()
@@ -52,7 +52,15 @@ class TestConfiguration(TestCase):
                            '_cell_center_of_mass_x': [], '_cell_center_of_mass_y': [], '_ref_line_1_x': [],
                            '_ref_line_1_y': [], '_ref_line_2_x': [], '_ref_line_2_y': [], '_image_start_index': 0,
                            '_position_correction_end_frame': 0, '_number_of_data_per_frame': 0,
-                           '_is_zero_outside_correction_range': True, '_area': [], 'position_correction_data': []}
+                           '_is_zero_outside_correction_range': True, '_area': [], 'position_correction_data': [],
+                           '_sweep_fit_mode': 'Sequential',
+                           '_sweep_fit_warm_start': False, '_n_workers': 1, '_auto_initial_parameter_guess': False,
+                           '_peak_tracking_calibration_interval': 50, '_sweep_n_points': 255,
+                           '_text_data_cache': False, '_result_format': 'csv', '_result_cache_path': '',
+                           '_result_cache_size_mb': 1024, '_sweep_checkpoint_interval': 0, '_create_figures': True,
+                           '_figure_n_workers': 1, '_figure_backend': 'plotnine', '_figure_downsampling': 'min_max',
+                           '_sweep_figure_interval': 100, '_sweep_figure_max_count': None,
+                           '_sweep_figure_layout': 'files'}
 
         self.assertEqual(self.settings.__dict__, expected_result)
 
@@ -87,7 +95,14 @@ class TestConfiguration(TestCase):
                            '_cell_center_of_mass_y': [], '_ref_line_1_x': [], '_ref_line_1_y': [], '_ref_line_2_x': [],
                            '_ref_line_2_y': [], '_image_start_index': 0, '_position_correction_end_frame': 0,
                            '_number_of_data_per_frame': 0, '_is_zero_outside_correction_range': True,
-                           '_area': [], 'position_correction_data': []}
+                           '_area': [], 'position_correction_data': [], '_sweep_fit_mode': 'Sequential',
+                           '_sweep_fit_warm_start': False, '_n_workers': 1, '_auto_initial_parameter_guess': False,
+                           '_peak_tracking_calibration_interval': 50, '_sweep_n_points': 255,
+                           '_text_data_cache': False, '_result_format': 'csv', '_result_cache_path': '',
+                           '_result_cache_size_mb': 1024, '_sweep_checkpoint_interval': 0, '_create_figures': True,
+                           '_figure_n_workers': 1, '_figure_backend': 'plotnine', '_figure_downsampling': 'min_max',
+                           '_sweep_figure_interval': 100, '_sweep_figure_max_count': None,
+                           '_sweep_figure_layout': 'files'}
 
         file_path1 = str(Path(self.test_data_dir / "examples" / "data" / "show_case" / "20190110_ShowCase_PLL_B.txt"))
         file_path2 = str(Path(self.test_data_dir / "examples" / "data" / "show_case" / "20190110_ShowCase_PLL_A.txt"))
@@ -133,7 +148,14 @@ class TestConfigurationIO(XmlTestCase):
                            '_cell_center_of_mass_y': [], '_ref_line_1_x': [], '_ref_line_1_y': [], '_ref_line_2_x': [],
                            '_ref_line_2_y': [], '_image_start_index': 0, '_position_correction_end_frame': 0,
                            '_number_of_data_per_frame': 0, '_is_zero_outside_correction_range': True,
-                           '_area': [], 'position_correction_data': []}
+                           '_area': [], 'position_correction_data': [], '_sweep_fit_mode': 'Sequential',
+                           '_sweep_fit_warm_start': False, '_n_workers': 1, '_auto_initial_parameter_guess': False,
+                           '_peak_tracking_calibration_interval': 50, '_sweep_n_points': 255,
+                           '_text_data_cache': False, '_result_format': 'csv', '_result_cache_path': '',
+                           '_result_cache_size_mb': 1024, '_sweep_checkpoint_interval': 0, '_create_figures': True,
+                           '_figure_n_workers': 1, '_figure_backend': 'plotnine', '_figure_downsampling': 'min_max',
+                           '_sweep_figure_interval': 100, '_sweep_figure_max_count': None,
+                           '_sweep_figure_layout': 'files'}
 
         file_path1 = str(Path(self.test_data_dir / "examples" / "data" / "show_case" / "20190110_ShowCase_PLL_B.txt"))
         file_path2 = str(Path(self.test_data_dir / "examples" / "data" / "show_case" / "20190110_ShowCase_PLL_A.txt"))
@@ -181,6 +203,24 @@ class TestConfigurationIO(XmlTestCase):
         self.assertXpathValues(root, './GeneralSettings/frequency_offset/text()', '0')
         self.assertXpathValues(root, './GeneralSettings/read_text_data_from_line/text()', '23')
         self.assertXpathValues(root, './GeneralSettings/text_data_delimiter/text()', '\t')
+        self.assertXpathValues(root, './GeneralSettings/sweep_fit_mode/text()', 'Sequential')
+        self.assertXpathValues(root, './GeneralSettings/sweep_fit_warm_start/text()', 'False')
+        self.assertXpathValues(root, './GeneralSettings/n_workers/text()', '1')
+        self.assertXpathValues(root, './GeneralSettings/auto_initial_parameter_guess/text()', 'False')
+        self.assertXpathValues(root, './GeneralSettings/peak_tracking_calibration_interval/text()', '50')
+        self.assertXpathValues(root, './GeneralSettings/sweep_n_points/text()', '255')
+        self.assertXpathValues(root, './GeneralSettings/text_data_cache/text()', 'False')
+        self.assertXpathValues(root, './GeneralSettings/result_format/text()', 'csv')
+        self.assertXpathValues(root, './GeneralSettings/result_cache_path/text()', '')
+        self.assertXpathValues(root, './GeneralSettings/result_cache_size_mb/text()', '1024')
+        self.assertXpathValues(root, './GeneralSettings/sweep_checkpoint_interval/text()', '0')
+        self.assertXpathValues(root, './GeneralSettings/create_figures/text()', 'True')
+        self.assertXpathValues(root, './GeneralSettings/figure_n_workers/text()', '1')
+        self.assertXpathValues(root, './GeneralSettings/figure_backend/text()', 'plotnine')
+        self.assertXpathValues(root, './GeneralSettings/figure_downsampling/text()', 'min_max')
+        self.assertXpathValues(root, './GeneralSettings/sweep_figure_interval/text()', '100')
+        self.assertXpathValues(root, './GeneralSettings/sweep_figure_max_count/text()', '')
+        self.assertXpathValues(root, './GeneralSettings/sweep_figure_layout/text()', 'files')
         self.assertXpathValues(root, './ProjectSettings/selected_files/File/text()',
                                ('20190110_ShowCase_PLL_A.txt', '20190110_ShowCase_PLL_B.txt',
                                 '20190110_ShowCase_PLL_LongTerm.txt'))
@@ -223,7 +263,14 @@ class TestConfigurationIO(XmlTestCase):
                            '_cell_center_of_mass_y': [], '_ref_line_1_x': [], '_ref_line_1_y': [], '_ref_line_2_x': [],
                            '_ref_line_2_y': [], '_image_start_index': 0, '_position_correction_end_frame': 0,
                            '_number_of_data_per_frame': 0, '_is_zero_outside_correction_range': True,
-                           '_area': [], 'position_correction_data': []}
+                           '_area': [], 'position_correction_data': [], '_sweep_fit_mode': 'Sequential',
+                           '_sweep_fit_warm_start': False, '_n_workers': 1, '_auto_initial_parameter_guess': False,
+                           '_peak_tracking_calibration_interval': 50, '_sweep_n_points': 255,
+                           '_text_data_cache': False, '_result_format': 'csv', '_result_cache_path': '',
+                           '_result_cache_size_mb': 1024, '_sweep_checkpoint_interval': 0, '_create_figures': True,
+                           '_figure_n_workers': 1, '_figure_backend': 'plotnine', '_figure_downsampling': 'min_max',
+                           '_sweep_figure_interval': 100, '_sweep_figure_max_count': None,
+                           '_sweep_figure_layout': 'files'}
 
         self.assertEqual(settings.__dict__, expected_result)
 
@@ -10,9 +10,20 @@
 # *******************************************************************************/
 
 import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import importlib.util
+import matplotlib
+import numpy as np
+import pandas as pd
 from pathlib import Path
-from unittest import TestCase, main
-from pyIMD.imd import InertialMassDetermination
+from unittest import TestCase, main, skipIf
+from unittest.mock import patch
+from pyIMD.imd import InertialMassDetermination, build_calibration_registry
+from pyIMD.io.sweep_block import SweepBlock
+from pyIMD.analysis.curve_fit import fit_function
 
 
 class TestConfiguration(TestCase):
@@ -34,6 +45,13 @@ class TestConfiguration(TestCase):
         self.assertTrue(self.imd.run_batch_inertial_mass_determination)
         self.assertTrue(self.imd.run_inertial_mass_determination)
 
+    def testHeadlessImport(self):
+        # Importing the engine in a fresh interpreter must not load the user interface or plotting libraries
+        loaded = subprocess.run([sys.executable, '-c', 'import sys, pyIMD.imd; print(sorted(set(sys.modules) & '
+                                 '{"PyQt5", "plotnine", "matplotlib", "IPython", "pyIMD.ui.settings"}))'],
+                                cwd=str(self.test_data_dir.parent), capture_output=True, text=True, check=True)
+        self.assertEqual(loaded.stdout.strip(), '[]')
+
     def testSettingsInitDefaults(self):
 
         expected_result = {'_project_folder_path': '', '_rolling_window_size': 1000, '_selected_files': [],
@@ -53,7 +71,15 @@ class TestConfiguration(TestCase):
                            '_cell_center_of_mass_x': [], '_cell_center_of_mass_y': [], '_ref_line_1_x': [],
                            '_ref_line_1_y': [], '_ref_line_2_x': [], '_ref_line_2_y': [], '_image_start_index': 0,
                            '_position_correction_end_frame': 0, '_number_of_data_per_frame': 0,
-                           '_is_zero_outside_correction_range': True, '_area': [], 'position_correction_data': []}
+                           '_is_zero_outside_correction_range': True, '_area': [], 'position_correction_data': [],
+                           '_sweep_fit_mode': 'Sequential',
+                           '_sweep_fit_warm_start': False, '_n_workers': 1, '_auto_initial_parameter_guess': False,
+                           '_peak_tracking_calibration_interval': 50, '_sweep_n_points': 255,
+                           '_text_data_cache': False, '_result_format': 'csv', '_result_cache_path': '',
+                           '_result_cache_size_mb': 1024, '_sweep_checkpoint_interval': 0, '_create_figures': True,
+                           '_figure_n_workers': 1, '_figure_backend': 'plotnine', '_figure_downsampling': 'min_max',
+                           '_sweep_figure_interval': 100, '_sweep_figure_max_count': None,
+                           '_sweep_figure_layout': 'files'}
 
         self.assertEqual(self.imd.settings.__dict__, expected_result)
 
@@ -87,7 +113,14 @@ class TestConfiguration(TestCase):
                            '_cell_center_of_mass_y': [], '_ref_line_1_x': [], '_ref_line_1_y': [], '_ref_line_2_x': [],
                            '_ref_line_2_y': [], '_image_start_index': 0, '_position_correction_end_frame': 0,
                            '_number_of_data_per_frame': 0, '_is_zero_outside_correction_range': True,
-                           '_area': [], 'position_correction_data': []}
+                           '_area': [], 'position_correction_data': [], '_sweep_fit_mode': 'Sequential',
+                           '_sweep_fit_warm_start': False, '_n_workers': 1, '_auto_initial_parameter_guess': False,
+                           '_peak_tracking_calibration_interval': 50, '_sweep_n_points': 255,
+                           '_text_data_cache': False, '_result_format': 'csv', '_result_cache_path': '',
+                           '_result_cache_size_mb': 1024, '_sweep_checkpoint_interval': 0, '_create_figures': True,
+                           '_figure_n_workers': 1, '_figure_backend': 'plotnine', '_figure_downsampling': 'min_max',
+                           '_sweep_figure_interval': 100, '_sweep_figure_max_count': None,
+                           '_sweep_figure_layout': 'files'}
 
         file_path1 = str(Path(self.test_data_dir / "examples" / "data" / "show_case" / "20190110_ShowCase_PLL_B.txt"))
         file_path2 = str(Path(self.test_data_dir / "examples" / "data" / "show_case" / "20190110_ShowCase_PLL_A.txt"))
@@ -99,6 +132,185 @@ class TestConfiguration(TestCase):
 
         self.assertEqual(self.imd.settings.__dict__, expected_result)
 
+    def testConvertDataSweep(self):
+        raw_data = np.random.RandomState(0).rand(3, 4, 255)
+        self.imd.settings.calculation_mode = 'Cont.Sweep'
+        self.imd.data_pre_start_no_cell = pd.DataFrame(np.ones((5, 3)))
+        self.imd.data_pre_start_with_cell = pd.DataFrame(np.ones((5, 3)))
+        self.imd.sweep_block = SweepBlock(raw_data[0].copy(), raw_data[1].copy(), raw_data[2].copy(), np.arange(4))
+
+        self.imd.convert_data()
+
+        np.testing.assert_array_equal(self.imd.sweep_block.frequency,
+                                      raw_data[0] / self.imd.settings.conversion_factor_hz_to_khz)
+        np.testing.assert_array_equal(self.imd.sweep_block.phase,
+                                      raw_data[1] / self.imd.settings.conversion_factor_deg_to_rad)
+        np.testing.assert_array_equal(self.imd.sweep_block.amplitude, raw_data[2])
+        np.testing.assert_array_equal(self.imd.data_pre_start_no_cell.iloc[:, 0],
+                                      1 / self.imd.settings.conversion_factor_hz_to_khz)
+
+    def testFitSweepsResume(self):
+        frequency = np.tile(np.linspace(70.0, 76.0, 255), (10, 1))
+        phase = fit_function(frequency, 73.0 + np.arange(10)[:, None] / 100, 5.2, 0.01, 0.1)
+        project_dir = tempfile.mkdtemp()
+        try:
+            np.savetxt(Path(project_dir, 'sweeps.txt'), phase)
+            self.imd.settings.calculation_mode = 'Cont.Sweep'
+            self.imd.settings.measurements_path = str(Path(project_dir, 'sweeps.txt'))
+            self.imd.settings.project_folder_path = project_dir
+            self.imd.settings.initial_parameter_guess = [73.0, 5.0, 0.0, 0.0]
+            self.imd.sweep_block = SweepBlock(frequency, phase, np.ones_like(phase), np.arange(10.0))
+            expected_resonance_frequency, _ = self.imd.fit_sweeps()
+            self.imd.settings.sweep_checkpoint_interval = 4
+            resonance_frequency, _ = self.imd.fit_sweeps()
+
+            # Interrupt after the first checkpoint and spoil the completed sweeps to see they are not fitted again
+            checkpoint_file = self.imd.get_sweep_checkpoint().file
+            with open(checkpoint_file) as f:
+                lines = f.readlines()
+            with open(checkpoint_file, 'w') as f:
+                f.writelines(lines[0:5])
+            self.imd.sweep_block.phase[0:4] = 0
+            resumed_resonance_frequency, resumed_curve_fit_parameter = self.imd.fit_sweeps()
+        finally:
+            shutil.rmtree(project_dir)
+
+        np.testing.assert_array_equal(resonance_frequency, expected_resonance_frequency)
+        np.testing.assert_array_equal(resumed_resonance_frequency, resonance_frequency)
+        self.assertEqual(resumed_curve_fit_parameter.shape, (10, 3))
+
+    def testGetSweepFitSettings(self):
+        # Execution only settings do not change the fit results, except for warm start which restarts at each chunk
+        self.assertNotIn('n_workers', self.imd.get_sweep_fit_settings())
+        self.assertNotIn('sweep_checkpoint_interval', self.imd.get_sweep_fit_settings())
+        self.imd.settings.sweep_fit_warm_start = True
+        self.assertIn('n_workers', self.imd.get_sweep_fit_settings())
+        self.assertIn('sweep_checkpoint_interval', self.imd.get_sweep_fit_settings())
+
+    def testConcatenateFilesWorkers(self):
+        # The sweep fit workers are not used to concatenate files
+        self.imd.settings.n_workers = 4
+        with patch('pyIMD.imd.write_concat_data') as write_concat_data:
+            self.imd.concatenate_files('data', 100)
+            self.imd.concatenate_files('data', 100, n_workers=2)
+        self.assertEqual(write_concat_data.call_args_list[0][1]['n_workers'], 1)
+        self.assertEqual(write_concat_data.call_args_list[1][1]['n_workers'], 2)
+
+    def testGetSweepFigureIndices(self):
+        np.testing.assert_array_equal(self.imd.get_sweep_figure_indices(301), [0, 100, 200, 300])
+        self.imd.settings.sweep_figure_interval = 10
+        self.imd.settings.sweep_figure_max_count = 3
+        np.testing.assert_array_equal(self.imd.get_sweep_figure_indices(301), [0, 150, 300])
+        np.testing.assert_array_equal(self.imd.get_sweep_figure_indices(25), [0, 10, 20])
+        self.imd.settings.sweep_figure_interval = 0
+        self.assertEqual(len(self.imd.get_sweep_figure_indices(301)), 0)
+
+    def create_batch_projects(self, project_dirs, measurements):
+        projects = []
+        for project_dir, measurement in zip(project_dirs, measurements):
+            for file in ['20170712_RSN_3_A.txt', '20170712_RSN_3_B.txt']:
+                shutil.copy(Path(self.test_data_dir, 'examples', 'data', 'pll', file), project_dir)
+            np.savetxt(Path(project_dir, 'long_term.txt'), np.column_stack([np.arange(200.0),
+                                                                            -np.arange(200.0) / 100]),
+                       delimiter='\t')
+            imd = InertialMassDetermination()
+            imd.create_pyimd_project(str(Path(project_dir, '20170712_RSN_3_B.txt')),
+                                     str(Path(project_dir, '20170712_RSN_3_A.txt')),
+                                     str(Path(project_dir, measurement)), '\t',
+                                     23, 'PLL', initial_parameter_guess=[73.0, 5.2, 0.0, 0.0],
+                                     upper_parameter_bounds=[100.0, 7.0, 3.0, 3.0], spring_constant=8.0,
+                                     cell_position=9.5, cantilever_length=100.0, figure_format='png')
+            imd.save_pyimd_project(str(Path(project_dir, 'project.xml')))
+            projects.append(str(Path(project_dir, 'project.xml')))
+        return projects
+
+    def testRunBatch(self):
+        project_dirs = [tempfile.mkdtemp() for _ in range(2)]
+        try:
+            # The measured data of the second project is missing
+            projects = self.create_batch_projects(project_dirs, ['long_term.txt', 'missing.txt'])
+
+            # Render figures without display
+            matplotlib.use('Agg')
+            summary = self.imd.run_batch_inertial_mass_determination(*projects, n_workers=2)
+            result_file_exists = os.path.isfile(summary['Result file'][0])
+            result_columns = list(pd.read_csv(summary['Result file'][0]).columns)
+        finally:
+            for project_dir in project_dirs:
+                shutil.rmtree(project_dir)
+
+        self.assertEqual(list(summary['Project']), projects)
+        self.assertEqual(list(summary['Status']), ['Done', 'Failed'])
+        self.assertTrue(result_file_exists)
+        self.assertEqual(result_columns, ['Time (h)', 'Mass (ng)', 'Mean mass (ng)'])
+        self.assertNotEqual(summary['Error'][1], '')
+
+    @skipIf(importlib.util.find_spec('pyarrow'), 'requires pyarrow not to be installed')
+    def testRunMissingResultFormatDependency(self):
+        project_dir = tempfile.mkdtemp()
+        try:
+            project = self.create_batch_projects([project_dir], ['long_term.txt'])[0]
+            imd = InertialMassDetermination()
+            imd.load_pyimd_project(project)
+            imd.settings.result_format = 'parquet'
+            imd.run_inertial_mass_determination()
+        finally:
+            shutil.rmtree(project_dir)
+
+        # Fails before the first fit
+        self.assertIn('pyarrow', imd.last_error)
+        self.assertEqual(len(imd.resonance_freq_pre_start_no_cell), 0)
+
+    def testRunCachedMass(self):
+        project_dir = tempfile.mkdtemp()
+        try:
+            project = self.create_batch_projects([project_dir], ['long_term.txt'])[0]
+            matplotlib.use('Agg')
+            masses = []
+            for calculate_pll_mass in [None, Exception('Mass is not calculated again')]:
+                imd = InertialMassDetermination()
+                imd.load_pyimd_project(project)
+                imd.settings.result_cache_path = str(Path(project_dir, 'cache'))
+                imd.settings.create_figures = False
+                if calculate_pll_mass is None:
+                    imd.run_inertial_mass_determination()
+                else:
+                    # The second run takes the mass from the cache
+                    with patch('pyIMD.imd.calculate_pll_mass', side_effect=calculate_pll_mass):
+                        imd.run_inertial_mass_determination()
+                self.assertIsNone(imd.last_error)
+                masses.append(imd.calculated_cell_mass)
+        finally:
+            shutil.rmtree(project_dir)
+
+        pd.testing.assert_frame_equal(masses[1], masses[0])
+
+    def testCalibrationRegistry(self):
+        project_dirs = [tempfile.mkdtemp() for _ in range(3)]
+        try:
+            # All projects use copies of the same pre start files
+            projects = self.create_batch_projects(project_dirs, ['long_term.txt'] * 3)
+
+            matplotlib.use('Agg')
+            registry = build_calibration_registry(projects)
+            figure_dirs = [os.path.dirname(file) for entry in registry.values()
+                           for file in entry['figures'].values()]
+
+            summary = self.imd.run_batch_inertial_mass_determination(*projects, n_workers=1)
+            figures = []
+            for project_dir in project_dirs:
+                with open(Path(project_dir, 'FitNoCellData.png'), 'rb') as f:
+                    figures.append(f.read())
+        finally:
+            for project_dir in project_dirs:
+                shutil.rmtree(project_dir)
+
+        # One fit and one figure per unique pre start file (no cell and with cell)
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(figure_dirs, [project_dirs[0]] * 2)
+        self.assertEqual(list(summary['Status']), ['Done'] * 3)
+        self.assertEqual(figures[1], figures[0])
+        self.assertEqual(figures[2], figures[0])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -9,10 +9,21 @@
 # *     Andreas P. Cuny - initial API and implementation
 # *******************************************************************************/
 
+import os
+import json
+import pickle
+import importlib.util
 import numpy as np
 import pandas as pd
-from unittest import TestCase, main
-from pyIMD.io.read_from_disk import read_from_text, read_from_file
+from nptdms import TdmsWriter, ChannelObject
+from unittest import TestCase, main, skipUnless
+from unittest.mock import patch
+from pyIMD.io.read_from_disk import read_from_text, read_from_file, read_sweep_block, \
+    read_tdms_chunks, read_from_tdms, sniff_text_format, read_from_dat, read_dat_metadata
+from pyIMD.io.sweep_block import SweepBlock
+from pyIMD.io.write_to_disk import write_concat_data, write_results, check_result_format
+from pyIMD.io.result_cache import ResultCache, file_fingerprint
+from pyIMD.io.sweep_checkpoint import SweepCheckpoint
 
 
 class TestIO(TestCase):
@@ -91,6 +102,353 @@ class TestIO(TestCase):
 
         self.assertEqual(df.shape, (10, 7))
 
+    def testSniffTextFormat(self):
+        with open('testSniffTextFormat.txt', 'w') as f:
+            f.write('Some heading text\nFrequency;Phase\n73,1;-2,5\n73,2;-2,4e-1\n')
+        try:
+            text_format = sniff_text_format('testSniffTextFormat.txt', read_from_row=1)
+            text_format_no_header = sniff_text_format('testSniffTextFormat.txt', read_from_row=2)
+            data = read_from_text('testSniffTextFormat.txt', None, 1)
+        finally:
+            os.remove('testSniffTextFormat.txt')
+
+        self.assertEqual(text_format, {'delimiter': ';', 'decimal': ',', 'header': 0})
+        self.assertEqual(text_format_no_header['header'], None)
+        self.assertEqual(list(data.columns), ['Frequency', 'Phase'])
+        np.testing.assert_array_equal(data.to_numpy(), [[73.1, -2.5], [73.2, -0.24]])
+
+    def testReadFromFileCache(self):
+        df1 = pd.DataFrame(np.random.rand(10, 2))
+        df1.to_csv('testReadFromFileCache.txt', index=False, header=False, sep='\t')
+        try:
+            data = read_from_file('testReadFromFileCache.txt', '\\t', header=None, cache=True)
+            self.assertTrue(os.path.isfile('testReadFromFileCache.txt.npy'))
+            data_cached = read_from_file('testReadFromFileCache.txt', '\t', header=None, cache=True)
+            # Changing the read parameters invalidates the cache
+            data_header = read_from_file('testReadFromFileCache.txt', '\t', header=0, cache=True)
+        finally:
+            for file in ['testReadFromFileCache.txt', 'testReadFromFileCache.txt.npy',
+                         'testReadFromFileCache.txt.json']:
+                if os.path.isfile(file):
+                    os.remove(file)
+
+        pd.testing.assert_frame_equal(data_cached, data)
+        np.testing.assert_allclose(data.iloc[:, [0, 6]].to_numpy(), df1.to_numpy())
+        self.assertEqual(data_header.shape, (9, 7))
+
+    def testReadFromDat(self):
+        with open('testReadFromDat.dat', 'w') as f:
+            f.write('Experiment\tLongTerm Data\t\nUser\t\t\nCenter Frequency (Hz)\t88.1855E+3\t\n\n[DATA]\n'
+                    'Rel. Time (s)\tOC M1 Freq. Shift (Hz)\n0.0000000E+0\t-1.1146031E+2\n1.0021000E+0\t-7.9804527E+1\n'
+                    '2.0021000E+0\t-7.5804527E+1\n')
+        try:
+            data = read_from_dat('testReadFromDat.dat', '\\t')
+            metadata = read_dat_metadata('testReadFromDat.dat')
+        finally:
+            os.remove('testReadFromDat.dat')
+
+        # The last row is skipped
+        self.assertEqual(list(data.columns), ['Rel. Time (s)', 'OC M1 Freq. Shift (Hz)'])
+        np.testing.assert_array_equal(data.to_numpy(), [[0.0, -111.46031], [1.0021, -79.804527]])
+        self.assertEqual(metadata, {'Experiment': 'LongTerm Data', 'User': '', 'Center Frequency (Hz)': '88.1855E+3'})
+
+    def testWriteConcatData(self):
+        directory = 'testWriteConcatData'
+        os.makedirs(directory, exist_ok=True)
+        try:
+            for i in [10, 2, 1]:
+                with open(os.path.join(directory, 'log_{}.dat'.format(i)), 'w') as f:
+                    f.write('Experiment\tData Logger\t\n[DATA]\nOC M1 Freq. Shift (Hz)\tOC D1 Phase (deg)\n'
+                            '{0}.5\t{0}.25\n{0}.0\t{0}.75\n9.9\n'.format(i))
+            write_concat_data(directory, '\\t', 100)
+            data = pd.read_csv(os.path.join(directory, 'DataLoggerConCat.csv'), sep='\t', header=None)
+        finally:
+            for file in os.listdir(directory):
+                os.remove(os.path.join(directory, file))
+            os.rmdir(directory)
+
+        # Files in natural order, columns in reverse order with the time in the first column
+        np.testing.assert_array_equal(data.to_numpy(), [[0, 1.25, 1.5], [100, 1.75, 1.0], [200, 2.25, 2.5],
+                                                        [300, 2.75, 2.0], [400, 10.25, 10.5], [500, 10.75, 10.0]])
+
+    def testWriteResultsCsv(self):
+        mass = pd.DataFrame({'Time (h)': [0.0, 0.5], 'Mass (ng)': [1.0, np.nan]})
+        try:
+            write_results('testWriteResults', mass, fit_parameters=pd.DataFrame({'Q factor': [5.0, 5.1]}))
+            data = pd.read_csv('testWriteResults.csv')
+            with self.assertRaises(Exception):
+                write_results('testWriteResults', mass, 'xlsx')
+        finally:
+            os.remove('testWriteResults.csv')
+
+        pd.testing.assert_frame_equal(data, mass)
+
+    def testCheckResultFormat(self):
+        check_result_format('csv')
+        for result_format, module in [('parquet', 'pyarrow'), ('feather', 'pyarrow'), ('hdf5', 'tables')]:
+            if importlib.util.find_spec(module) is None:
+                with self.assertRaises(Exception):
+                    check_result_format(result_format)
+            else:
+                check_result_format(result_format)
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'requires pyarrow')
+    def testWriteResultsParquet(self):
+        import pyarrow.parquet as pq
+        mass = pd.DataFrame({'Time (h)': [0.0, 0.5], 'Mass (ng)': [1.0, np.nan]})
+        fit_parameters = pd.DataFrame({'Resonance frequency (kHz)': [73.0, 73.1], 'Q factor': [5.0, 5.1]})
+        try:
+            write_results('testWriteResults', mass, 'parquet', fit_parameters, {'calculation_mode': 'Cont.Sweep'})
+            data = pd.read_parquet('testWriteResults.parquet')
+            data_fit = pd.read_parquet('testWriteResults_FitParameters.parquet')
+            metadata = pq.read_schema('testWriteResults.parquet').metadata[b'pyIMD']
+        finally:
+            for file in ['testWriteResults.parquet', 'testWriteResults_FitParameters.parquet']:
+                if os.path.isfile(file):
+                    os.remove(file)
+
+        pd.testing.assert_frame_equal(data, mass)
+        pd.testing.assert_frame_equal(data_fit, fit_parameters)
+        self.assertEqual(json.loads(metadata), {'calculation_mode': 'Cont.Sweep'})
+
+    @skipUnless(importlib.util.find_spec('tables'), 'requires pytables')
+    def testWriteResultsHdf5(self):
+        mass = pd.DataFrame({'Time (h)': [0.0, 0.5], 'Mass (ng)': [1.0, np.nan]})
+        fit_parameters = pd.DataFrame({'Resonance frequency (kHz)': [73.0, 73.1], 'Q factor': [5.0, 5.1]})
+        try:
+            write_results('testWriteResults', mass, 'hdf5', fit_parameters, {'calculation_mode': 'Cont.Sweep'})
+            with pd.HDFStore('testWriteResults.h5', mode='r') as store:
+                data = store['mass']
+                data_fit = store['fit_parameters']
+                metadata = store.get_storer('mass').attrs.metadata
+        finally:
+            if os.path.isfile('testWriteResults.h5'):
+                os.remove('testWriteResults.h5')
+
+        pd.testing.assert_frame_equal(data, mass)
+        pd.testing.assert_frame_equal(data_fit, fit_parameters)
+        self.assertEqual(metadata, {'calculation_mode': 'Cont.Sweep'})
+
+    def testResultCache(self):
+        cache_path = 'testResultCache'
+        try:
+            # A budget of 2 kB fits about two of the entries below
+            cache = ResultCache(cache_path, max_size_mb=2 / 1024)
+            keys = [ResultCache.make_key('sweep_fit', i, {'initial_parameter_guess': [73.0, 5.2, 0.0, 0.0]})
+                    for i in range(3)]
+            self.assertEqual(keys[0], ResultCache.make_key('sweep_fit', 0, {'initial_parameter_guess': [73.0, 5.2,
+                                                                                                        0.0, 0.0]}))
+            # Results of other pyIMD versions are not reused
+            with patch('pyIMD.io.result_cache.__version__', '0.0.0'):
+                self.assertNotEqual(keys[0], ResultCache.make_key('sweep_fit', 0, {'initial_parameter_guess': [
+                    73.0, 5.2, 0.0, 0.0]}))
+            self.assertIsNone(cache.get(keys[0]))
+            cache.put(keys[0], (np.arange(100.0), 1.0))
+            os.utime(os.path.join(cache_path, keys[0] + '.pkl'), (0, 0))
+            cache.put(keys[1], (np.arange(100.0), 2.0))
+            os.utime(os.path.join(cache_path, keys[1] + '.pkl'), (1, 1))
+            # Using the first entry makes the second entry the least recently used one
+            self.assertEqual(cache.get(keys[0])[1], 1.0)
+            cache.put(keys[2], (np.arange(100.0), 3.0))
+            values = [cache.get(key) for key in keys]
+        finally:
+            for file in os.listdir(cache_path):
+                os.remove(os.path.join(cache_path, file))
+            os.rmdir(cache_path)
+
+        np.testing.assert_array_equal(values[0][0], np.arange(100.0))
+        self.assertIsNone(values[1])
+        self.assertEqual(values[2][1], 3.0)
+
+    def testResultCacheInvalidEntry(self):
+        cache_path = 'testResultCacheInvalidEntry'
+        try:
+            cache = ResultCache(cache_path)
+            # Truncated entry and entry of a class which does not exist (anymore)
+            entries = {'truncated': pickle.dumps((np.arange(100.0), 1.0))[0:50],
+                       'old_format': b'cpyIMD.io.result_cache\nNoSuchClass\n.'}
+            for key, content in entries.items():
+                with open(os.path.join(cache_path, key + '.pkl'), 'wb') as f:
+                    f.write(content)
+            values = [cache.get(key) for key in entries]
+            remaining_files = os.listdir(cache_path)
+        finally:
+            for file in os.listdir(cache_path):
+                os.remove(os.path.join(cache_path, file))
+            os.rmdir(cache_path)
+
+        # Invalid entries are cache misses and removed
+        self.assertEqual(values, [None, None])
+        self.assertEqual(remaining_files, [])
+
+    def testFileFingerprint(self):
+        try:
+            with open('testFileFingerprint.txt', 'w') as f:
+                f.write('73.0\t1.0\n')
+            fingerprint = file_fingerprint('testFileFingerprint.txt')
+            os.utime('testFileFingerprint.txt', (0, 0))
+            fingerprint_touched = file_fingerprint('testFileFingerprint.txt')
+            with open('testFileFingerprint.txt', 'w') as f:
+                f.write('73.1\t1.0\n')
+            fingerprint_changed = file_fingerprint('testFileFingerprint.txt')
+        finally:
+            os.remove('testFileFingerprint.txt')
+
+        self.assertEqual(fingerprint, fingerprint_touched)
+        self.assertNotEqual(fingerprint, fingerprint_changed)
+
+    def testSweepCheckpoint(self):
+        resonance_frequency = np.arange(5.0) / 3 + 73
+        curve_fit_parameter = np.random.RandomState(0).rand(5, 3)
+        try:
+            # Non ASCII key such that characters and bytes differ
+            checkpoint = SweepCheckpoint('testSweepCheckpoint.csv', 'key µ')
+            checkpoint.append(0, resonance_frequency[0:2], curve_fit_parameter[0:2])
+            checkpoint.append(2, resonance_frequency[2:4], curve_fit_parameter[2:4])
+            # Interrupted while appending the next sweep
+            with open('testSweepCheckpoint.csv', 'a') as f:
+                f.write('4,73.1,0.2')
+            completed = checkpoint.read()
+            with open('testSweepCheckpoint.csv', 'rb') as f:
+                truncated = f.read()
+            checkpoint.append(4, resonance_frequency[4:5], curve_fit_parameter[4:5])
+            resumed = checkpoint.read()
+            other_run = SweepCheckpoint('testSweepCheckpoint.csv', 'other key').read()
+            checkpoint.remove()
+            is_removed = not os.path.isfile('testSweepCheckpoint.csv')
+        finally:
+            if os.path.isfile('testSweepCheckpoint.csv'):
+                os.remove('testSweepCheckpoint.csv')
+
+        np.testing.assert_array_equal(completed[0], resonance_frequency[0:4])
+        np.testing.assert_array_equal(completed[1], curve_fit_parameter[0:4])
+        self.assertTrue(truncated.endswith(b'\n'))
+        self.assertEqual(truncated.count(b'\n'), 5)
+        np.testing.assert_array_equal(resumed[0], resonance_frequency)
+        np.testing.assert_array_equal(resumed[1], curve_fit_parameter)
+        self.assertEqual(len(other_run[0]), 0)
+        self.assertTrue(is_removed)
+
+    @staticmethod
+    def write_sweep_tdms(file, sweep_data, channel_names, time_stamps):
+        channels = []
+        for i in range(sweep_data.shape[1]):
+            if i < len(channel_names):
+                name = channel_names[i]
+            else:
+                name = 'Untitled {}'.format(i)
+            channels.append(ChannelObject('Sweep data', name, sweep_data[:, i]))
+        channels.append(ChannelObject('Sweep data', 'Untitled {}'.format(sweep_data.shape[1]), time_stamps))
+        with TdmsWriter(file) as tdms_writer:
+            tdms_writer.write_segment(channels)
+
+    def testReadSweepBlock(self):
+        n_sweeps = 4
+        sweep_data = np.random.rand(n_sweeps * 3, 256)
+        self.write_sweep_tdms('testReadSweepBlock.tdms', sweep_data, ['Amplitude', 'Phase', 'Frequency'],
+                              1000.0 + 30 * np.arange(n_sweeps))
+        try:
+            sweep_block = read_sweep_block('testReadSweepBlock.tdms')
+        finally:
+            os.remove('testReadSweepBlock.tdms')
+
+        self.assertEqual((sweep_block.n_sweeps, sweep_block.n_points), (n_sweeps, 255))
+        np.testing.assert_array_equal(sweep_block.amplitude, sweep_data[0::3, 0:255])
+        np.testing.assert_array_equal(sweep_block.phase, sweep_data[1::3, 0:255])
+        np.testing.assert_array_equal(sweep_block.frequency, sweep_data[2::3, 0:255])
+        np.testing.assert_array_equal(sweep_block.time, 1000.0 + 30 * np.arange(n_sweeps))
+        self.assertTrue(sweep_block.frequency.flags['C_CONTIGUOUS'])
+
+    def testReadSweepBlockLegacy(self):
+        n_sweeps = 4
+        sweep_data = np.random.rand(n_sweeps * 4, 256)
+        time_stamps = np.datetime64('2019-05-10T10:00:00') + np.arange(n_sweeps) * np.timedelta64(30, 's')
+        self.write_sweep_tdms('testReadSweepBlockLegacy.tdms', sweep_data,
+                              ['Offset', 'Frequency', 'Amplitude', 'Phase'], time_stamps)
+        try:
+            sweep_block = read_sweep_block('testReadSweepBlockLegacy.tdms', n_points=200)
+        finally:
+            os.remove('testReadSweepBlockLegacy.tdms')
+
+        self.assertEqual((sweep_block.n_sweeps, sweep_block.n_points), (n_sweeps, 200))
+        np.testing.assert_array_equal(sweep_block.frequency, sweep_data[1::4, 0:200] + sweep_data[0::4, 0:200])
+        np.testing.assert_array_equal(sweep_block.phase, sweep_data[3::4, 0:200])
+        np.testing.assert_array_equal(sweep_block.amplitude, sweep_data[2::4, 0:200])
+        np.testing.assert_array_equal(sweep_block.time - sweep_block.time[0], 30.0 * np.arange(n_sweeps))
+
+    def testReadSweepBlockMissingChannel(self):
+        sweep_data = np.random.rand(4 * 3, 256)
+        time_stamps = np.datetime64('2019-05-10T10:00:00') + np.arange(4) * np.timedelta64(30, 's')
+        # The amplitude row is unnamed
+        self.write_sweep_tdms('testReadSweepBlockMissingChannel.tdms', sweep_data, ['Frequency', 'Phase'],
+                              time_stamps)
+        try:
+            with self.assertRaisesRegex(ValueError, 'Amplitude'):
+                read_sweep_block('testReadSweepBlockMissingChannel.tdms')
+        finally:
+            os.remove('testReadSweepBlockMissingChannel.tdms')
+
+    def testReadSweepBlockChunked(self):
+        n_sweeps = 7
+        sweep_data = np.random.rand(n_sweeps * 3, 256)
+        self.write_sweep_tdms('testReadSweepBlockChunked.tdms', sweep_data, ['Amplitude', 'Phase', 'Frequency'],
+                              1000.0 + 30 * np.arange(n_sweeps))
+        try:
+            sweep_block = read_sweep_block('testReadSweepBlockChunked.tdms')
+            # Chunk size is rounded down to 3 rows i.e. a single sweep per chunk
+            sweep_block_chunked = read_sweep_block('testReadSweepBlockChunked.tdms', chunk_size=4)
+        finally:
+            os.remove('testReadSweepBlockChunked.tdms')
+
+        np.testing.assert_array_equal(sweep_block_chunked.frequency, sweep_block.frequency)
+        np.testing.assert_array_equal(sweep_block_chunked.phase, sweep_block.phase)
+        np.testing.assert_array_equal(sweep_block_chunked.amplitude, sweep_block.amplitude)
+        np.testing.assert_array_equal(sweep_block_chunked.time, 1000.0 + 30 * np.arange(n_sweeps))
+
+    def testReadTdmsChunks(self):
+        sweep_data = np.random.rand(10, 5)
+        self.write_sweep_tdms('testReadTdmsChunks.tdms', sweep_data, ['Amplitude', 'Phase', 'Frequency'],
+                              np.arange(4.0))
+        try:
+            chunks = list(read_tdms_chunks('testReadTdmsChunks.tdms', 'sweep data', [1, 3, 5], chunk_size=4))
+            with self.assertRaises(Exception):
+                list(read_tdms_chunks('testReadTdmsChunks.tdms', 'pll data'))
+        finally:
+            os.remove('testReadTdmsChunks.tdms')
+
+        self.assertEqual([chunk.shape for chunk in chunks], [(4, 3), (4, 3), (2, 3)])
+        data = np.concatenate(chunks, axis=0)
+        np.testing.assert_array_equal(data[:, 0:2], sweep_data[:, [1, 3]])
+        np.testing.assert_array_equal(data[0:4, 2], np.arange(4.0))
+        self.assertTrue(np.all(np.isnan(data[4:, 2])))
+
+    def testReadFromTdmsChannelIndices(self):
+        sweep_data = np.random.rand(10, 7)
+        self.write_sweep_tdms('testReadFromTdmsChannelIndices.tdms', sweep_data, ['Time'], np.arange(10.0))
+        try:
+            data = read_from_tdms('testReadFromTdmsChannelIndices.tdms')
+            data_selected = read_from_tdms('testReadFromTdmsChannelIndices.tdms', channel_indices=[0, 5, 6])
+        finally:
+            os.remove('testReadFromTdmsChannelIndices.tdms')
+
+        self.assertEqual(list(data_selected.columns), list(data.columns[[0, 5, 6]]))
+        pd.testing.assert_frame_equal(data_selected, data.iloc[:, [0, 5, 6]].astype(float))
+
+    def testSweepBlock(self):
+        sweep_data = np.random.rand(3, 2, 5)
+        sweep_block = SweepBlock(sweep_data[0], sweep_data[1], sweep_data[2], [0.0, 30.0])
+
+        df = sweep_block.to_data_frame()
+        self.assertEqual(df.shape, (6, 6))
+        np.testing.assert_array_equal(df.iloc[2::3, 0:5], sweep_data[0])
+        np.testing.assert_array_equal(df.iloc[0:2, 5], [0.0, 30.0])
+        self.assertTrue(df.iloc[2:, 5].isna().all())
+
+        with self.assertRaises(Exception):
+            SweepBlock(sweep_data[0], sweep_data[1][:, 0:4], sweep_data[2], [0.0, 30.0])
+        with self.assertRaises(Exception):
+            SweepBlock(sweep_data[0], sweep_data[1], sweep_data[2], [0.0])
+
 
 if __name__ == "__main__":
     main()
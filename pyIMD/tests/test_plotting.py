@@ -9,12 +9,24 @@
 # *     Andreas P. Cuny - initial API and implementation
 # *******************************************************************************/
 
+import os
+import re
+import shutil
+import tempfile
 from unittest import TestCase, main
+from unittest.mock import patch
 import pandas as pd
 import numpy as np
 import plotnine
+from matplotlib.image import imread
 from pyIMD.plotting.figures import plot_fitting, plot_response_shift, plot_mass, create_montage_array, \
     get_montage_array_size
+from pyIMD.plotting.figure_queue import FigureQueue
+from pyIMD.plotting import agg_figures
+from pyIMD.io.write_to_disk import write_to_disk_as
+from pyIMD.error.error_handler import ArgumentError
+from pyIMD.plotting.downsampling import downsample, downsample_lttb, downsample_min_max, downsample_mass, \
+    get_figure_pixel_width
 
 
 class TestPlotting(TestCase):
@@ -49,6 +61,165 @@ class TestPlotting(TestCase):
                                                   resonance_frequency_with, parameter_with
                                                   )), plotnine.ggplot)
 
+    def testAggFigures(self):
+        frequency = pd.Series(np.linspace(70, 76, 50))
+        phase = pd.Series(np.linspace(-1, 1, 50))
+        mass = pd.DataFrame([[1, 2, np.nan], [4, 5, 3.5], [7, 8, 6.5]], columns=[0, 'Mass (ng)', 'Mean mass (ng)'])
+        figures = [agg_figures.plot_fitting(frequency, phase, 73.0, [5.2, 0.0, 0.0]),
+                   agg_figures.plot_response_shift(frequency, phase, 73.0, [5.2, 0.0, 0.0], frequency, phase + 0.1,
+                                                   72.0, [5.2, 0.0, 0.0]),
+                   agg_figures.plot_mass(mass, 1)]
+        figure_dir = tempfile.mkdtemp()
+        try:
+            for i, figure in enumerate(figures):
+                figure.save(os.path.join(figure_dir, 'Figure_{}.png'.format(i)), width=5, height=4, units='cm',
+                            dpi=100)
+            figure_files = sorted(os.listdir(figure_dir))
+            figure_size = figures[0].figure.get_size_inches()
+        finally:
+            shutil.rmtree(figure_dir)
+
+        self.assertTrue(all(isinstance(figure, agg_figures.AggFigure) for figure in figures))
+        self.assertEqual(figure_files, ['Figure_0.png', 'Figure_1.png', 'Figure_2.png'])
+        np.testing.assert_allclose(figure_size, [5 / 2.54, 4 / 2.54])
+        # The data frame of the caller is not changed
+        self.assertEqual(list(mass), [0, 'Mass (ng)', 'Mean mass (ng)'])
+
+    def testDownsampleMinMax(self):
+        t = np.arange(10000.0)
+        m = np.sin(t / 1000)
+        m[4321] = 5
+        m[0:50] = np.nan
+
+        idx = downsample_min_max(t, m, 200)
+
+        self.assertLessEqual(len(idx), 200)
+        self.assertIn(4321, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+        self.assertTrue(np.all(idx >= 50))
+        np.testing.assert_array_equal(downsample_min_max(t[0:100], m[0:100], 200), np.arange(50, 100))
+
+    def testDownsampleLttb(self):
+        t = np.arange(10000.0)
+        m = np.sin(t / 1000)
+        m[4321] = 5
+        m[[0, 9999]] = [np.nan, 1]
+
+        idx = downsample_lttb(t, m, 200)
+
+        self.assertEqual(len(idx), 200)
+        self.assertEqual(idx[0], 1)
+        self.assertEqual(idx[-1], 9999)
+        self.assertIn(4321, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+        # On a straight line every selection is equally good and the first point of each bucket is taken
+        np.testing.assert_array_equal(downsample_lttb(t[0:10], t[0:10], 4), [0, 1, 5, 9])
+
+    def testDownsample(self):
+        t = np.arange(100.0)
+        np.testing.assert_array_equal(downsample(t, t, 10, 'none'), t)
+        np.testing.assert_array_equal(downsample(t, t, 10), downsample_min_max(t, t, 10))
+        with self.assertRaises(Exception):
+            downsample(t, t, 10, 'stride')
+        self.assertEqual(get_figure_pixel_width(56.44, 'cm', 72), 1600)
+
+        # Segments are downsampled separately and the first point of each gap is kept to break lines
+        m = np.sin(np.arange(10000.0) / 1000)
+        m[4000:4500] = np.nan
+        for method in ['min_max', 'lttb']:
+            idx = downsample(np.arange(10000.0), m, 200, method)
+            self.assertLessEqual(len(idx), 201)
+            self.assertTrue(np.all(np.diff(idx) > 0))
+            np.testing.assert_array_equal(idx[np.isnan(m[idx])], [4000])
+
+    def testDownsampleMass(self):
+        t = np.arange(1000.0)
+        m = np.sin(t / 100)
+        m[500:600] = np.nan
+        point_idx, line_idx = downsample_mass(t, m, m, 3)
+        np.testing.assert_array_equal(point_idx, np.arange(0, 1000, 3))
+        np.testing.assert_array_equal(line_idx, point_idx)
+        # The point budget replaces the stride
+        point_idx, line_idx = downsample_mass(t, m, m, 3, 100)
+        np.testing.assert_array_equal(line_idx, downsample(t, m, 100))
+        np.testing.assert_array_equal(point_idx, line_idx[line_idx != 500])
+
+    def testFigureQueue(self):
+        frequency = pd.Series(np.linspace(70, 76, 50))
+        phase = pd.Series(np.linspace(-1, 1, 50))
+        figure_dir = tempfile.mkdtemp()
+        try:
+            for n_workers in [0, 2]:
+                queue = FigureQueue(n_workers)
+                for i in range(3):
+                    queue.submit('plot_fitting', (frequency, phase, 73.0, [5.2, 0.0, 0.0]), 'png',
+                                 os.path.join(figure_dir, 'Fit_{}_{}'.format(n_workers, i)), width=5, height=5,
+                                 units='cm', resolution=20)
+                queue.wait()
+            figure_files = sorted(os.listdir(figure_dir))
+
+            queue = FigureQueue(1)
+            queue.submit('plot_unknown', (), 'png', os.path.join(figure_dir, 'Unknown'))
+            with self.assertRaises(AttributeError):
+                queue.wait()
+
+            queue = FigureQueue(1)
+            for i in range(3):
+                queue.submit('plot_fitting', (frequency, phase, 73.0, [5.2, 0.0, 0.0]), 'png',
+                             os.path.join(figure_dir, 'Cancel_{}'.format(i)))
+            queue.close(cancel=True)
+            self.assertEqual(queue.n_pending, 0)
+
+            # Without process pool the figures are rendered in the calling process
+            with patch('pyIMD.plotting.figure_queue.ProcessPoolExecutor', side_effect=OSError):
+                queue = FigureQueue(1)
+            queue.submit('plot_fitting', (frequency, phase, 73.0, [5.2, 0.0, 0.0]), 'png',
+                         os.path.join(figure_dir, 'Fallback'))
+            self.assertTrue(os.path.isfile(os.path.join(figure_dir, 'Fallback.png')))
+            self.assertEqual(queue.wait(), 0)
+        finally:
+            shutil.rmtree(figure_dir)
+
+        self.assertEqual(figure_files, ['Fit_{}_{}.png'.format(n_workers, i) for n_workers in [0, 2]
+                                        for i in range(3)])
+
+    def testFigurePages(self):
+        plot_args = (np.linspace(70, 76, 50), np.linspace(-1, 1, 50), 73.0, [5.2, 0.0, 0.0])
+        figure_size = {'width': 5, 'height': 4, 'units': 'cm', 'resolution': 50}
+        figure_dir = tempfile.mkdtemp()
+        try:
+            for figure_backend in ['plotnine', 'matplotlib']:
+                file = os.path.join(figure_dir, figure_backend)
+                queue = FigureQueue(1)
+                queue.submit('plot_fitting', plot_args, 'png', file, figure_backend, **figure_size)
+                queue.submit_pages('plot_fitting', [plot_args] * 3, 'pdf', file + 'Pages', 'pdf', figure_backend,
+                                   **figure_size)
+                queue.submit_pages('plot_fitting', [plot_args] * 3, 'png', file + 'Montage', 'montage',
+                                   figure_backend, **figure_size)
+                queue.wait()
+
+                with open(file + 'Pages.pdf', 'rb') as f:
+                    self.assertEqual(len(re.findall(rb'/Type /Page\b', f.read())), 3)
+                figure = imread(file + '.png')
+                montage = imread(file + 'Montage.png')
+                # 3 figures are tiled in 2 rows and 2 columns, the last tile stays white
+                self.assertEqual(montage.shape[0:2], (2 * figure.shape[0], 2 * figure.shape[1]))
+                np.testing.assert_allclose(montage[0:figure.shape[0], 0:figure.shape[1], 0:3], figure[:, :, 0:3],
+                                           atol=1 / 255)
+                self.assertTrue(np.all(montage[figure.shape[0]:, figure.shape[1]:, 0:3] == 1))
+
+            # Figure size keyword arguments are given all together or not at all
+            for figure_format in ['png', 'pdf']:
+                with self.assertRaises(ArgumentError):
+                    write_to_disk_as(figure_format, agg_figures.plot_fitting(*plot_args),
+                                     os.path.join(figure_dir, 'Partial'), resolution=50)
+
+            queue = FigureQueue(0)
+            with self.assertRaises(Exception):
+                queue.submit_pages('plot_fitting', [plot_args], 'png', os.path.join(figure_dir, 'Grid'), 'grid')
+        finally:
+            shutil.rmtree(figure_dir)
+
     def testCreateMontageArray(self):
 
         expected_result = np.array([[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
@@ -26,6 +26,7 @@ from PyQt5.Qt import QFileDialog, QMessageBox, QApplication, QStyle, QTextCursor
     QGraphicsSvgItem, Qt, QThread
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QSettings
 from pyIMD.analysis.curve_fit import fit_function
+from pyIMD.plotting.downsampling import downsample
 from pyIMD.ui.settings import SettingsDialog
 from pyIMD.configuration.defaults import *
 from pyIMD.imd import InertialMassDetermination
@@ -97,7 +98,7 @@ class IMDWindow(QtWidgets.QMainWindow):
         self.last_selected_path = ''
         self.show()
         self.console_edit.setReadOnly(True)
-        self.radio_btn_name_array = ['autoRadio', 'pllRadio', 'contSweepRadio']
+        self.radio_btn_name_array = ['autoRadio', 'pllRadio', 'contSweepRadio', 'peakTrackingRadio']
         self.opening_mode = 0 # intended to be used to distinguish if the ui is started as stand alone or not.
         self.task_done = False
         self.max_workers = multiprocessing.cpu_count()
@@ -308,7 +309,7 @@ class IMDWindow(QtWidgets.QMainWindow):
         """
         if self.autoRadio.isChecked():
             self.print_to_console("Auto mode not implemented yet: ")
-        elif self.contSweepRadio.isChecked():
+        elif self.contSweepRadio.isChecked() or self.peakTrackingRadio.isChecked():
             self.print_to_console("Sweep mode starting...")
             self.print_to_console('')  # Needed to output logging information to newline in console
 
@@ -404,7 +405,10 @@ class IMDWindow(QtWidgets.QMainWindow):
         try:
             if item.text() == 'Measured data':
                 # Display data
-                model = PandasDataFrameModel(self.imd.data_measured)
+                if self.imd.sweep_block is not None:
+                    model = PandasDataFrameModel(self.imd.sweep_block.to_data_frame())
+                else:
+                    model = PandasDataFrameModel(self.imd.data_measured)
                 self.tableView.setModel(model)
                 self.graphicsView.clear()
                 # Notify user about selection
@@ -481,16 +485,19 @@ class IMDWindow(QtWidgets.QMainWindow):
                 model = PandasDataFrameModel(self.imd.calculated_cell_mass)
                 self.tableView.setModel(model)
                 self.graphicsView.clear()
-                self.graphicsView.plot(self.imd.calculated_cell_mass.iloc[::10, 0],
-                                       self.imd.calculated_cell_mass.iloc[::10, 1], pen=None, symbol='o',
+                # Plot about two points per pixel of the view. The mean line keeps one nan per gap to break there.
+                max_points = 2 * max(self.graphicsView.width(), 1)
+                t = self.imd.calculated_cell_mass.iloc[:, 0].to_numpy(dtype=float)
+                m = self.imd.calculated_cell_mass.iloc[:, 1].to_numpy(dtype=float)
+                idx = downsample(t, m, max_points, 'min_max')
+                idx = idx[np.isfinite(m[idx])]
+                self.graphicsView.plot(t[idx], m[idx], pen=None, symbol='o',
                                        symbolPen=pg.hsvColor(0, 0, 0, 0.1), symbolBrush=pg.hsvColor(0, 0, 0, 0.1),
                                        name="Measured cell mass")
-                # Drop nan's first
-                t = self.imd.calculated_cell_mass.iloc[:, 0].values
-                m = self.imd.calculated_cell_mass.iloc[:, 2].values
-                t = t[~np.isnan(m)]
-                m = m[~np.isnan(m)]
-                self.graphicsView.plot(t, m, pen=pg.mkPen(color=(255, 0, 0), width=1.5), name="Mean measured cell mass")
+                m = self.imd.calculated_cell_mass.iloc[:, 2].to_numpy(dtype=float)
+                idx = downsample(t, m, max_points, 'lttb')
+                self.graphicsView.plot(t[idx], m[idx], pen=pg.mkPen(color=(255, 0, 0), width=1.5), connect='finite',
+                                       name="Mean measured cell mass")
                 self.graphicsView.setLabel('bottom', 'Time (h)')
                 self.graphicsView.setLabel('left', 'Mass (ng)')
                 self.graphicsView.showGrid(x=True, y=True)
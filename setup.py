@@ -75,5 +75,6 @@ setup(name='pyIMD',
                         'plotnine', 'PyQT5', 'lxml', 'xmltodict', 'matplotlib', 'pyyaml', 'pyqtgraph',
                         'xmlunittest', 'scikit-image', 'pgcolorbar>=1.1.1', 'alphashape', 'cmlib', 'imagecodecs',
                         'ipython'],
+      extras_require={'parquet': ['pyarrow'], 'hdf5': ['tables']},
 
       )